@@ -15,19 +15,122 @@ DB_CONFIG = {
     'local_infile': True
 }
 
+# 数据库连接池配置
+DB_POOL_CONFIG = {
+    'enabled': True,                 # False：每次调用 get_db_connection 都新建连接
+    'min_size': 1,                   # 空闲回收时至少保留的连接数
+    'max_size': 8,                   # 连接数上限（应大于 LOAD_CONFIG['parallel_workers']）
+    'idle_timeout': 300,             # 空闲超过该时间（秒）的连接被关闭
+    'health_check_interval': 30,     # 空闲超过该时间（秒）的连接借出前先 ping 检查
+    'checkout_timeout': 30           # 连接池满时等待可用连接的最长时间（秒）
+}
+
 # 抓取配置
 SCRAPER_CONFIG = {
     'years': range(2020, 2025),  # 抓取年份
     'output_dir': os.path.join(PROJECT_ROOT, 'data', 'nasa_weather_data'),  # 数据存储路径
+    'manifest_path': os.path.join(PROJECT_ROOT, 'data', 'nasa_weather_data', 'manifest.sqlite'),  # 段缓存清单
+    'pack': {
+        'dir': os.path.join(PROJECT_ROOT, 'data', 'nasa_weather_data', 'packs'),  # 压缩段数据包目录
+        'max_pack_mb': 256,      # 单个 pack 文件上限（MB），超过后写入新文件
+        'compress_level': 6      # zlib 压缩级别
+    },
     'batch_size': 1000,          # 批量写入数据库的批次大小
     'timeout': 30,               # 请求超时时间（秒）
+    'workers': 8,                # 并发抓取线程数（1 表示串行抓取）
+    'coalesce': {
+        'enabled': True,         # 按城市合并整段日期为一次请求，超时或请求过大时二分拆分
+        'min_window_days': 90    # 最小请求窗口（天），达到后不再拆分
+    },
+    'incremental': {
+        'enabled': False,        # True：main.py 按各城市已入库的最新日期增量抓取并 upsert，不再全量重载
+        'lookback_days': 7,      # 从最新日期往前回看的天数（NASA 会修订近期数据）
+        'lag_days': 1            # 截止日期为今天减去该天数（NASA 数据发布延迟）
+    },
+    'stream': {
+        'enabled': True,         # 流式写出：逐城市写分区文件，最后拼接为总CSV（内存占用不随城市/年份增长）
+        'partition_by': 'city',  # 分区方式：city（每城市一个文件）或 year（按年份目录再按城市）
+        'partition_dir': os.path.join(PROJECT_ROOT, 'data', 'partitions')
+    },
+    'grid': {
+        'enabled': True,         # 同一网格单元的城市只请求一次
+        'lat_step': 0.5,         # NASA POWER 温度数据（MERRA-2）纬向分辨率（度）
+        'lng_step': 0.625,       # 经向分辨率（度）
+        'cache_file': os.path.join(PROJECT_ROOT, 'data', 'grid_cells.json')  # 城市→网格映射缓存
+    },
+    'pool': {
+        'pool_connections': 4,   # 连接池缓存的主机数
+        'pool_maxsize': 16       # 每个主机的最大连接数（应不小于 workers）
+    },
     'retry': {
-        'total': 5,              # 重试次数
+        'total': 0,              # 连接层重试次数（0：重试统一由限流器的全局重试预算控制，避免重试叠加）
         'backoff_factor': 1,     # 重试延迟因子（秒）
-        'status_forcelist': [429, 500, 502, 503, 504]  # 需要重试的状态码
+        'status_forcelist': []   # 连接层按状态码重试（429/5xx 交给限流器处理）
+    },
+    'rate_limit': {
+        'initial_rate': 5.0,         # 初始请求速率（次/秒）
+        'min_rate': 0.5,
+        'max_rate': 20.0,
+        'rate_step': 0.5,            # 每轮成功请求增加的速率（加性增长）
+        'initial_concurrency': 4,    # 初始并发请求数
+        'min_concurrency': 1,
+        'max_concurrency': 16,       # 并发上限（不超过 workers 才有意义）
+        'latency_threshold': 20.0,   # 单次请求延迟超过该值（秒）视为拥塞
+        'decrease_factor': 0.5,      # 拥塞时速率与并发的乘性下降系数
+        'decrease_cooldown': 2.0,    # 两次下降之间的最小间隔（秒）
+        'retry_budget_ratio': 0.1,   # 全局重试次数不超过请求数的比例
+        'min_retries': 10            # 请求数较少时允许的最少重试次数
     }
 }
 
+# 抓取-入库流水线配置（main.py 中启用后抓取与入库并行进行）
+PIPELINE_CONFIG = {
+    'enabled': False,            # True：清洗后的数据经队列边抓取边入库；False：先生成CSV再 LOAD DATA
+    'queue_size': 8,             # 队列中最多缓存的批次数（写满后抓取端等待，形成背压）
+    'batch_rows': 20000,         # 每批写入的行数
+    'truncate': True,            # 开始前清空 weather_daily（与全量重载一致）；False 时按 (city_id, date) upsert，只对账本次写入的日期范围
+    'load_method': 'stream',     # stream：每批经命名管道直接 LOAD DATA（不写中间文件，不支持时自动改用INSERT）；insert：多行INSERT
+    'write_csv': True            # 同时写出分区文件与总CSV；False 时数据全程不落盘
+}
+
+# 入库配置
+LOAD_CONFIG = {
+    'ensure_schema': True,                       # 入库前建表/迁移 weather_daily 为 (city_id, date) 主键 + 按年份分区，并补齐年份分区
+    'reconcile': True,                           # 全量入库后按 (城市, 年-月) 比对行数与校验和，只重载不一致的分区
+    'build_rollups': True,                       # 入库后重建城市×月/年、省份×月汇总表（增量同步只重算涉及的月份）
+    'staging_swap': True,                        # 全量重载先写入影子表，校验通过后 RENAME TABLE 原子切换
+    'staging_table': 'weather_daily_staging',    # 影子表（与 weather_daily 结构相同）
+    'previous_table': 'weather_daily_prev',      # 切换后保留的上一代数据，可用于快速回滚
+    'keep_previous': True,                       # False：切换成功后删除上一代数据
+    'min_row_ratio': 0.5,                        # 新数据行数低于当前表该比例时拒绝切换（防止残缺数据覆盖线上表）
+    'parallel_workers': 4,                       # 并发 LOAD DATA 的连接数（1：整个CSV单连接导入）
+    'chunk_by': 'city',                          # 并发导入的分块方式：city 或 year
+    'chunk_retries': 2,                          # 失败分块的重试轮数
+    'chunk_dir': os.path.join(PROJECT_ROOT, 'data', 'load_chunks')  # 分块临时目录（导入成功后删除）
+}
+
+# 立方体存储配置（城市 × 日期 × 温度变量的 float32 内存映射文件，供分析直接切片读取）
+CUBE_CONFIG = {
+    'enabled': False,                                          # True：生成总CSV后同时构建立方体文件
+    'path': os.path.join(PROJECT_ROOT, 'data', 'weather_cube.bin'),
+    'reserve_days': 366                                        # 日期轴预留的天数，追加新日期时无需重写文件
+}
+
+# Parquet 列式输出配置（按 年份/省份 分区，需要安装 pyarrow）
+PARQUET_CONFIG = {
+    'enabled': False,                                     # True：生成总CSV后写出 Parquet 数据集，增量同步时追加新数据
+    'path': os.path.join(PROJECT_ROOT, 'data', 'parquet'),
+    'row_group_rows': 2048,                               # 每个行组的行数（数据按城市、日期排序，行组统计可按城市跳过）
+    'compression': 'zstd'
+}
+
+# (城市, 日期) 覆盖位图配置
+COVERAGE_CONFIG = {
+    'enabled': True,                                       # 抓取和入库时更新覆盖位图
+    'path': os.path.join(PROJECT_ROOT, 'data', 'coverage.bin'),
+    'merge_gap_days': 31                                   # 补抓时相隔不超过该天数的缺口合并为一个请求
+}
+
 # NASA API配置
 NASA_API_CONFIG = {
     'url': 'https://power.larc.nasa.gov/api/temporal/daily/point',
@@ -0,0 +1,17 @@
+-- weather_daily 建表语句（由 python -m src.db.schema ddl 生成；运行时由 ensure_weather_schema 建表并补齐到今年的年份分区）
+CREATE TABLE IF NOT EXISTS `weather_daily` (
+    city_id INT NOT NULL,
+    date DATE NOT NULL,
+    temp_max_c DECIMAL(6, 2),
+    temp_min_c DECIMAL(6, 2),
+    temp_avg_c DECIMAL(6, 2),
+    PRIMARY KEY (city_id, date)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+PARTITION BY RANGE (YEAR(date)) (
+    PARTITION p2020 VALUES LESS THAN (2021),
+    PARTITION p2021 VALUES LESS THAN (2022),
+    PARTITION p2022 VALUES LESS THAN (2023),
+    PARTITION p2023 VALUES LESS THAN (2024),
+    PARTITION p2024 VALUES LESS THAN (2025),
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+);
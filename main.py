@@ -1,20 +1,63 @@
+from config.config import SCRAPER_CONFIG, PIPELINE_CONFIG, LOAD_CONFIG, CUBE_CONFIG, PARQUET_CONFIG
 from src.scraper.nasa_scraper import fetch_all_cities
-from src.db.mysql_ops import load_csv_to_db
+from src.db.mysql_ops import load_csv_to_db, close_connection_pool
+from src.db.parallel_loader import load_csv_parallel
+from src.db.schema import ensure_weather_schema
+from src.db.rollups import refresh_rollups
+from src.db.reconcile import reconcile_csv
+from src.pipeline import run_pipeline, sync_incremental
+from src.storage.cube import build_cube
+from src.storage.parquet_store import write_parquet_from_csv
+from src.scraper.coverage import refresh_coverage_from_db
 from src.utils.common import logger
 
 def main():
     logger.info("===== 开始执行NASA天气数据抓取流程 =====")
     try:
+        if LOAD_CONFIG['ensure_schema']:
+            # 建表/迁移表结构并补齐年份分区
+            ensure_weather_schema()
+        if SCRAPER_CONFIG['incremental']['enabled']:
+            # 增量模式：只同步各城市最新日期之后的数据
+            sync_incremental()
+            logger.info("===== 所有流程执行完成 =====")
+            return
+        if PIPELINE_CONFIG['enabled']:
+            # 流水线模式：抓取与入库同时进行
+            run_pipeline()
+            if LOAD_CONFIG['build_rollups']:
+                refresh_rollups()
+            logger.info("===== 所有流程执行完成 =====")
+            return
         # 1. 抓取所有数据并保存为CSV
         csv_path = fetch_all_cities()
         if not csv_path:
             logger.warning("流程终止：未生成有效数据文件")
             return
-        # 2. 将CSV数据写入数据库
-        load_csv_to_db(csv_path)
+        if CUBE_CONFIG['enabled']:
+            # 同时生成供分析使用的立方体文件
+            build_cube(csv_path).close()
+        if PARQUET_CONFIG['enabled']:
+            # 写出按年份/省份分区的 Parquet 数据集
+            write_parquet_from_csv(csv_path)
+        # 2. 将CSV数据写入数据库（按城市/年份分块多连接并发导入）
+        if LOAD_CONFIG['parallel_workers'] > 1:
+            load_csv_parallel(csv_path)
+        else:
+            load_csv_to_db(csv_path)
+        # 3. 按分区校验和对账，只重载不一致的分区
+        if LOAD_CONFIG['reconcile']:
+            reconcile_csv(csv_path)
+        # 覆盖位图以实际入库（含对账修复）的数据为准
+        refresh_coverage_from_db()
+        # 4. 重建汇总表
+        if LOAD_CONFIG['build_rollups']:
+            refresh_rollups()
         logger.info("===== 所有流程执行完成 =====")
     except Exception as e:
         logger.error(f"流程执行失败: {e}", exc_info=True)
+    finally:
+        close_connection_pool()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
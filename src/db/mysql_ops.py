@@ -1,9 +1,13 @@
+import time
+import threading
+from collections import deque
+import numpy as np
+import pandas as pd
 import pymysql
-from config.config import DB_CONFIG
+from config.config import DB_CONFIG, DB_POOL_CONFIG, LOAD_CONFIG, SCRAPER_CONFIG
 from src.utils.common import logger
 
-def get_db_connection():
-    """获取数据库连接"""
+def _connect():
     try:
         conn = pymysql.connect(**DB_CONFIG)
         logger.info("数据库连接成功")
@@ -12,8 +16,324 @@ def get_db_connection():
         logger.error(f"数据库连接失败: {e}")
         raise
 
+class PooledConnection:
+    """从连接池借出的连接：用法与 pymysql 连接相同，close() 或退出 with 块时归还连接池而不是断开"""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise pymysql.err.InterfaceError("连接已归还连接池")
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+class ConnectionPool:
+    """线程安全的数据库连接池
+
+    空闲连接后进先出复用；空闲超过 idle_timeout 的连接在保留 min_size 个之后关闭；
+    空闲超过 health_check_interval 的连接借出前先 ping，失效则重建。
+    """
+
+    def __init__(self, min_size=1, max_size=8, idle_timeout=300, health_check_interval=30, checkout_timeout=30):
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.checkout_timeout = checkout_timeout
+        self._cond = threading.Condition()
+        self._idle = deque()  # (连接, 归还时间)
+        self._size = 0        # 已创建的连接数（空闲 + 借出）
+        self._in_use = 0
+        self._closed = False
+        # 统计
+        self._started = time.monotonic()
+        self._last_change = self._started
+        self._busy_area = 0.0  # 借出连接数对时间的积分，用于计算利用率
+        self.checkouts = 0
+        self.created = 0
+        self.discarded = 0
+        self.peak_in_use = 0
+        self.wait_seconds = 0.0
+        self.max_wait = 0.0
+
+    def _set_in_use(self, delta):
+        now = time.monotonic()
+        self._busy_area += self._in_use * (now - self._last_change)
+        self._last_change = now
+        self._in_use += delta
+        self.peak_in_use = max(self.peak_in_use, self._in_use)
+
+    def _evict_idle(self):
+        """取出空闲超时的连接（保留 min_size 个），由调用方在锁外关闭"""
+        expired = []
+        now = time.monotonic()
+        while self._idle and self._size > self.min_size and now - self._idle[0][1] > self.idle_timeout:
+            expired.append(self._idle.popleft()[0])
+            self._size -= 1
+        return expired
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        """借出一个连接（池满时最多等待 checkout_timeout 秒）"""
+        started = time.monotonic()
+        expired = []
+        try:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise pymysql.err.InterfaceError("连接池已关闭")
+                    expired.extend(self._evict_idle())
+                    if self._idle:
+                        conn, released_at = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        conn, released_at = None, None
+                        self._size += 1
+                        break
+                    remaining = started + self.checkout_timeout - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"等待数据库连接超时（{self.checkout_timeout}s，连接池上限 {self.max_size}）")
+                    self._cond.wait(remaining)
+                self._set_in_use(1)
+        finally:
+            # 每轮等待淘汰的空闲连接都在锁外关闭，超时或连接池关闭时也不遗漏
+            for stale in expired:
+                self._close_quietly(stale)
+        try:
+            if conn is not None and time.monotonic() - released_at > self.health_check_interval:
+                try:
+                    conn.ping(reconnect=False)
+                except Exception:
+                    logger.info("空闲连接已失效，重新建立连接")
+                    self._close_quietly(conn)
+                    conn = None
+                    with self._cond:
+                        self.discarded += 1
+            if conn is None:
+                conn = _connect()
+                with self._cond:
+                    self.created += 1
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._set_in_use(-1)
+                self._cond.notify()
+            raise
+        waited = time.monotonic() - started
+        with self._cond:
+            self.checkouts += 1
+            self.wait_seconds += waited
+            self.max_wait = max(self.max_wait, waited)
+        return PooledConnection(self, conn)
+
+    def release(self, conn):
+        """归还连接：回滚未提交的事务并恢复外键检查，连接异常时直接丢弃"""
+        try:
+            conn.rollback()
+            with conn.cursor() as cursor:
+                cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+            healthy = True
+        except Exception:
+            self._close_quietly(conn)
+            healthy = False
+        with self._cond:
+            self._set_in_use(-1)
+            if healthy and not self._closed:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._size -= 1
+                if healthy:
+                    self._close_quietly(conn)
+                else:
+                    self.discarded += 1
+            self._cond.notify()
+
+    def metrics(self):
+        """连接池统计：连接数、等待时间与利用率（借出连接数的时间平均值 / 上限）"""
+        with self._cond:
+            self._set_in_use(0)
+            elapsed = max(self._last_change - self._started, 1e-9)
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'peak_in_use': self.peak_in_use,
+                'max_size': self.max_size,
+                'checkouts': self.checkouts,
+                'created': self.created,
+                'discarded': self.discarded,
+                'avg_wait_ms': round(self.wait_seconds / self.checkouts * 1000, 2) if self.checkouts else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 2),
+                'utilization': round(self._busy_area / (self.max_size * elapsed), 3)
+            }
+
+    def close(self):
+        """关闭全部空闲连接，借出中的连接归还时关闭"""
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            self._close_quietly(conn)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_connection_pool():
+    """获取进程内共享的数据库连接池"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(
+                min_size=DB_POOL_CONFIG.get('min_size', 1),
+                max_size=DB_POOL_CONFIG.get('max_size', 8),
+                idle_timeout=DB_POOL_CONFIG.get('idle_timeout', 300),
+                health_check_interval=DB_POOL_CONFIG.get('health_check_interval', 30),
+                checkout_timeout=DB_POOL_CONFIG.get('checkout_timeout', 30)
+            )
+        return _pool
+
+def close_connection_pool():
+    """关闭共享连接池并输出统计"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        logger.info(f"数据库连接池统计: {pool.metrics()}")
+        pool.close()
+
+def get_db_connection():
+    """获取数据库连接（开启连接池时从池中借出，close() 即归还；可用 with 语句自动归还）"""
+    if DB_POOL_CONFIG.get('enabled', False):
+        return get_connection_pool().acquire()
+    return _connect()
+
+LOAD_DATA_SQL = """
+LOAD DATA LOCAL INFILE %s
+INTO TABLE {table}
+FIELDS TERMINATED BY ','
+LINES TERMINATED BY '\n'
+IGNORE 1 LINES
+(city_id, @date_str, temp_max_c, temp_min_c, temp_avg_c)
+SET date = STR_TO_DATE(@date_str, '%%Y-%%m-%%d')
+"""
+INSERT_COLUMNS = ['city_id', 'date', 'temp_max_c', 'temp_min_c', 'temp_avg_c']
+# 1148: 服务器不允许该命令；2068: 客户端拒绝发送本地文件；3948: 服务器或客户端禁用了 local_infile
+LOCAL_INFILE_REFUSED_CODES = (1148, 2068, 3948)
+_local_infile_refused = False
+_max_allowed_packet = None
+
+def count_csv_rows(csv_path, buffer_size=1024 * 1024):
+    """统计CSV数据行数（不含表头），按块读取换行符，不加载整个文件"""
+    lines = 0
+    last = b'\n'
+    with open(csv_path, 'rb') as f:
+        while True:
+            chunk = f.read(buffer_size)
+            if not chunk:
+                break
+            lines += chunk.count(b'\n')
+            last = chunk[-1:]
+    if last != b'\n':
+        lines += 1  # 最后一行没有换行符
+    return max(lines - 1, 0)
+
+def table_exists(cursor, table):
+    cursor.execute("SHOW TABLES LIKE %s", (table,))
+    return cursor.fetchone() is not None
+
+def table_row_count(cursor, table):
+    """表的记录数，表不存在时返回 None"""
+    if not table_exists(cursor, table):
+        return None
+    cursor.execute(f"SELECT COUNT(*) FROM `{table}`")
+    return cursor.fetchone()[0]
+
+def prepare_staging_table(cursor, table='weather_daily', staging=None):
+    """按线上表结构（含索引）重建空的影子表"""
+    staging = staging or LOAD_CONFIG['staging_table']
+    cursor.execute(f"DROP TABLE IF EXISTS `{staging}`")
+    cursor.execute(f"CREATE TABLE `{staging}` LIKE `{table}`")
+    return staging
+
+def validate_staging(cursor, expected_rows=None, table='weather_daily', staging=None):
+    """校验影子表：行数与期望一致，且不明显少于线上表；不通过时抛出 ValueError，返回影子表行数"""
+    staging = staging or LOAD_CONFIG['staging_table']
+    staged = table_row_count(cursor, staging)
+    if not staged:
+        raise ValueError(f"影子表 {staging} 为空，拒绝切换")
+    if expected_rows is not None and staged != expected_rows:
+        raise ValueError(f"影子表行数 {staged} 与期望行数 {expected_rows} 不一致，拒绝切换")
+    current = table_row_count(cursor, table) or 0
+    if staged < current * LOAD_CONFIG.get('min_row_ratio', 0):
+        raise ValueError(f"影子表行数 {staged} 远少于线上表 {current}，拒绝切换")
+    return staged
+
+def swap_staging_table(cursor, table='weather_daily', staging=None, previous=None):
+    """RENAME TABLE 原子切换：线上表改名为上一代，影子表改名为线上表，读者不会看到空表或半成品"""
+    staging = staging or LOAD_CONFIG['staging_table']
+    previous = previous or LOAD_CONFIG['previous_table']
+    cursor.execute(f"DROP TABLE IF EXISTS `{previous}`")
+    cursor.execute(f"RENAME TABLE `{table}` TO `{previous}`, `{staging}` TO `{table}`")
+    if not LOAD_CONFIG.get('keep_previous', True):
+        cursor.execute(f"DROP TABLE `{previous}`")
+        logger.info("已切换至新数据，旧表已删除")
+    else:
+        logger.info(f"已切换至新数据，上一代数据保留在 {previous}")
+
+def promote_staging(expected_rows=None):
+    """校验影子表并切换为线上表（流水线等直接写入影子表的路径使用），返回切换后的行数"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            count = validate_staging(cursor, expected_rows)
+            swap_staging_table(cursor)
+        return count
+    finally:
+        conn.close()
+
+def rollback_swap(table='weather_daily', previous=None):
+    """回滚到上一代数据（与当前表互换，可再次执行恢复）"""
+    previous = previous or LOAD_CONFIG['previous_table']
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            if not table_exists(cursor, previous):
+                raise ValueError(f"上一代数据表 {previous} 不存在，无法回滚")
+            swap_tmp = f"{table}_swap_tmp"
+            cursor.execute(
+                f"RENAME TABLE `{table}` TO `{swap_tmp}`, `{previous}` TO `{table}`, `{swap_tmp}` TO `{previous}`"
+            )
+        logger.info(f"已回滚：{table} 恢复为上一代数据，当前数据移至 {previous}")
+    finally:
+        conn.close()
+
 def load_csv_to_db(csv_path):
-    """将CSV文件批量写入数据库"""
+    """将CSV文件批量写入数据库
+
+    staging_swap 开启时写入影子表，校验行数后原子切换，加载过程中线上表保持旧数据可读；
+    关闭时沿用清空后直接导入的方式。
+    """
     if not csv_path:
         logger.warning("无CSV文件路径，跳过数据库写入")
         return
@@ -24,26 +344,24 @@ def load_csv_to_db(csv_path):
         with conn.cursor() as cursor:
             # 禁用外键检查（加速写入）
             cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
-            # 清空表（如需增量写入，可删除此行并修改SQL）
-            cursor.execute("TRUNCATE TABLE weather_daily")
+            staging_swap = LOAD_CONFIG.get('staging_swap', False)
+            if staging_swap:
+                target = prepare_staging_table(cursor)
+            else:
+                # 清空表（如需增量写入，可删除此行并修改SQL）
+                cursor.execute("TRUNCATE TABLE weather_daily")
+                target = 'weather_daily'
             
-            # 构建LOAD DATA SQL（适配Windows路径）
-            csv_unix_path = csv_path.replace('\\', '/')
-            sql = """
-            LOAD DATA LOCAL INFILE %s
-            INTO TABLE weather_daily
-            FIELDS TERMINATED BY ','
-            LINES TERMINATED BY '\n'
-            IGNORE 1 LINES
-            (city_id, @date_str, temp_max_c, temp_min_c, temp_avg_c)
-            SET date = STR_TO_DATE(@date_str, '%%Y-%%m-%%d')
-            """
-            cursor.execute(sql, (csv_unix_path,))
+            # LOAD DATA 被禁用时自动改用多行INSERT
+            load_csv_file(cursor, csv_path, target)
             conn.commit()
             
-            # 统计写入行数
-            cursor.execute("SELECT COUNT(*) FROM weather_daily")
-            count = cursor.fetchone()[0]
+            if staging_swap:
+                count = validate_staging(cursor, count_csv_rows(csv_path))
+                swap_staging_table(cursor)
+            else:
+                # 统计写入行数
+                count = table_row_count(cursor, 'weather_daily')
             logger.info(f"数据写入完成，共 {count} 条记录")
     except Exception as e:
         if conn:
@@ -53,4 +371,149 @@ def load_csv_to_db(csv_path):
     finally:
         if conn:
             conn.close()
-            logger.info("数据库连接已关闭")
\ No newline at end of file
+            logger.info("数据库连接已释放")
+
+def format_floats(values, null='NULL'):
+    """浮点列转为文本列表（repr 保证精度不丢失），NaN/inf 写为 null"""
+    values = np.asarray(values, dtype=np.float64)
+    text = list(map(repr, values.tolist()))
+    for idx in np.flatnonzero(~np.isfinite(values)).tolist():
+        text[idx] = null
+    return text
+
+def frame_values_sql(df):
+    """按列转换后生成多行INSERT的 VALUES 片段 ["(1,'2020-01-01',1.5,0.5,1.0)", ...]（不逐行访问 DataFrame）"""
+    if pd.api.types.is_datetime64_any_dtype(df['date']):
+        dates = df['date'].dt.strftime('%Y-%m-%d')
+    else:
+        # 先按日期解析再格式化，保证拼入SQL的只有合法日期
+        dates = pd.to_datetime(df['date'], format='%Y-%m-%d').dt.strftime('%Y-%m-%d')
+    rows = zip(
+        df['city_id'].to_numpy(dtype=np.int64).tolist(),
+        dates.tolist(),
+        format_floats(df['temp_max_c']),
+        format_floats(df['temp_min_c']),
+        format_floats(df['temp_avg_c'])
+    )
+    return ["(%d,'%s',%s,%s,%s)" % row for row in rows]
+
+def get_max_allowed_packet(cursor):
+    """单条语句允许的最大字节数：取服务器 max_allowed_packet 与客户端上限的较小值"""
+    global _max_allowed_packet
+    if _max_allowed_packet is None:
+        cursor.execute("SELECT @@max_allowed_packet")
+        _max_allowed_packet = min(int(cursor.fetchone()[0]), DB_CONFIG.get('max_allowed_packet', 16 * 1024 * 1024))
+    return _max_allowed_packet
+
+def execute_multi_insert(cursor, prefix, values, suffix='', batch_size=None):
+    """把 VALUES 片段拼成多行INSERT执行：每条语句最多 batch_size 行且不超过 max_allowed_packet，返回语句数"""
+    batch_size = batch_size or SCRAPER_CONFIG.get('batch_size', 1000)
+    # 预留语句头尾和协议开销
+    limit = get_max_allowed_packet(cursor) - len(prefix) - len(suffix) - 1024
+    statements = 0
+    batch, size = [], 0
+    for value in values:
+        if batch and (len(batch) >= batch_size or size + len(value) + 1 > limit):
+            cursor.execute(prefix + ','.join(batch) + suffix)
+            statements += 1
+            batch, size = [], 0
+        batch.append(value)
+        size += len(value) + 1
+    if batch:
+        cursor.execute(prefix + ','.join(batch) + suffix)
+        statements += 1
+    return statements
+
+def insert_frame(conn, df, table='weather_daily', batch_size=None):
+    """将清洗后的DataFrame以多行INSERT写入 table（每条语句 batch_size 行），返回写入行数"""
+    if df.empty:
+        return 0
+    with conn.cursor() as cursor:
+        execute_multi_insert(
+            cursor, f"INSERT INTO `{table}` ({', '.join(INSERT_COLUMNS)}) VALUES ",
+            frame_values_sql(df), batch_size=batch_size
+        )
+    return len(df)
+
+def upsert_frame(conn, df, table='weather_daily', batch_size=None):
+    """按 (city_id, date) 插入或更新 table 中的记录（依赖 (city_id, date) 唯一键），返回提交的行数"""
+    if df.empty:
+        return 0
+    with conn.cursor() as cursor:
+        execute_multi_insert(
+            cursor, f"INSERT INTO `{table}` ({', '.join(INSERT_COLUMNS)}) VALUES ",
+            frame_values_sql(df),
+            # 行别名写法（MySQL 8.0.19+），VALUES() 引用新值的写法自 8.0.20 起已弃用
+            " AS new ON DUPLICATE KEY UPDATE temp_max_c = new.temp_max_c, "
+            "temp_min_c = new.temp_min_c, temp_avg_c = new.temp_avg_c",
+            batch_size
+        )
+    return len(df)
+
+def insert_csv(cursor, csv_path, table, batch_size=None, chunk_rows=100000):
+    """不依赖 LOCAL INFILE 的导入方式：分块读取CSV并以多行INSERT写入，返回导入行数"""
+    rows = 0
+    for chunk in pd.read_csv(csv_path, usecols=INSERT_COLUMNS, chunksize=chunk_rows):
+        execute_multi_insert(
+            cursor, f"INSERT INTO `{table}` ({', '.join(INSERT_COLUMNS)}) VALUES ",
+            frame_values_sql(chunk), batch_size=batch_size
+        )
+        rows += len(chunk)
+    return rows
+
+def is_local_infile_refused(error):
+    """判断异常是否为 LOAD DATA LOCAL 被服务器或客户端禁用"""
+    return isinstance(error, pymysql.err.MySQLError) and bool(error.args) \
+        and error.args[0] in LOCAL_INFILE_REFUSED_CODES
+
+def local_infile_available():
+    """LOAD DATA LOCAL 是否可用（客户端已开启且本进程内未被服务器拒绝过）"""
+    return bool(DB_CONFIG.get('local_infile')) and not _local_infile_refused
+
+def mark_local_infile_refused(error):
+    """记录 LOAD DATA LOCAL 被拒绝，之后的导入直接走INSERT"""
+    global _local_infile_refused
+    _local_infile_refused = True
+    logger.warning(f"LOAD DATA LOCAL 不可用（{error}），改用多行INSERT导入")
+
+def load_csv_file(cursor, csv_path, table):
+    """导入一个CSV文件：优先 LOAD DATA LOCAL，被拒绝时自动改用多行INSERT（之后的导入直接走INSERT），返回导入行数"""
+    if local_infile_available():
+        try:
+            # 适配Windows路径
+            cursor.execute(LOAD_DATA_SQL.format(table=table), (csv_path.replace('\\', '/'),))
+            return cursor.rowcount
+        except pymysql.err.MySQLError as e:
+            if not is_local_infile_refused(e):
+                raise
+            mark_local_infile_refused(e)
+    return insert_csv(cursor, csv_path, table)
+
+def get_high_water_marks(conn):
+    """读取每个城市已入库的最新日期 {city_id: date}"""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT city_id, MAX(date) FROM weather_daily GROUP BY city_id")
+        return {city_id: max_date for city_id, max_date in cursor.fetchall()}
+
+def count_rows_by_city(conn, table='weather_daily', date_range=None):
+    """统计 table 中每个城市的记录数 {city_id: count}，date_range 为 (起, 止) 时只统计该日期范围"""
+    with conn.cursor() as cursor:
+        if date_range is None:
+            cursor.execute(f"SELECT city_id, COUNT(*) FROM `{table}` GROUP BY city_id")
+        else:
+            cursor.execute(
+                f"SELECT city_id, COUNT(*) FROM `{table}` WHERE date BETWEEN %s AND %s GROUP BY city_id",
+                date_range
+            )
+        return {city_id: count for city_id, count in cursor.fetchall()}
+
+if __name__ == '__main__':
+    # 用法：python -m src.db.mysql_ops rollback（与上一代数据互换）
+    import sys
+    if sys.argv[1:] == ['rollback']:
+        rollback_swap()
+        # 线上数据换成了上一代，覆盖位图按数据库实际内容重建（命令行入口负责编排，模块本身不依赖抓取层）
+        from src.scraper.coverage import refresh_coverage_from_db
+        refresh_coverage_from_db()
+    else:
+        print("用法: python -m src.db.mysql_ops rollback")
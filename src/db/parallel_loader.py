@@ -0,0 +1,153 @@
+import os
+import time
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from config.config import LOAD_CONFIG
+from src.utils.common import logger
+from src.db.mysql_ops import (
+    get_db_connection, load_csv_file, count_csv_rows, prepare_staging_table, validate_staging,
+    swap_staging_table, table_row_count
+)
+
+def split_csv_chunks(csv_path, chunk_dir, chunk_by='city', flush_lines=50000):
+    """将总CSV按城市或年份拆分为多个分块文件（逐行流式处理，每个分块带表头），返回按键排序的文件列表"""
+    if chunk_by not in ('city', 'year'):
+        raise ValueError(f"不支持的分块方式: {chunk_by}")
+    shutil.rmtree(chunk_dir, ignore_errors=True)
+    os.makedirs(chunk_dir)
+    buffers, paths = {}, {}
+    buffered = 0
+
+    def flush():
+        for key, lines in buffers.items():
+            if lines:
+                with open(paths[key], 'ab') as f:
+                    f.writelines(lines)
+                lines.clear()
+
+    with open(csv_path, 'rb') as f:
+        header = f.readline()
+        for line in f:
+            if not line.strip():
+                continue
+            if chunk_by == 'city':
+                key = int(line[:line.index(b',')])
+            else:
+                key = int(line[line.index(b',') + 1:][:4])
+            if key not in paths:
+                paths[key] = os.path.join(chunk_dir, f"{chunk_by}_{key}.csv")
+                with open(paths[key], 'wb') as chunk:
+                    chunk.write(header)
+                buffers[key] = []
+            if not line.endswith(b'\n'):
+                line += b'\n'
+            buffers[key].append(line)
+            buffered += 1
+            if buffered >= flush_lines:
+                flush()
+                buffered = 0
+    flush()
+    return [paths[key] for key in sorted(paths)]
+
+def load_chunk(chunk_path, table):
+    """在独立连接上导入一个分块（LOAD DATA 不可用时为多行INSERT）并单独提交，返回 (导入行数, 耗时秒)"""
+    started = time.perf_counter()
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+            rows = load_csv_file(cursor, chunk_path, table)
+        conn.commit()
+        return rows, time.perf_counter() - started
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def load_chunks_parallel(chunk_paths, table, workers=4, retries=2):
+    """多个连接并发导入分块，每块单独提交；失败的分块整轮结束后单独重试
+
+    返回每个分块的报告 {path: {'rows', 'seconds', 'attempts', 'error'}}，error 非空表示最终失败。
+    """
+    report = {path: {'rows': 0, 'seconds': 0.0, 'attempts': 0, 'error': None} for path in chunk_paths}
+    pending = list(chunk_paths)
+    for round_no in range(retries + 1):
+        if not pending:
+            break
+        if round_no:
+            logger.info(f"第 {round_no} 次重试 {len(pending)} 个失败分块")
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='db-load') as executor:
+            futures = [(path, executor.submit(load_chunk, path, table)) for path in pending]
+        failed = []
+        for path, future in futures:
+            entry = report[path]
+            entry['attempts'] += 1
+            try:
+                entry['rows'], entry['seconds'] = future.result()
+                entry['error'] = None
+            except Exception as e:
+                entry['error'] = str(e)
+                logger.warning(f"分块 {os.path.basename(path)} 导入失败（第 {entry['attempts']} 次）: {e}")
+                failed.append(path)
+        pending = failed
+    return report
+
+def log_load_report(report, elapsed):
+    """汇总输出各分块的行数与耗时"""
+    loaded = [entry for entry in report.values() if entry['error'] is None]
+    failed = [os.path.basename(path) for path, entry in report.items() if entry['error'] is not None]
+    busy = sum(entry['seconds'] for entry in loaded)
+    slowest = sorted(report.items(), key=lambda item: item[1]['seconds'], reverse=True)[:3]
+    logger.info(
+        f"并行导入完成：{len(loaded)}/{len(report)} 个分块，共 {sum(entry['rows'] for entry in loaded)} 条，"
+        f"总耗时 {elapsed:.2f}s（各分块累计 {busy:.2f}s），最慢分块: "
+        + ', '.join(f"{os.path.basename(path)} {entry['rows']} 条 {entry['seconds']:.2f}s" for path, entry in slowest)
+    )
+    for path, entry in report.items():
+        logger.debug(f"{os.path.basename(path)}: {entry['rows']} 条，{entry['seconds']:.2f}s，尝试 {entry['attempts']} 次")
+    if failed:
+        logger.error(f"{len(failed)} 个分块最终导入失败: {failed}")
+
+def load_csv_parallel(csv_path, workers=None):
+    """将总CSV按城市/年份拆分后并发 LOAD DATA 写入数据库，返回各分块报告
+
+    开启 staging_swap 时导入影子表，全部分块成功且行数校验通过后才原子切换；
+    否则清空 weather_daily 后直接导入。
+    """
+    if not csv_path:
+        logger.warning("无CSV文件路径，跳过数据库写入")
+        return {}
+    workers = workers or LOAD_CONFIG.get('parallel_workers', 4)
+    started = time.perf_counter()
+    chunk_dir = LOAD_CONFIG['chunk_dir']
+    chunk_paths = split_csv_chunks(csv_path, chunk_dir, LOAD_CONFIG.get('chunk_by', 'city'))
+    logger.info(f"总CSV已拆分为 {len(chunk_paths)} 个分块，使用 {workers} 个连接并发导入")
+
+    staging_swap = LOAD_CONFIG.get('staging_swap', False)
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            if staging_swap:
+                table = prepare_staging_table(cursor)
+            else:
+                cursor.execute("TRUNCATE TABLE weather_daily")
+                table = 'weather_daily'
+        conn.commit()
+
+        report = load_chunks_parallel(chunk_paths, table, workers, LOAD_CONFIG.get('chunk_retries', 2))
+        log_load_report(report, time.perf_counter() - started)
+        if any(entry['error'] is not None for entry in report.values()):
+            raise RuntimeError(f"存在导入失败的分块，{'未切换线上表' if staging_swap else 'weather_daily 数据不完整'}")
+
+        with conn.cursor() as cursor:
+            if staging_swap:
+                count = validate_staging(cursor, count_csv_rows(csv_path))
+                swap_staging_table(cursor)
+            else:
+                count = table_row_count(cursor, table)
+        logger.info(f"数据写入完成，共 {count} 条记录")
+    finally:
+        conn.close()
+    shutil.rmtree(chunk_dir, ignore_errors=True)
+    return report
@@ -0,0 +1,136 @@
+import sys
+import time
+import zlib
+import numpy as np
+import pandas as pd
+from config.config import LOAD_CONFIG
+from src.utils.common import logger
+from src.db.mysql_ops import get_db_connection, insert_frame, INSERT_COLUMNS
+from src.db.rollups import month_range, refresh_rollups
+
+KEY_COLUMNS = ['city_id', 'year', 'month']
+
+# 与 MySQL 侧 CONCAT_WS(',', city_id, date, 温度...) 的结果逐字节一致：
+# 温度在库内显式转为两位小数的 DECIMAL 再拼接，列为 FLOAT/DOUBLE/DECIMAL 时输出格式相同；NULL 被 CONCAT_WS 跳过
+DB_CHECKSUM_SQL = """
+SELECT city_id, YEAR(date), MONTH(date), COUNT(*),
+       SUM(CRC32(CONCAT_WS(',', city_id, date,
+           CAST(temp_max_c AS DECIMAL(8, 2)), CAST(temp_min_c AS DECIMAL(8, 2)), CAST(temp_avg_c AS DECIMAL(8, 2))
+       )))
+FROM `{table}`
+GROUP BY city_id, YEAR(date), MONTH(date)
+"""
+
+TEMP_COLUMNS = ['temp_max_c', 'temp_min_c', 'temp_avg_c']
+
+def _row_crcs(city_ids, dates, temps):
+    """逐行计算 CRC32：行文本与 MySQL 侧 CONCAT_WS 的输出一致（温度保留两位小数，NaN 视为 NULL 跳过）"""
+    temps = [np.round(values, 2) + 0.0 for values in temps]  # +0.0 去掉 -0.0
+    lines = ['%d,%s,%.2f,%.2f,%.2f' % row for row in zip(city_ids, dates, *[values.tolist() for values in temps])]
+    for idx in np.flatnonzero(np.isnan(np.column_stack(temps)).any(axis=1)).tolist():
+        parts = ['%.2f' % values[idx] for values in temps if not np.isnan(values[idx])]
+        lines[idx] = ','.join([str(city_ids[idx]), dates[idx]] + parts)
+    return np.fromiter(map(zlib.crc32, map(str.encode, lines)), dtype=np.int64, count=len(lines))
+
+def frame_checksums(df):
+    """计算每个 (城市, 年, 月) 的行数与与顺序无关的校验和（各行 CRC32 之和）"""
+    if df.empty:
+        return pd.DataFrame(columns=['rows', 'checksum'], index=pd.MultiIndex.from_tuples([], names=KEY_COLUMNS))
+    dates = pd.to_datetime(df['date'], format='%Y-%m-%d')
+    city_ids = df['city_id'].to_numpy(dtype=np.int64)
+    keyed = pd.DataFrame({
+        'city_id': city_ids,
+        'year': dates.dt.year.to_numpy(),
+        'month': dates.dt.month.to_numpy(),
+        'checksum': _row_crcs(
+            city_ids.tolist(), dates.dt.strftime('%Y-%m-%d').tolist(),
+            [df[col].to_numpy(dtype=np.float64) for col in TEMP_COLUMNS]
+        )
+    })
+    grouped = keyed.groupby(KEY_COLUMNS)['checksum']
+    return pd.DataFrame({'rows': grouped.size(), 'checksum': grouped.sum()})
+
+def csv_checksums(csv_path, chunk_rows=200000):
+    """分块读取CSV计算各分区的行数与校验和（校验和可加，分块结果直接相加）"""
+    total = None
+    for chunk in pd.read_csv(csv_path, usecols=INSERT_COLUMNS, chunksize=chunk_rows):
+        sums = frame_checksums(chunk)
+        total = sums if total is None else total.add(sums, fill_value=0)
+    if total is None:
+        return frame_checksums(pd.DataFrame(columns=INSERT_COLUMNS))
+    return total.astype(np.int64)
+
+def db_checksums(cursor, table='weather_daily'):
+    """一条分组查询计算库中各分区的行数与校验和"""
+    cursor.execute(DB_CHECKSUM_SQL.format(table=table))
+    rows = cursor.fetchall()
+    index = pd.MultiIndex.from_tuples([row[:3] for row in rows], names=KEY_COLUMNS)
+    return pd.DataFrame(
+        {'rows': [int(row[3]) for row in rows], 'checksum': [int(row[4]) for row in rows]},
+        index=index
+    )
+
+def diff_checksums(expected, actual):
+    """对比两侧结果，返回不一致的分区 [(city_id, year, month), ...]（含一侧缺失的分区）"""
+    joined = expected.join(actual, how='outer', lsuffix='_expected', rsuffix='_actual')
+    mismatched = (joined['rows_expected'] != joined['rows_actual']) | \
+        (joined['checksum_expected'] != joined['checksum_actual'])
+    return [tuple(int(v) for v in key) for key in joined.index[mismatched.to_numpy()]]
+
+def reload_partitions(conn, csv_path, partitions, table='weather_daily', chunk_rows=200000):
+    """删除并按CSV重新写入指定的 (城市, 年, 月) 分区，在一个事务中提交，返回写入行数"""
+    wanted = set(partitions)
+    rows = 0
+    with conn.cursor() as cursor:
+        for city_id, year, month in sorted(wanted):
+            first, last = month_range(year, month)
+            cursor.execute(
+                f"DELETE FROM `{table}` WHERE city_id = %s AND date BETWEEN %s AND %s",
+                (city_id, first, last)
+            )
+    for chunk in pd.read_csv(csv_path, usecols=INSERT_COLUMNS, chunksize=chunk_rows):
+        dates = pd.to_datetime(chunk['date'], format='%Y-%m-%d')
+        keys = pd.MultiIndex.from_arrays([chunk['city_id'], dates.dt.year, dates.dt.month])
+        selected = chunk[keys.isin(list(wanted))]
+        if not selected.empty:
+            rows += insert_frame(conn, selected.assign(date=dates[selected.index]), table)
+    conn.commit()
+    return rows
+
+def reconcile_csv(csv_path, table='weather_daily', repair=True):
+    """按 (城市, 年-月) 比对CSV与库中数据的行数和校验和，只重载不一致的分区
+
+    返回 {'partitions': 分区数, 'mismatched': [...], 'reloaded_rows': 重载行数, 'seconds': 耗时}。
+    """
+    started = time.perf_counter()
+    expected = csv_checksums(csv_path)
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            actual = db_checksums(cursor, table)
+        mismatched = diff_checksums(expected, actual)
+        report = {'partitions': len(expected), 'mismatched': mismatched, 'reloaded_rows': 0}
+        if not mismatched:
+            logger.info(f"校验通过：{len(expected)} 个 (城市, 年-月) 分区的行数与校验和均一致")
+        else:
+            logger.warning(f"校验发现 {len(mismatched)} 个分区不一致，例如: {mismatched[:5]}")
+            if repair:
+                report['reloaded_rows'] = reload_partitions(conn, csv_path, mismatched, table)
+                logger.info(f"已重载 {len(mismatched)} 个分区，共 {report['reloaded_rows']} 条记录")
+                if LOAD_CONFIG.get('build_rollups', False) and table == 'weather_daily':
+                    refresh_rollups(sorted({(year, month) for _, year, month in mismatched}))
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    report['seconds'] = round(time.perf_counter() - started, 2)
+    logger.info(f"对账耗时 {report['seconds']}s")
+    return report
+
+if __name__ == '__main__':
+    # 用法：python -m src.db.reconcile data/all_history_final.csv [--check-only]
+    if len(sys.argv) < 2:
+        print("用法: python -m src.db.reconcile <csv路径> [--check-only]")
+    else:
+        reconcile_csv(sys.argv[1], repair='--check-only' not in sys.argv[2:])
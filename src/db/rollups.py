@@ -0,0 +1,203 @@
+import calendar
+from datetime import date
+import pandas as pd
+from config.cities import PROVINCES
+from src.utils.common import logger
+from src.db.mysql_ops import get_db_connection
+
+# 汇总表统计列：天数、最低温（日最低温的最小值）、最高温（日最高温的最大值）、日最高/最低/平均温的均值
+STAT_COLUMNS = ['days', 'min_temp_c', 'max_temp_c', 'avg_max_c', 'avg_min_c', 'avg_temp_c']
+STAT_DDL = """
+    days SMALLINT NOT NULL,
+    min_temp_c DECIMAL(6, 2),
+    max_temp_c DECIMAL(6, 2),
+    avg_max_c DECIMAL(8, 4),
+    avg_min_c DECIMAL(8, 4),
+    avg_temp_c DECIMAL(8, 4),
+"""
+ROLLUP_DDL = [
+    "CREATE TABLE IF NOT EXISTS city_province ("
+    " city_id INT NOT NULL PRIMARY KEY, province VARCHAR(32) NOT NULL, KEY idx_province (province)"
+    ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4",
+    f"CREATE TABLE IF NOT EXISTS weather_city_month (city_id INT NOT NULL, year SMALLINT NOT NULL, "
+    f"month TINYINT NOT NULL, {STAT_DDL} PRIMARY KEY (city_id, year, month)) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4",
+    f"CREATE TABLE IF NOT EXISTS weather_city_year (city_id INT NOT NULL, year SMALLINT NOT NULL, "
+    f"{STAT_DDL} PRIMARY KEY (city_id, year)) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4",
+    f"CREATE TABLE IF NOT EXISTS weather_province_month (province VARCHAR(32) NOT NULL, year SMALLINT NOT NULL, "
+    f"month TINYINT NOT NULL, {STAT_DDL} PRIMARY KEY (province, year, month)) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+]
+# 从日数据聚合
+DAILY_AGG = (
+    "COUNT(*), MIN(d.temp_min_c), MAX(d.temp_max_c), "
+    "AVG(d.temp_max_c), AVG(d.temp_min_c), AVG(d.temp_avg_c)"
+)
+# 从月汇总再聚合（均值按天数加权）
+ROLLUP_AGG = (
+    "SUM(days), MIN(min_temp_c), MAX(max_temp_c), SUM(avg_max_c * days) / SUM(days), "
+    "SUM(avg_min_c * days) / SUM(days), SUM(avg_temp_c * days) / SUM(days)"
+)
+STATS = ', '.join(STAT_COLUMNS)
+
+def month_range(year, month):
+    """某月的首日与末日"""
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+def ensure_rollup_tables(cursor):
+    """创建汇总表，并按 config/cities.py 同步城市→省份映射"""
+    for ddl in ROLLUP_DDL:
+        cursor.execute(ddl)
+    cursor.executemany(
+        "INSERT INTO city_province (city_id, province) VALUES (%s, %s) AS new "
+        "ON DUPLICATE KEY UPDATE province = new.province",
+        sorted(PROVINCES.items())
+    )
+
+def _refresh_months(cursor, first, last):
+    """重算 [first, last] 覆盖的各月的城市月汇总与省份月汇总（按日期范围只扫描相关分区）"""
+    cursor.execute(
+        "DELETE FROM weather_city_month WHERE year * 100 + month BETWEEN %s AND %s",
+        (first.year * 100 + first.month, last.year * 100 + last.month)
+    )
+    cursor.execute(
+        f"INSERT INTO weather_city_month (city_id, year, month, {STATS}) "
+        f"SELECT d.city_id, YEAR(d.date), MONTH(d.date), {DAILY_AGG} FROM weather_daily d "
+        "WHERE d.date BETWEEN %s AND %s GROUP BY d.city_id, YEAR(d.date), MONTH(d.date)",
+        (first, last)
+    )
+    cursor.execute(
+        "DELETE FROM weather_province_month WHERE year * 100 + month BETWEEN %s AND %s",
+        (first.year * 100 + first.month, last.year * 100 + last.month)
+    )
+    cursor.execute(
+        f"INSERT INTO weather_province_month (province, year, month, {STATS}) "
+        f"SELECT p.province, YEAR(d.date), MONTH(d.date), {DAILY_AGG} FROM weather_daily d "
+        "JOIN city_province p ON p.city_id = d.city_id "
+        "WHERE d.date BETWEEN %s AND %s GROUP BY p.province, YEAR(d.date), MONTH(d.date)",
+        (first, last)
+    )
+
+def _refresh_years(cursor, years):
+    """由城市月汇总重算城市年汇总"""
+    placeholders = ', '.join(['%s'] * len(years))
+    cursor.execute(f"DELETE FROM weather_city_year WHERE year IN ({placeholders})", years)
+    cursor.execute(
+        f"INSERT INTO weather_city_year (city_id, year, {STATS}) "
+        f"SELECT city_id, year, {ROLLUP_AGG} FROM weather_city_month "
+        f"WHERE year IN ({placeholders}) GROUP BY city_id, year",
+        years
+    )
+
+def refresh_rollups(months=None):
+    """重建汇总表：months 为 [(年, 月), ...] 时只重算这些月份及其所在年份，否则全部重建
+
+    删除与重算在同一事务中提交，查询方不会看到汇总表为空的中间状态。
+    """
+    if months is not None and not months:
+        return
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            ensure_rollup_tables(cursor)
+            if months is None:
+                cursor.execute("SELECT MIN(date), MAX(date) FROM weather_daily")
+                first, last = cursor.fetchone()
+                if first is None:
+                    logger.warning("weather_daily 为空，跳过汇总表构建")
+                    conn.commit()
+                    return
+                for table in ('weather_city_month', 'weather_city_year', 'weather_province_month'):
+                    cursor.execute(f"DELETE FROM {table}")
+                _refresh_months(
+                    cursor, month_range(first.year, first.month)[0], month_range(last.year, last.month)[1]
+                )
+                years = list(range(first.year, last.year + 1))
+            else:
+                months = sorted(set(months))
+                # 连续的月份合并为一个日期范围重算
+                start = prev = months[0]
+                for current in months[1:] + [None]:
+                    if current is not None and (current[0] * 12 + current[1]) - (prev[0] * 12 + prev[1]) == 1:
+                        prev = current
+                        continue
+                    _refresh_months(cursor, month_range(*start)[0], month_range(*prev)[1])
+                    start = prev = current
+                years = sorted({year for year, _ in months})
+            _refresh_years(cursor, years)
+        conn.commit()
+        logger.info(f"汇总表已更新（{'全部重建' if months is None else f'{len(months)} 个月份'}），涉及年份 {years}")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def _is_month_aligned(start_date, end_date):
+    return (start_date is None or start_date.day == 1) and \
+        (end_date is None or end_date.day == calendar.monthrange(end_date.year, end_date.month)[1])
+
+def _is_year_aligned(start_date, end_date):
+    return (start_date is None or (start_date.month, start_date.day) == (1, 1)) and \
+        (end_date is None or (end_date.month, end_date.day) == (12, 31))
+
+def query_temperature_stats(level='city', period='month', keys=None, start_date=None, end_date=None):
+    """按 城市/省份 × 月/年 统计温度，返回 DataFrame（键, year[, month], days, min_temp_c, ...）
+
+    日期范围按整月（年）对齐时直接读汇总表，否则从 weather_daily 现算；
+    keys 为城市ID或省份名列表，None 表示全部。
+    """
+    if level not in ('city', 'province') or period not in ('month', 'year'):
+        raise ValueError(f"不支持的统计维度: {level} × {period}")
+    key = 'city_id' if level == 'city' else 'province'
+    group = [key, 'year'] + (['month'] if period == 'month' else [])
+    conditions, params = [], []
+
+    if period == 'year' and level == 'city' and _is_year_aligned(start_date, end_date):
+        # 城市年汇总可直接读取
+        source, key_expr, exprs = 'weather_city_year', key, STATS
+        bounds = [('year >= %s', start_date and start_date.year), ('year <= %s', end_date and end_date.year)]
+    elif _is_month_aligned(start_date, end_date):
+        # 月汇总直接读取，或按天数加权合并为年
+        source, key_expr = f"weather_{level}_month", key
+        exprs = STATS if period == 'month' else ROLLUP_AGG
+        bounds = [
+            ('year * 100 + month >= %s', start_date and start_date.year * 100 + start_date.month),
+            ('year * 100 + month <= %s', end_date and end_date.year * 100 + end_date.month)
+        ]
+    else:
+        source = 'weather_daily d' if level == 'city' else \
+            'weather_daily d JOIN city_province p ON p.city_id = d.city_id'
+        key_expr = 'd.city_id' if level == 'city' else 'p.province'
+        exprs = DAILY_AGG
+        group_exprs = [key_expr, 'YEAR(d.date)'] + (['MONTH(d.date)'] if period == 'month' else [])
+        bounds = [('d.date >= %s', start_date), ('d.date <= %s', end_date)]
+
+    for condition, value in bounds:
+        if value:
+            conditions.append(condition)
+            params.append(value)
+    if keys:
+        conditions.append(f"{key_expr} IN ({', '.join(['%s'] * len(keys))})")
+        params.extend(keys)
+    if source.startswith('weather_daily'):
+        columns = group_exprs
+    else:
+        columns = group
+    sql = f"SELECT {', '.join(columns)}, {exprs} FROM {source}"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    if exprs != STATS:
+        sql += f" GROUP BY {', '.join(columns)}"
+    sql += f" ORDER BY {', '.join(columns)}"
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+    finally:
+        conn.close()
+    logger.debug(f"温度统计（{level} × {period}）来自 {source}，共 {len(rows)} 行")
+    df = pd.DataFrame(list(rows), columns=group + STAT_COLUMNS)
+    for col in STAT_COLUMNS[1:]:
+        df[col] = pd.to_numeric(df[col]).astype(float)
+    return df
@@ -0,0 +1,168 @@
+import os
+import sys
+import shutil
+import tempfile
+from datetime import date
+from config.config import SCRAPER_CONFIG
+from src.utils.common import logger
+from src.db.mysql_ops import (
+    get_db_connection, table_exists, table_row_count, load_csv_file, swap_staging_table, INSERT_COLUMNS
+)
+from src.db.parallel_loader import split_csv_chunks
+
+# weather_daily 目标结构：(city_id, date) 聚簇主键，按年份 RANGE 分区；
+# 分区键必须包含在所有唯一键中，因此不使用自增主键和外键
+WEATHER_DAILY_COLUMNS = """
+    city_id INT NOT NULL,
+    date DATE NOT NULL,
+    temp_max_c DECIMAL(6, 2),
+    temp_min_c DECIMAL(6, 2),
+    temp_avg_c DECIMAL(6, 2),
+    PRIMARY KEY (city_id, date)
+"""
+MAX_PARTITION = 'pmax'
+
+def partition_name(year):
+    return f"p{year}"
+
+def default_partition_years(today=None):
+    """需要建立分区的年份：从配置的首个年份到今年（更晚的日期落入 pmax 分区）"""
+    years = list(SCRAPER_CONFIG['years'])
+    return list(range(min(years), max(max(years), (today or date.today()).year) + 1))
+
+def partition_clause(years):
+    """生成按年份的 RANGE 分区定义，末尾带 MAXVALUE 分区"""
+    parts = [f"PARTITION {partition_name(year)} VALUES LESS THAN ({year + 1})" for year in sorted(years)]
+    parts.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN MAXVALUE")
+    return "PARTITION BY RANGE (YEAR(date)) (\n    " + ",\n    ".join(parts) + "\n)"
+
+def weather_table_ddl(table='weather_daily', years=None):
+    """weather_daily 建表语句"""
+    years = years or default_partition_years()
+    return (
+        f"CREATE TABLE IF NOT EXISTS `{table}` ({WEATHER_DAILY_COLUMNS}) "
+        f"ENGINE=InnoDB DEFAULT CHARSET=utf8mb4\n{partition_clause(years)}"
+    )
+
+def get_partitions(cursor, table='weather_daily'):
+    """读取表的分区 {分区名: 上界描述}，未分区时返回空字典"""
+    cursor.execute(
+        "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION",
+        (table,)
+    )
+    return {name: description for name, description in cursor.fetchall()}
+
+def get_primary_key(cursor, table='weather_daily'):
+    """读取主键列（按顺序）"""
+    cursor.execute(
+        "SELECT COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND CONSTRAINT_NAME = 'PRIMARY' "
+        "ORDER BY ORDINAL_POSITION",
+        (table,)
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+def needs_migration(cursor, table='weather_daily'):
+    """表已存在但不是 (city_id, date) 主键 + 年份分区的结构"""
+    return get_primary_key(cursor, table) != ['city_id', 'date'] or MAX_PARTITION not in get_partitions(cursor, table)
+
+def migrate_weather_table(cursor, table='weather_daily', years=None):
+    """将旧结构的表迁移为目标结构：建新表、按主键去重复制数据后原子切换，旧表保留为上一代数据"""
+    new_table = f"{table}_migrating"
+    cols = ', '.join(INSERT_COLUMNS)
+    cursor.execute(f"DROP TABLE IF EXISTS `{new_table}`")
+    cursor.execute(weather_table_ddl(new_table, years))
+    # 旧表可能存在重复的 (city_id, date)，保留最后写入的一条
+    cursor.execute(
+        f"INSERT INTO `{new_table}` ({cols}) SELECT * FROM (SELECT {cols} FROM `{table}`) AS src "
+        "ON DUPLICATE KEY UPDATE temp_max_c = src.temp_max_c, "
+        "temp_min_c = src.temp_min_c, temp_avg_c = src.temp_avg_c"
+    )
+    logger.info(f"已复制 {table_row_count(cursor, new_table)} 条记录至新结构表")
+    swap_staging_table(cursor, table, staging=new_table)
+
+def add_year_partitions(cursor, years, table='weather_daily'):
+    """为尚不存在的年份从 pmax 拆分出分区（pmax 中已有的对应年份数据随之移动），返回新增的年份"""
+    existing = get_partitions(cursor, table)
+    new_years = sorted(year for year in years if partition_name(year) not in existing)
+    if not new_years:
+        return []
+    bounded = [int(bound) for name, bound in existing.items() if name != MAX_PARTITION]
+    if bounded and new_years[0] < max(bounded):
+        raise ValueError(f"年份 {new_years[0]} 早于已有分区，RANGE 分区只能在末尾追加")
+    parts = [f"PARTITION {partition_name(year)} VALUES LESS THAN ({year + 1})" for year in new_years]
+    parts.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN MAXVALUE")
+    cursor.execute(f"ALTER TABLE `{table}` REORGANIZE PARTITION {MAX_PARTITION} INTO ({', '.join(parts)})")
+    logger.info(f"{table} 新增分区: {[partition_name(year) for year in new_years]}")
+    return new_years
+
+def drop_year_partition(cursor, year, table='weather_daily'):
+    """删除某一年的分区及其数据（元数据操作，不逐行删除）"""
+    cursor.execute(f"ALTER TABLE `{table}` DROP PARTITION {partition_name(year)}")
+    logger.info(f"已删除 {table} 的 {year} 年分区")
+
+def truncate_year_partition(cursor, year, table='weather_daily'):
+    """清空某一年的分区，保留分区定义"""
+    cursor.execute(f"ALTER TABLE `{table}` TRUNCATE PARTITION {partition_name(year)}")
+
+def reload_year_partition(csv_path, year, table='weather_daily'):
+    """单独重载一年的数据：导入与目标表同结构的非分区交换表后 EXCHANGE PARTITION 替换该年分区
+
+    csv_path 可以是包含多个年份的总CSV，导入前只取出该年的行（否则 EXCHANGE 会因数据越界报错）。
+    其它年份不受影响；交换出的旧数据保留在交换表中，返回导入行数。
+    """
+    exchange_table = f"{table}_{partition_name(year)}_exchange"
+    chunk_dir = tempfile.mkdtemp(prefix='nasa_reload_')
+    year_csv = os.path.join(chunk_dir, 'year', f"year_{year}.csv")
+    split_csv_chunks(csv_path, os.path.dirname(year_csv), chunk_by='year')
+    if not os.path.exists(year_csv):
+        shutil.rmtree(chunk_dir, ignore_errors=True)
+        raise ValueError(f"{csv_path} 中没有 {year} 年的数据")
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            if partition_name(year) not in get_partitions(cursor, table):
+                raise ValueError(f"{table} 没有 {year} 年分区")
+            cursor.execute(f"DROP TABLE IF EXISTS `{exchange_table}`")
+            cursor.execute(f"CREATE TABLE `{exchange_table}` LIKE `{table}`")
+            cursor.execute(f"ALTER TABLE `{exchange_table}` REMOVE PARTITIONING")
+            rows = load_csv_file(cursor, year_csv, exchange_table)
+            conn.commit()
+            cursor.execute(
+                f"ALTER TABLE `{table}` EXCHANGE PARTITION {partition_name(year)} WITH TABLE `{exchange_table}`"
+            )
+        logger.info(f"{table} 的 {year} 年分区已替换为新数据（{rows} 条），旧数据保留在 {exchange_table}")
+        return rows
+    finally:
+        conn.close()
+        shutil.rmtree(chunk_dir, ignore_errors=True)
+
+def ensure_weather_schema(table='weather_daily'):
+    """建表或迁移 weather_daily 为目标结构，并补齐到今年为止的年份分区"""
+    years = default_partition_years()
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            if not table_exists(cursor, table):
+                cursor.execute(weather_table_ddl(table, years))
+                logger.info(f"已创建 {table}（按年份分区：{years[0]}-{years[-1]}）")
+            elif needs_migration(cursor, table):
+                logger.info(f"{table} 结构不是 (city_id, date) 主键 + 年份分区，开始迁移")
+                migrate_weather_table(cursor, table, years)
+            else:
+                add_year_partitions(cursor, years, table)
+        conn.commit()
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    # 用法：python -m src.db.schema [ddl|ensure]
+    #       python -m src.db.schema reload <总CSV路径> <年份>
+    if sys.argv[1:2] == ['ddl']:
+        print(weather_table_ddl(years=list(SCRAPER_CONFIG['years'])) + ';')
+    elif sys.argv[1:2] == ['reload'] and len(sys.argv) > 3:
+        reload_year_partition(sys.argv[2], int(sys.argv[3]))
+    else:
+        ensure_weather_schema()
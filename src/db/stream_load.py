@@ -0,0 +1,142 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+import pymysql
+from src.utils.common import logger
+from src.db.mysql_ops import (
+    get_db_connection, LOAD_DATA_SQL, INSERT_COLUMNS, format_floats, insert_frame, load_csv_file,
+    local_infile_available, is_local_infile_refused, mark_local_infile_refused
+)
+
+CSV_HEADER = (','.join(INSERT_COLUMNS) + '\n').encode('utf-8')
+
+def fifo_supported():
+    """当前系统是否支持命名管道（Windows 不支持）"""
+    return hasattr(os, 'mkfifo')
+
+def iter_csv_bytes(df, chunk_rows=50000):
+    """把清洗后的DataFrame分块编码为与总CSV相同格式的字节（含表头，缺失温度写为 \\N 即 NULL）"""
+    yield CSV_HEADER
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        if pd.api.types.is_datetime64_any_dtype(chunk['date']):
+            dates = chunk['date'].dt.strftime('%Y-%m-%d').tolist()
+        else:
+            dates = chunk['date'].astype(str).tolist()
+        rows = zip(
+            chunk['city_id'].to_numpy(dtype=np.int64).tolist(), dates,
+            format_floats(chunk['temp_max_c'], '\\N'),
+            format_floats(chunk['temp_min_c'], '\\N'),
+            format_floats(chunk['temp_avg_c'], '\\N')
+        )
+        yield ''.join(['%d,%s,%s,%s,%s\n' % row for row in rows]).encode('utf-8')
+
+class FifoWriter(threading.Thread):
+    """向命名管道写入数据的线程：open 会阻塞到 LOAD DATA 打开管道读取为止"""
+
+    def __init__(self, path, chunks):
+        super().__init__(name='fifo-writer', daemon=True)
+        self.path = path
+        self.chunks = chunks
+        self.bytes_written = 0
+        self.error = None
+
+    def run(self):
+        try:
+            with open(self.path, 'wb') as fifo:
+                for chunk in self.chunks:
+                    fifo.write(chunk)
+                    self.bytes_written += len(chunk)
+        except Exception as e:
+            self.error = e
+
+    def abort(self):
+        """读取端未打开或提前关闭时解除写线程阻塞"""
+        deadline = time.monotonic() + 5
+        while self.is_alive() and time.monotonic() < deadline:
+            try:
+                os.close(os.open(self.path, os.O_RDONLY | os.O_NONBLOCK))
+            except OSError:
+                pass
+            self.join(timeout=0.1)
+
+def load_frame_stream(conn, df, table='weather_daily'):
+    """不落盘导入一个DataFrame：数据经命名管道直接交给 LOAD DATA LOCAL INFILE，返回导入行数
+
+    列映射与总CSV导入相同；不支持命名管道或 LOCAL INFILE 被拒绝时改用多行INSERT。
+    调用方负责提交事务；写管道失败时抛出异常，调用方回滚即可撤销本次导入。
+    """
+    if df.empty:
+        return 0
+    if not (fifo_supported() and local_infile_available()):
+        return insert_frame(conn, df, table)
+
+    tmp_dir = tempfile.mkdtemp(prefix='nasa_load_')
+    fifo_path = os.path.join(tmp_dir, 'stream.csv')
+    os.mkfifo(fifo_path)
+    writer = FifoWriter(fifo_path, iter_csv_bytes(df))
+    writer.start()
+    try:
+        with conn.cursor() as cursor:
+            try:
+                cursor.execute(LOAD_DATA_SQL.format(table=table), (fifo_path,))
+            except pymysql.err.MySQLError as e:
+                if not is_local_infile_refused(e):
+                    raise
+                mark_local_infile_refused(e)
+                writer.abort()
+                return insert_frame(conn, df, table)
+            rows = cursor.rowcount
+        writer.join()
+        if writer.error is not None:
+            raise RuntimeError(f"写入命名管道失败，导入数据不完整: {writer.error}")
+        if rows != len(df):
+            logger.warning(f"流式导入行数 {rows} 与数据行数 {len(df)} 不一致")
+        return rows
+    finally:
+        writer.abort()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+# ---------- 性能对比 ----------
+def benchmark(csv_path, table='weather_daily_bench'):
+    """对比 “写出CSV再 LOAD DATA” 与 “命名管道流式 LOAD DATA” 的耗时（需要可用的数据库）"""
+    df = pd.read_csv(csv_path, usecols=INSERT_COLUMNS, parse_dates=['date'])
+    tmp_dir = tempfile.mkdtemp(prefix='nasa_bench_')
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS `{table}`")
+            cursor.execute(f"CREATE TABLE `{table}` LIKE weather_daily")
+
+            started = time.perf_counter()
+            file_path = os.path.join(tmp_dir, 'all_history_final.csv')
+            df.to_csv(file_path, index=False, date_format='%Y-%m-%d')
+            file_bytes = os.path.getsize(file_path)
+            file_rows = load_csv_file(cursor, file_path, table)
+            conn.commit()
+            file_sec = time.perf_counter() - started
+            os.remove(file_path)
+
+            cursor.execute(f"TRUNCATE TABLE `{table}`")
+            started = time.perf_counter()
+            stream_rows = load_frame_stream(conn, df, table)
+            conn.commit()
+            stream_sec = time.perf_counter() - started
+            cursor.execute(f"DROP TABLE `{table}`")
+        logger.info(
+            f"导入基准（{len(df)} 行）：写CSV+LOAD DATA {file_sec:.2f}s（{file_rows} 行，"
+            f"中间文件 {file_bytes / 1024 / 1024:.1f}MB），管道流式 {stream_sec:.2f}s（{stream_rows} 行，无中间文件）"
+        )
+        return file_sec, stream_sec
+    finally:
+        conn.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    # 用法：python -m src.db.stream_load data/all.csv
+    benchmark(sys.argv[1] if len(sys.argv) > 1 else 'data/all.csv')
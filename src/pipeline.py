@@ -0,0 +1,287 @@
+import os
+import time
+import queue
+import threading
+import pandas as pd
+from datetime import date, timedelta
+from config.config import SCRAPER_CONFIG, PIPELINE_CONFIG, LOAD_CONFIG, CUBE_CONFIG, PARQUET_CONFIG
+from config.cities import CITIES
+from src.utils.common import logger, expand_frame
+from src.scraper.nasa_scraper import iter_city_frames
+from src.scraper.stream_writer import PartitionWriter
+from src.db.rollups import refresh_rollups
+from src.db.stream_load import load_frame_stream
+from src.storage.cube import open_cube
+from src.storage.parquet_store import append_parquet
+from src.scraper.coverage import plan_refetch, refresh_coverage_from_db
+from src.db.mysql_ops import (
+    get_db_connection, insert_frame, upsert_frame, count_rows_by_city, get_high_water_marks,
+    prepare_staging_table, promote_staging
+)
+
+_END = object()  # 队列结束标记
+
+class LoaderWorker(threading.Thread):
+    """数据库写入线程：从有界队列取出清洗后的批次写入 weather_daily，每批提交一次
+
+    全量重载且开启 staging_swap 时写入影子表，由 run_pipeline 校验后原子切换。
+    """
+
+    def __init__(self, batch_queue, truncate=True):
+        super().__init__(name='db-loader', daemon=True)
+        self.batch_queue = batch_queue
+        self.truncate = truncate
+        self.staging = truncate and LOAD_CONFIG.get('staging_swap', False)
+        self.table = LOAD_CONFIG['staging_table'] if self.staging else 'weather_daily'
+        if not truncate:
+            # 不清空时表中已有数据：按 (city_id, date) 插入或更新，避免主键冲突
+            self.load = upsert_frame
+        elif PIPELINE_CONFIG.get('load_method', 'insert') == 'stream':
+            # stream：每批经命名管道 LOAD DATA，不落盘
+            self.load = load_frame_stream
+        else:
+            self.load = insert_frame
+        self.date_range = None  # 本次写入数据的 (最早, 最晚) 日期
+        self.rows_loaded = 0
+        self.batches = 0
+        self.load_seconds = 0.0
+        self.error = None
+
+    def run(self):
+        conn = None
+        try:
+            conn = get_db_connection()
+            if self.staging:
+                with conn.cursor() as cursor:
+                    prepare_staging_table(cursor, staging=self.table)
+            elif self.truncate:
+                with conn.cursor() as cursor:
+                    cursor.execute("TRUNCATE TABLE weather_daily")
+                conn.commit()
+            while True:
+                batch = self.batch_queue.get()
+                if batch is _END:
+                    break
+                started = time.perf_counter()
+                batch = expand_frame(batch)
+                self.rows_loaded += self.load(conn, batch, self.table)
+                conn.commit()
+                first, last = batch['date'].min().date(), batch['date'].max().date()
+                if self.date_range is not None:
+                    first, last = min(first, self.date_range[0]), max(last, self.date_range[1])
+                self.date_range = (first, last)
+                self.load_seconds += time.perf_counter() - started
+                self.batches += 1
+                logger.debug(f"第 {self.batches} 批写入完成，累计 {self.rows_loaded} 条")
+        except Exception as e:
+            self.error = e
+            logger.error(f"数据库写入线程失败: {e}", exc_info=True)
+            if conn:
+                conn.rollback()
+            # 清空队列，避免抓取线程在 put 时永久阻塞
+            while True:
+                try:
+                    self.batch_queue.get_nowait()
+                except queue.Empty:
+                    break
+        finally:
+            if conn:
+                conn.close()
+
+def reconcile_counts(expected, table='weather_daily', date_range=None):
+    """对比每个城市的期望行数与库中实际行数，返回不一致的城市 {city_id: (期望, 实际)}
+
+    date_range 为 (起, 止) 时只统计该日期范围内的行（表中保留了本次未写入的旧数据时使用）。
+    """
+    conn = get_db_connection()
+    try:
+        actual = count_rows_by_city(conn, table, date_range)
+    finally:
+        conn.close()
+    mismatched = {
+        city_id: (count, actual.get(city_id, 0))
+        for city_id, count in expected.items()
+        if actual.get(city_id, 0) != count
+    }
+    if mismatched:
+        logger.warning(f"对账发现 {len(mismatched)} 个城市行数不一致: {mismatched}")
+    else:
+        logger.info(f"对账通过：{len(expected)} 个城市共 {sum(expected.values())} 条记录与数据库一致")
+    return mismatched
+
+def run_pipeline():
+    """抓取与入库流水线：清洗后的数据按批次经有界队列交给写入线程，抓取与入库同时进行
+
+    数据库落后时队列写满，抓取端在 put 处阻塞（背压）；结束后按城市对账。
+    """
+    started = time.perf_counter()
+    batch_queue = queue.Queue(maxsize=PIPELINE_CONFIG['queue_size'])
+    loader = LoaderWorker(batch_queue, truncate=PIPELINE_CONFIG.get('truncate', True))
+    loader.start()
+
+    stream_config = SCRAPER_CONFIG.get('stream', {})
+    writer = None
+    if stream_config.get('enabled', False) and PIPELINE_CONFIG.get('write_csv', True):
+        writer = PartitionWriter(stream_config['partition_dir'], stream_config.get('partition_by', 'city'))
+
+    expected = {}
+    pending, pending_rows = [], 0
+    wait_seconds = 0.0
+
+    def put(batch):
+        nonlocal wait_seconds
+        put_started = time.perf_counter()
+        while loader.is_alive():
+            try:
+                batch_queue.put(batch, timeout=1)
+                break
+            except queue.Full:
+                continue
+        wait_seconds += time.perf_counter() - put_started
+
+    for group in iter_city_frames():
+        if loader.error is not None:
+            break
+        for city_id, city_df in group:
+            expected[city_id] = len(city_df)
+            if writer is not None:
+                writer.write_city(city_id, city_df)
+            pending.append(city_df)
+            pending_rows += len(city_df)
+        if pending_rows >= PIPELINE_CONFIG['batch_rows']:
+            put(pd.concat(pending, ignore_index=True))
+            pending, pending_rows = [], 0
+    if pending and loader.error is None:
+        put(pd.concat(pending, ignore_index=True))
+    put(_END)
+    loader.join()
+
+    if loader.error is not None:
+        raise RuntimeError(f"流水线入库失败: {loader.error}")
+    if writer is not None and writer.rows:
+        writer.merge_to(os.path.join(os.path.dirname(SCRAPER_CONFIG['output_dir']), 'all_history_final.csv'))
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"流水线完成：写入 {loader.rows_loaded} 条（{loader.batches} 批），总耗时 {elapsed:.2f}s，"
+        f"其中入库 {loader.load_seconds:.2f}s，抓取端因背压等待 {wait_seconds:.2f}s"
+    )
+    if not expected:
+        logger.warning("未抓取到任何有效数据")
+        return {}
+    # 不清空表时只对账本次写入的日期范围
+    mismatched = reconcile_counts(expected, loader.table, None if loader.truncate else loader.date_range)
+    if loader.staging:
+        if mismatched:
+            raise RuntimeError(f"影子表 {loader.table} 对账不一致，未切换线上表")
+        promote_staging(sum(expected.values()))
+    # 覆盖位图以实际入库的数据为准
+    refresh_coverage_from_db()
+    return mismatched
+
+def plan_incremental_ranges(high_water_marks, today=None):
+    """根据各城市已入库的最新日期计算增量抓取区间 {city_id: (start, end)}
+
+    从最新日期往前回看 lookback_days 天（覆盖NASA对近期数据的修订），截止到 today 减去发布延迟；
+    库中没有记录的城市从配置的首个年份开始抓取。
+    """
+    incremental = SCRAPER_CONFIG.get('incremental', {})
+    end = (today or date.today()) - timedelta(days=incremental.get('lag_days', 1))
+    first_day = date(min(SCRAPER_CONFIG['years']), 1, 1)
+    lookback = timedelta(days=incremental.get('lookback_days', 7))
+    ranges = {}
+    for city_id in CITIES:
+        mark = high_water_marks.get(city_id)
+        start = first_day if mark is None else max(first_day, mark + timedelta(days=1) - lookback)
+        if start <= end:
+            ranges[city_id] = (start.strftime('%Y%m%d'), end.strftime('%Y%m%d'))
+    return ranges
+
+def sync_incremental():
+    """增量同步：只抓取各城市最新日期之后（含回看窗口）的数据并 upsert 到 weather_daily，返回写入行数"""
+    started = time.perf_counter()
+    conn = get_db_connection()
+    try:
+        ranges = plan_incremental_ranges(get_high_water_marks(conn))
+        if not ranges:
+            logger.info("所有城市数据均已是最新，无需同步")
+            return 0
+        logger.info(f"增量同步 {len(ranges)} 个城市，日期范围示例: {next(iter(ranges.values()))}")
+        touched = upsert_ranges(conn, ranges)
+        logger.info(f"增量同步完成：upsert {touched} 条记录，耗时 {time.perf_counter() - started:.2f}s")
+        return touched
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def upsert_ranges(conn, ranges):
+    """强制重新抓取 ranges 指定的城市日期并逐组 upsert 到 weather_daily，返回写入行数
+
+    同步写入立方体文件和 Parquet 数据集（如启用），最后只重算涉及月份的汇总表。
+    """
+    touched = 0
+    touched_months = set()
+    cube = None
+    if CUBE_CONFIG.get('enabled', False):
+        if os.path.exists(CUBE_CONFIG['path']):
+            cube = open_cube(mode='r+')
+        else:
+            logger.warning(f"立方体文件 {CUBE_CONFIG['path']} 不存在，跳过追加（全量运行时会生成）")
+    cube_ok = cube is not None
+    try:
+        for group in iter_city_frames(ranges, use_cache=False):
+            frames = [city_df for _, city_df in group if not city_df.empty]
+            if not frames:
+                continue
+            batch = expand_frame(pd.concat(frames, ignore_index=True))
+            touched += upsert_frame(conn, batch)
+            conn.commit()
+            touched_months.update(zip(batch['date'].dt.year.tolist(), batch['date'].dt.month.tolist()))
+            if cube_ok:
+                try:
+                    cube.append_frame(batch)
+                except ValueError as e:
+                    # 新城市或早于首日的日期无法追加，本次不再写立方体，需要 build_cube 重建
+                    logger.warning(f"立方体追加失败，需要重建: {e}")
+                    cube_ok = False
+            if PARQUET_CONFIG.get('enabled', False):
+                append_parquet(batch)
+    finally:
+        if cube is not None:
+            cube.close()
+    if LOAD_CONFIG.get('build_rollups', False):
+        # 只重算本次写入涉及的月份
+        refresh_rollups(sorted(touched_months))
+    return touched
+
+def refetch_missing():
+    """按覆盖位图补抓缺失的 (城市, 日期) 并 upsert 到 weather_daily，返回写入行数
+
+    缺口按网格单元合并为最少的请求，绕过本地段缓存（缓存中的段正是缺测的来源）。
+    """
+    started = time.perf_counter()
+    # 按数据库实际内容规划缺口，而不是按抓取时记录的覆盖
+    coverage = refresh_coverage_from_db()
+    if coverage is None:
+        raise RuntimeError("补抓需要启用覆盖位图（COVERAGE_CONFIG['enabled']）")
+    ranges, requests = plan_refetch(coverage)
+    if not ranges:
+        logger.info("覆盖位图显示没有缺失数据，无需补抓")
+        return 0
+    before = int(coverage.missing_mask().sum())
+    logger.info(f"补抓 {len(ranges)} 个城市的缺失数据，共 {requests} 个请求，缺失 {before} 个 (城市, 日期)")
+    conn = get_db_connection()
+    try:
+        touched = upsert_ranges(conn, ranges)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    after = int(coverage.missing_mask().sum())
+    logger.info(
+        f"补抓完成：upsert {touched} 条记录，补齐 {before - after} 个 (城市, 日期)，"
+        f"仍缺 {after} 个（NASA 仍为缺测），耗时 {time.perf_counter() - started:.2f}s"
+    )
+    return touched
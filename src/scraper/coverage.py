@@ -0,0 +1,291 @@
+import os
+import sys
+import json
+import time
+import struct
+import threading
+import numpy as np
+import pandas as pd
+from datetime import date, timedelta
+from config.config import SCRAPER_CONFIG, COVERAGE_CONFIG
+from config.cities import CITIES
+from src.utils.common import logger, date_to_day
+from src.scraper.grid import load_grid_groups
+
+COVERAGE_MAGIC = b'NASACOV1'
+COVERAGE_PREFIX = struct.Struct('<8sI')  # 魔数、JSON 元数据长度；其后为按行 packbits 的位图
+EPOCH = date(1970, 1, 1)
+
+def configured_range(years=None):
+    """配置年份覆盖的日期轴：(起始日, 天数, 配置年份内的日期掩码)，日期以距 1970-01-01 的天数表示"""
+    years = sorted(set(years if years is not None else SCRAPER_CONFIG['years']))
+    start_day = date_to_day(date(years[0], 1, 1))
+    days = date_to_day(date(years[-1], 12, 31)) - start_day + 1
+    offsets = np.arange(days) + start_day
+    in_years = np.isin(offsets.astype('datetime64[D]').astype('datetime64[Y]').astype(np.int64) + 1970, years)
+    return start_day, days, in_years
+
+def format_day(day):
+    """距 1970-01-01 的天数转为 YYYYMMDD（与抓取接口的日期参数一致）"""
+    return (EPOCH + timedelta(days=int(day))).strftime('%Y%m%d')
+
+def find_runs(mask):
+    """二维布尔数组逐行求连续 True 区间，返回 (行号, 起始列, 结束列+1)，按行、列排序"""
+    padded = np.zeros((mask.shape[0], mask.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    return rows, starts, ends
+
+class CoverageIndex:
+    """(城市, 日期) 覆盖位图：每个城市每天一位，记录清洗（剔除 -999）后实际拿到的数据
+
+    内存中为布尔数组（294 城 × 5 年约 0.5MB），落盘时按位压缩；配置的城市或年份变化时按交集迁移已有位。
+    """
+
+    def __init__(self, path, city_ids=None, years=None):
+        self.path = path
+        self.city_ids = np.array(sorted(city_ids if city_ids is not None else CITIES), dtype=np.int64)
+        self.start_day, self.days, self.in_years = configured_range(years)
+        self.bits = np.zeros((len(self.city_ids), self.days), dtype=bool)
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        with open(self.path, 'rb') as f:
+            magic, meta_len = COVERAGE_PREFIX.unpack(f.read(COVERAGE_PREFIX.size))
+            if magic != COVERAGE_MAGIC:
+                raise ValueError(f"{self.path} 不是覆盖位图文件")
+            meta = json.loads(f.read(meta_len).decode('utf-8'))
+            packed = np.frombuffer(f.read(), dtype=np.uint8)
+        stored_ids = np.array(meta['city_ids'], dtype=np.int64)
+        stored = np.unpackbits(packed.reshape(len(stored_ids), -1), axis=1, count=meta['days']).astype(bool)
+        # 按城市和日期的交集迁移
+        first = max(self.start_day, meta['start_day'])
+        last = min(self.start_day + self.days, meta['start_day'] + meta['days'])
+        if last <= first:
+            return
+        _, new_rows, old_rows = np.intersect1d(self.city_ids, stored_ids, return_indices=True)
+        self.bits[new_rows, first - self.start_day:last - self.start_day] = \
+            stored[old_rows, first - meta['start_day']:last - meta['start_day']]
+
+    def save(self):
+        """写入临时文件后原子替换"""
+        with self._lock:
+            packed = np.packbits(self.bits, axis=1)
+        meta = json.dumps({
+            'city_ids': self.city_ids.tolist(), 'start_day': int(self.start_day), 'days': int(self.days)
+        }).encode('utf-8')
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(COVERAGE_PREFIX.pack(COVERAGE_MAGIC, len(meta)))
+            f.write(meta)
+            f.write(packed.tobytes())
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        with self._lock:
+            self.bits[:] = False
+
+    def _locate(self, city_ids, days):
+        """(城市, 天数) 数组转为位图下标，丢弃不在城市表或日期轴内的项"""
+        city_ids = np.asarray(city_ids, dtype=np.int64)
+        cols = np.asarray(days, dtype=np.int64) - self.start_day
+        rows = np.searchsorted(self.city_ids, city_ids)
+        rows = np.minimum(rows, len(self.city_ids) - 1)
+        keep = (self.city_ids[rows] == city_ids) & (cols >= 0) & (cols < self.days)
+        return rows[keep], cols[keep]
+
+    def mark(self, city_ids, days):
+        """标记 (城市, 日期) 已有数据，city_ids 可为单个城市或与 days 等长的数组"""
+        days = np.asarray(days, dtype=np.int64)
+        rows, cols = self._locate(np.broadcast_to(np.asarray(city_ids, dtype=np.int64), days.shape), days)
+        with self._lock:
+            self.bits[rows, cols] = True
+
+    def mark_frame(self, df, city_id=None):
+        """按清洗后的数据标记覆盖：紧凑格式用 day 列，入库格式用 date 列；未给 city_id 时取 city_id 列"""
+        if df.empty:
+            return
+        if 'day' in df.columns:
+            days = df['day'].to_numpy(dtype=np.int64)
+        else:
+            days = pd.to_datetime(df['date']).to_numpy().astype('datetime64[D]').astype(np.int64)
+        self.mark(df['city_id'].to_numpy() if city_id is None else city_id, days)
+
+    def reset_from_csv(self, csv_path, chunk_rows=200000):
+        """按总CSV重建位图（全量导入后数据库内容即为该文件）"""
+        started = time.perf_counter()
+        self.clear()
+        for chunk in pd.read_csv(csv_path, usecols=['city_id', 'date'], chunksize=chunk_rows):
+            self.mark_frame(chunk)
+        logger.info(f"已按 {csv_path} 重建覆盖位图，耗时 {time.perf_counter() - started:.2f}s")
+
+    def reset_from_db(self, table='weather_daily'):
+        """按数据库实际内容重建位图"""
+        from src.db.mysql_ops import get_db_connection
+        started = time.perf_counter()
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"SELECT city_id, DATEDIFF(date, '1970-01-01') FROM `{table}`")
+                rows = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 2)
+        finally:
+            conn.close()
+        self.clear()
+        self.mark(rows[:, 0], rows[:, 1])
+        logger.info(f"已按 {table} 重建覆盖位图（{len(rows)} 行），耗时 {time.perf_counter() - started:.2f}s")
+
+    def missing_mask(self):
+        """配置年份内缺失的 (城市, 日期)"""
+        with self._lock:
+            return self.in_years & ~self.bits
+
+    def missing_ranges(self, city_ids=None):
+        """各城市缺失的连续日期区间 {city_id: [(start, end), ...]}（YYYYMMDD，含两端），无缺失的城市不出现"""
+        missing = self.missing_mask()
+        rows = np.arange(len(self.city_ids))
+        if city_ids is not None:
+            rows, _ = self._locate(list(city_ids), np.full(len(city_ids), self.start_day))
+        run_rows, starts, ends = find_runs(missing[rows])
+        result = {}
+        for row, start, end in zip(run_rows.tolist(), starts.tolist(), ends.tolist()):
+            result.setdefault(int(self.city_ids[rows[row]]), []).append(
+                (format_day(self.start_day + start), format_day(self.start_day + end - 1))
+            )
+        return result
+
+    def report(self):
+        """各城市覆盖统计 DataFrame：应有天数、已有天数、缺失天数、缺口数、首个缺失日期、覆盖率"""
+        missing = self.missing_mask()
+        expected = int(self.in_years.sum())
+        missing_days = missing.sum(axis=1)
+        run_rows, starts, _ = find_runs(missing)
+        gaps = np.bincount(run_rows, minlength=len(self.city_ids))
+        first = np.full(len(self.city_ids), -1, dtype=np.int64)
+        # 每行第一个区间即首个缺失日期（find_runs 按行、列排序）
+        first_rows, first_idx = np.unique(run_rows, return_index=True)
+        first[first_rows] = starts[first_idx]
+        return pd.DataFrame({
+            'city_id': self.city_ids,
+            'name': [CITIES.get(int(city_id), ('',))[0] for city_id in self.city_ids],
+            'expected_days': expected,
+            'covered_days': expected - missing_days,
+            'missing_days': missing_days,
+            'gaps': gaps,
+            'first_missing': [format_day(self.start_day + col) if col >= 0 else None for col in first.tolist()],
+            'coverage': (expected - missing_days) / expected if expected else 1.0
+        })
+
+def plan_refetch(index, merge_gap_days=None):
+    """把缺失区间转为最少的抓取请求，返回 ({city_id: [(start, end), ...]}, 请求数)
+
+    同一网格单元的城市数据相同，按单元内缺失的并集规划，一次请求分发给单元内所有缺数据的城市；
+    相隔不超过 merge_gap_days 天的缺口合并为一个请求（多抓几天已有数据比多发一次请求划算）。
+    结果可直接作为 iter_city_frames 的 city_ranges。
+    """
+    if merge_gap_days is None:
+        merge_gap_days = COVERAGE_CONFIG.get('merge_gap_days', 31)
+    missing = index.missing_mask()
+    row_of = {int(city_id): row for row, city_id in enumerate(index.city_ids.tolist())}
+    if SCRAPER_CONFIG.get('grid', {}).get('enabled', True):
+        cells = list(load_grid_groups(CITIES).values())
+    else:
+        cells = [[city_id] for city_id in CITIES]
+    cells = [[row_of[city_id] for city_id in cell if city_id in row_of] for cell in cells]
+    cells = [rows for rows in cells if rows]
+    cell_missing = np.array([missing[rows].any(axis=0) for rows in cells]).reshape(len(cells), index.days)
+    run_cells, starts, ends = find_runs(cell_missing)
+
+    plan, requests = {}, 0
+    spans, current = [], None
+    for cell, start, end in zip(run_cells.tolist(), starts.tolist(), ends.tolist()):
+        if current is not None and current[0] == cell and start - current[2] <= merge_gap_days:
+            current[2] = end
+        else:
+            if current is not None:
+                spans.append(tuple(current))
+            current = [cell, start, end]
+    if current is not None:
+        spans.append(tuple(current))
+    for cell, start, end in spans:
+        span = (format_day(index.start_day + start), format_day(index.start_day + end - 1))
+        for row in cells[cell]:
+            if missing[row, start:end].any():
+                plan.setdefault(int(index.city_ids[row]), []).append(span)
+        requests += 1
+    return plan, requests
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_coverage_index():
+    """获取共享的覆盖位图（首次调用时加载或创建）"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = CoverageIndex(COVERAGE_CONFIG['path'])
+    return _index
+
+def refresh_coverage_from_db(table='weather_daily'):
+    """入库完成后按数据库实际内容重建并保存覆盖位图（未启用覆盖位图时跳过）"""
+    if not COVERAGE_CONFIG.get('enabled', False):
+        return None
+    coverage = get_coverage_index()
+    coverage.reset_from_db(table)
+    coverage.save()
+    return coverage
+
+def log_report(index=None, top=10):
+    """输出覆盖报告：整体覆盖率及缺失最多的城市，返回报告 DataFrame"""
+    index = index or get_coverage_index()
+    started = time.perf_counter()
+    report = index.report()
+    elapsed = time.perf_counter() - started
+    incomplete = report[report['missing_days'] > 0].sort_values('missing_days', ascending=False)
+    total = int(report['expected_days'].sum())
+    logger.info(
+        f"覆盖报告（{len(report)} 个城市，耗时 {elapsed * 1000:.1f}ms）：整体覆盖率 "
+        f"{report['covered_days'].sum() / total:.2%}，{len(incomplete)} 个城市存在缺口，"
+        f"共缺 {int(report['missing_days'].sum())} 天" if total else "覆盖报告：未配置年份"
+    )
+    for row in incomplete.head(top).itertuples():
+        logger.info(
+            f"  {row.name}（{row.city_id}）缺 {row.missing_days} 天 / {row.gaps} 个缺口，首个缺失 {row.first_missing}"
+        )
+    return report
+
+if __name__ == '__main__':
+    # 用法：python -m src.scraper.coverage [report]
+    #       python -m src.scraper.coverage rebuild <总CSV路径> | rebuild-db
+    #       python -m src.scraper.coverage plan | refetch
+    args = sys.argv[1:]
+    command = args[0] if args else 'report'
+    index = get_coverage_index()
+    if command == 'rebuild' and len(args) > 1:
+        index.reset_from_csv(args[1])
+        index.save()
+        log_report(index)
+    elif command == 'rebuild-db':
+        index.reset_from_db()
+        index.save()
+        log_report(index)
+    elif command == 'plan':
+        started = time.perf_counter()
+        plan, requests = plan_refetch(index)
+        logger.info(
+            f"补抓计划：{len(plan)} 个城市，{requests} 个请求，规划耗时 {(time.perf_counter() - started) * 1000:.1f}ms"
+        )
+        for city_id, spans in list(plan.items())[:10]:
+            logger.info(f"  {CITIES[city_id][0]}（{city_id}）: {spans}")
+    elif command == 'refetch':
+        from src.pipeline import refetch_missing
+        refetch_missing()
+    elif command == 'report':
+        log_report(index)
+    else:
+        print("用法: python -m src.scraper.coverage [report] | rebuild <csv> | rebuild-db | plan | refetch")
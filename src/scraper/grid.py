@@ -0,0 +1,58 @@
+import os
+import json
+import hashlib
+from config.config import SCRAPER_CONFIG
+from src.utils.common import logger
+
+def grid_cell(lat, lng, lat_step=0.5, lng_step=0.625):
+    """返回坐标所在的 NASA POWER（MERRA-2）网格单元索引 (纬向, 经向)"""
+    return int(round((lat + 90) / lat_step)), int(round((lng + 180) / lng_step))
+
+def cities_fingerprint(cities, lat_step, lng_step):
+    """城市表与网格参数的指纹，用于判断缓存的映射是否过期"""
+    payload = json.dumps(
+        [lat_step, lng_step, sorted((cid, lat, lng) for cid, (_, lat, lng) in cities.items())],
+        ensure_ascii=False
+    )
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def build_grid_groups(cities, lat_step=0.5, lng_step=0.625):
+    """按网格单元分组城市，返回 {(纬向, 经向): [city_id, ...]}（保持 CITIES 中的顺序）"""
+    groups = {}
+    for city_id, (_, lat, lng) in cities.items():
+        groups.setdefault(grid_cell(lat, lng, lat_step, lng_step), []).append(city_id)
+    return groups
+
+def load_grid_groups(cities, cache_path=None):
+    """读取城市→网格单元映射，缓存文件缺失或 CITIES 变更时重新计算并写回"""
+    grid_config = SCRAPER_CONFIG.get('grid', {})
+    lat_step = grid_config.get('lat_step', 0.5)
+    lng_step = grid_config.get('lng_step', 0.625)
+    cache_path = cache_path or grid_config.get('cache_file')
+    fingerprint = cities_fingerprint(cities, lat_step, lng_step)
+
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get('fingerprint') == fingerprint:
+                return {
+                    tuple(int(i) for i in key.split('_')): city_ids
+                    for key, city_ids in cached['cells'].items()
+                }
+            logger.info("城市列表或网格参数已变化，重新计算网格映射")
+        except Exception as e:
+            logger.warning(f"读取网格映射缓存失败，重新计算: {e}")
+
+    groups = build_grid_groups(cities, lat_step, lng_step)
+    if cache_path:
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'fingerprint': fingerprint,
+                'lat_step': lat_step,
+                'lng_step': lng_step,
+                'cells': {f"{i}_{j}": city_ids for (i, j), city_ids in groups.items()}
+            }, f, ensure_ascii=False, indent=2)
+    shared = sum(len(ids) for ids in groups.values() if len(ids) > 1)
+    logger.info(f"{len(cities)} 个城市分布在 {len(groups)} 个网格单元中，其中 {shared} 个城市与其它城市共享网格")
+    return groups
@@ -0,0 +1,219 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import tracemalloc
+from io import StringIO
+import numpy as np
+import pandas as pd
+from src.utils.common import logger, civil_to_days, civil_to_datetime, compact_frame, write_frame_csv
+
+# NASA POWER 日数据必要列及其类型
+NASA_COLUMNS = ['YEAR', 'MO', 'DY', 'T2M_MAX', 'T2M_MIN', 'T2M']
+TEMP_COLUMNS = ['T2M_MAX', 'T2M_MIN', 'T2M']
+NASA_DTYPES = {
+    'YEAR': np.int64, 'MO': np.int64, 'DY': np.int64,
+    'T2M_MAX': np.float64, 'T2M_MIN': np.float64, 'T2M': np.float64
+}
+MISSING_VALUE = -999  # NASA 缺测标记
+
+def find_header(text):
+    """定位数据表头行，返回 (表头起始偏移, 表头之前的行数)；找不到时返回 (None, None)"""
+    header_end = text.find('-END HEADER-')
+    pos = text.find('YEAR', max(header_end, 0))
+    while pos >= 0:
+        line_start = text.rfind('\n', 0, pos) + 1
+        line_end = text.find('\n', pos)
+        line = text[line_start:line_end if line_end >= 0 else len(text)]
+        if not line.lstrip().startswith('#') and 'MO' in line and 'T2M_MAX' in line:
+            return line_start, text.count('\n', 0, line_start)
+        pos = text.find('YEAR', line_end) if line_end >= 0 else -1
+    return None, None
+
+def parse_nasa_csv(text):
+    """单次解析NASA POWER CSV响应：直接从原始文本读取必要列，缺测值（-999）所在行同时剔除
+
+    返回 YEAR/MO/DY/T2M_MAX/T2M_MIN/T2M 列；找不到表头或缺少必要列时抛出 ValueError。
+    """
+    header_pos, skip_lines = find_header(text)
+    if header_pos is None:
+        raise ValueError("未找到有效表头")
+    header_end = text.find('\n', header_pos)
+    header = [col.strip() for col in text[header_pos:header_end if header_end >= 0 else len(text)].split(',')]
+    missing_cols = [col for col in NASA_COLUMNS if col not in header]
+    if missing_cols:
+        raise ValueError(f"缺少必要列: {missing_cols}")
+    # C 引擎自行推断的类型与 NASA_DTYPES 一致，且比逐列指定 dtype 更快；这里用 numpy 统一转换
+    df = pd.read_csv(StringIO(text), skiprows=skip_lines, usecols=NASA_COLUMNS, engine='c')
+    columns = {col: np.asarray(df[col].to_numpy(), dtype=NASA_DTYPES[col]) for col in NASA_COLUMNS}
+    valid = np.ones(len(df), dtype=bool)
+    for col in TEMP_COLUMNS:
+        values = columns[col]
+        valid &= (values != MISSING_VALUE) & ~np.isnan(values)
+    if not valid.all():
+        columns = {col: values[valid] for col, values in columns.items()}
+    return pd.DataFrame(columns)
+
+def to_clean_frame(raw_df, city_id):
+    """将解析结果转为紧凑格式的清洗后数据（city_id, day, temp_max_c, temp_min_c, temp_avg_c），日期按整数年月日计算"""
+    return compact_frame(
+        city_id, civil_to_days(raw_df['YEAR'], raw_df['MO'], raw_df['DY']),
+        raw_df['T2M_MAX'].to_numpy(), raw_df['T2M_MIN'].to_numpy(), raw_df['T2M'].to_numpy()
+    )
+
+# ---------- 性能对比 ----------
+def _legacy_parse(text):
+    """改造前的解析路径：逐行查找表头、strip 后重新拼接，再交给 read_csv"""
+    lines = text.split('\n')
+    header_idx = None
+    for idx, line in enumerate(lines):
+        line_stripped = line.strip()
+        if not line_stripped or line_stripped.startswith('#'):
+            continue
+        if 'YEAR' in line_stripped and 'MO' in line_stripped and 'T2M_MAX' in line_stripped:
+            header_idx = idx
+            break
+    data_lines = [line.strip() for line in lines[header_idx + 1:] if line.strip()]
+    return pd.read_csv(StringIO(lines[header_idx].strip() + '\n' + '\n'.join(data_lines)))
+
+def _legacy_clean(df, city_id):
+    """改造前的清洗路径：字符串拼接 + zfill 生成日期，再过滤 -999"""
+    df = df[NASA_COLUMNS].copy()
+    df['city_id'] = city_id
+    df['date'] = pd.to_datetime(
+        df['YEAR'].astype(str) + '-' +
+        df['MO'].astype(str).str.zfill(2) + '-' +
+        df['DY'].astype(str).str.zfill(2)
+    )
+    df = df.rename(columns={'T2M_MAX': 'temp_max_c', 'T2M_MIN': 'temp_min_c', 'T2M': 'temp_avg_c'})
+    df = df[['city_id', 'date', 'temp_max_c', 'temp_min_c', 'temp_avg_c']]
+    return df[(df[['temp_max_c', 'temp_min_c', 'temp_avg_c']] != -999).all(axis=1)]
+
+def _wide_clean_frame(raw_df, city_id):
+    """改造前的清洗结果：city_id int64、date datetime64、温度 float64"""
+    return pd.DataFrame({
+        'city_id': np.full(len(raw_df), city_id, dtype=np.int64),
+        'date': civil_to_datetime(raw_df['YEAR'], raw_df['MO'], raw_df['DY']),
+        'temp_max_c': raw_df['T2M_MAX'].to_numpy(),
+        'temp_min_c': raw_df['T2M_MIN'].to_numpy(),
+        'temp_avg_c': raw_df['T2M'].to_numpy()
+    })
+
+def build_sample_responses(csv_path, years=1):
+    """把入库格式的CSV（如 data/all.csv）还原为每个城市一份的NASA响应文本
+
+    years 大于 1 时把样本数据按年平移复制，模拟多年的完整抓取。
+    """
+    df = pd.read_csv(csv_path, parse_dates=['date'])
+    if years > 1:
+        df = pd.concat(
+            [df.assign(date=df['date'] - pd.DateOffset(years=shift)) for shift in range(years - 1, -1, -1)],
+            ignore_index=True
+        )
+    header = (
+        "-BEGIN HEADER-\n"
+        "NASA/POWER Source Native Resolution Daily Data\n"
+        "Missing data is -999\n"
+        "Parameter(s):\n"
+        "T2M_MAX     Temperature at 2 Meters Maximum (C)\n"
+        "T2M_MIN     Temperature at 2 Meters Minimum (C)\n"
+        "T2M         Temperature at 2 Meters (C)\n"
+        "-END HEADER-\n"
+        "YEAR,MO,DY,T2M_MAX,T2M_MIN,T2M\n"
+    )
+    responses = []
+    for city_id, city_df in df.groupby('city_id', sort=True):
+        body = pd.DataFrame({
+            'YEAR': city_df['date'].dt.year,
+            'MO': city_df['date'].dt.month,
+            'DY': city_df['date'].dt.day,
+            'T2M_MAX': city_df['temp_max_c'],
+            'T2M_MIN': city_df['temp_min_c'],
+            'T2M': city_df['temp_avg_c']
+        }).to_csv(index=False, header=False)
+        responses.append((city_id, header + body))
+    return responses
+
+def benchmark(csv_path, repeat=3):
+    """对比改造前后的解析+清洗耗时（取多次运行的最短时间）"""
+    responses = build_sample_responses(csv_path)
+
+    def run(parse_and_clean):
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rows = sum(len(parse_and_clean(text, city_id)) for city_id, text in responses)
+            best = min(best, time.perf_counter() - started)
+        return best, rows
+
+    legacy_sec, total_rows = run(lambda text, city_id: _legacy_clean(_legacy_parse(text), city_id))
+    fast_sec, fast_rows = run(lambda text, city_id: to_clean_frame(parse_nasa_csv(text), city_id))
+    assert fast_rows == total_rows, "新旧解析结果行数不一致"
+    logger.info(
+        f"解析基准（{len(responses)} 个响应，{total_rows} 行）：旧路径 {legacy_sec:.3f}s，"
+        f"新解析器 {fast_sec:.3f}s，加速 {legacy_sec / fast_sec:.1f} 倍"
+    )
+    return legacy_sec, fast_sec
+
+def benchmark_memory(csv_path, years=1):
+    """对比宽类型与紧凑格式在 “解析→清洗→合并→写出CSV” 全过程中的峰值内存（tracemalloc）"""
+    responses = build_sample_responses(csv_path, years)
+
+    out_path = os.path.join(tempfile.mkdtemp(prefix='nasa_mem_'), 'all.csv')
+
+    def legacy():
+        # 改造前：宽类型逐城市去重、合并后整体去重，再整体 to_csv
+        frames = [
+            _wide_clean_frame(parse_nasa_csv(text), city_id).drop_duplicates(subset=['date'], keep='last')
+            for city_id, text in responses
+        ]
+        final_df = pd.concat(frames, ignore_index=True).drop_duplicates(subset=['city_id', 'date'], keep='last')
+        del frames
+        final_df.to_csv(out_path, index=False, date_format='%Y-%m-%d')
+        return final_df
+
+    def compact():
+        # 现路径：紧凑格式逐城市去重、合并，写出时分块转换
+        frames = [
+            to_clean_frame(parse_nasa_csv(text), city_id).drop_duplicates(subset=['day'], keep='last')
+            .reset_index(drop=True)
+            for city_id, text in responses
+        ]
+        final_df = pd.concat(frames, ignore_index=True)
+        del frames
+        write_frame_csv(final_df, out_path)
+        return final_df
+
+    def run(func):
+        tracemalloc.start()
+        try:
+            final_df = func()
+            return len(final_df), final_df.memory_usage().sum(), tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    try:
+        rows, wide_bytes, wide_peak = run(legacy)
+        compact_rows, compact_bytes, compact_peak = run(compact)
+    finally:
+        shutil.rmtree(os.path.dirname(out_path), ignore_errors=True)
+    assert rows == compact_rows, "两种格式的行数不一致"
+    mb = 1024 * 1024
+    logger.info(
+        f"内存基准（{len(responses)} 个响应，{years} 年，{rows} 行）：合并后数据 宽类型 {wide_bytes / mb:.1f}MB → "
+        f"紧凑 {compact_bytes / mb:.1f}MB；峰值内存 {wide_peak / mb:.1f}MB → {compact_peak / mb:.1f}MB"
+        f"（降低 {1 - compact_peak / wide_peak:.0%}）"
+    )
+    return wide_peak, compact_peak
+
+if __name__ == '__main__':
+    # 用法：python -m src.scraper.nasa_parser data/all.csv
+    #       python -m src.scraper.nasa_parser data/all.csv --memory [年数]
+    args = sys.argv[1:]
+    csv_path = args[0] if args and not args[0].startswith('--') else 'data/all.csv'
+    if '--memory' in args:
+        idx = args.index('--memory')
+        benchmark_memory(csv_path, int(args[idx + 1]) if len(args) > idx + 1 else 1)
+    else:
+        benchmark(csv_path)
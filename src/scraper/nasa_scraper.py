@@ -1,25 +1,68 @@
 import os
 import time
 import random
+import threading
+import functools
 import pandas as pd
-from io import StringIO
-from config.config import SCRAPER_CONFIG, NASA_API_CONFIG
-from src.utils.common import logger, create_retry_session, clean_nasa_data
+import requests
+from collections import deque
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from config.config import SCRAPER_CONFIG, NASA_API_CONFIG, COVERAGE_CONFIG
+from src.utils.common import (
+    logger, get_shared_session, close_shared_session, clean_nasa_data, date_to_day, write_frame_csv
+)
+from src.scraper.rate_limiter import get_rate_limiter, reset_rate_limiter, parse_retry_after
+from src.scraper.grid import load_grid_groups
+from src.scraper.segment_cache import get_segment_manifest
+from src.scraper.coverage import get_coverage_index
+from src.scraper.nasa_parser import parse_nasa_csv
+from src.scraper.stream_writer import PartitionWriter
 from config.cities import CITIES  #城市数据地址
 
-def fetch_city_segment(city_id, name, lat, lng, start_date, end_date):
-    """抓取单个城市的一段日期数据（支持断点续抓）"""
-    # 断点续抓：检查本地是否已存在该段数据
-    seg_filename = f"city_{city_id}_{start_date}_{end_date}.csv"
-    seg_path = os.path.join(SCRAPER_CONFIG['output_dir'], seg_filename)
-    if os.path.exists(seg_path):
-        logger.info(f"城市 {name}（{city_id}）{start_date}-{end_date} 已存在，跳过抓取")
-        with open(seg_path, 'r', encoding='utf-8') as f:
-            return f.read()
-    
-    # 发送请求（带重试）
-    session = create_retry_session(SCRAPER_CONFIG['retry'])
-    for try_num in range(3):  # 额外重试3次（配合session的重试机制）
+# 请求失败原因：只有超时和请求过大说明窗口太大，拆分后重试才有意义
+FAIL_TIMEOUT = 'timeout'
+FAIL_OVERSIZE = 'oversize'
+FAIL_THROTTLED = 'throttled'
+FAIL_ERROR = 'error'
+SPLIT_REASONS = (FAIL_TIMEOUT, FAIL_OVERSIZE)
+
+def classify_failure(error=None, status=None):
+    """按异常或HTTP状态码判断失败原因"""
+    if isinstance(error, requests.exceptions.ReadTimeout) or status == 504:
+        return FAIL_TIMEOUT
+    if status in (413, 414):
+        return FAIL_OVERSIZE
+    if status in (429, 503):
+        return FAIL_THROTTLED
+    return FAIL_ERROR
+
+def fetch_city_segment(city_id, name, lat, lng, start_date, end_date, attempts=3, use_cache=True):
+    """抓取单个城市的一段日期数据（支持断点续抓，attempts 为额外重试次数，use_cache=False 时强制重新抓取）"""
+    return request_segment(city_id, name, lat, lng, start_date, end_date, attempts, use_cache)[0]
+
+def request_segment(city_id, name, lat, lng, start_date, end_date, attempts=3, use_cache=True, stop_on=()):
+    """抓取一段日期数据，返回 (原始文本, 失败原因)，成功时失败原因为 None
+
+    失败原因属于 stop_on 时不再重试、立即返回（调用方改为拆分窗口）。
+    """
+    # 断点续抓：通过缓存清单检查本地是否已存在该段数据
+    manifest = get_segment_manifest()
+    if use_cache and manifest.contains(city_id, start_date, end_date):
+        text = manifest.read_raw(city_id, start_date, end_date)
+        if text is not None:
+            logger.info(f"城市 {name}（{city_id}）{start_date}-{end_date} 已存在，跳过抓取")
+            return text, None
+
+    # 发送请求（复用共享连接池，经全局限流器调度，重试受全局重试预算约束）
+    session = get_shared_session(SCRAPER_CONFIG['retry'], SCRAPER_CONFIG.get('pool'))
+    limiter = get_rate_limiter()
+    reason = FAIL_ERROR
+    for try_num in range(attempts):
+        if try_num > 0 and not limiter.budget.try_acquire():
+            logger.warning(f"城市 {name}（{city_id}）{start_date}-{end_date} 全局重试预算已用尽，放弃重试")
+            break
+        started = limiter.acquire()
         try:
             response = session.get(
                 url=NASA_API_CONFIG['url'],
@@ -34,119 +77,385 @@ def fetch_city_segment(city_id, name, lat, lng, start_date, end_date):
                 },
                 timeout=SCRAPER_CONFIG['timeout']
             )
+        except Exception as e:
+            limiter.release(started, error=True)
+            reason = classify_failure(error=e)
+            logger.warning(
+                f"城市 {name}（{city_id}）{start_date}-{end_date} 第{try_num+1}次失败: {e}"
+            )
+            if reason in stop_on:
+                return None, reason
+            if try_num + 1 < attempts:
+                time.sleep(2 ** try_num + random.random())  # 指数退避
+            continue
+        limiter.release(
+            started,
+            status=response.status_code,
+            retry_after=parse_retry_after(response.headers.get('Retry-After'))
+        )
+        try:
             response.raise_for_status()  # 触发HTTP错误（如404/500）
-            # 保存数据到本地（断点续抓用）
-            with open(seg_path, 'w', encoding='utf-8') as f:
-                f.write(response.text)
+            # 保存数据到本地 pack 文件（断点续抓用）
+            manifest.record(city_id, start_date, end_date, response.text)
             logger.debug(f"城市 {name}（{city_id}）{start_date}-{end_date} 抓取成功")
-            return response.text
+            return response.text, None
         except Exception as e:
+            reason = classify_failure(status=response.status_code)
             logger.warning(
                 f"城市 {name}（{city_id}）{start_date}-{end_date} 第{try_num+1}次失败: {e}"
             )
-            time.sleep(2 ** try_num + random.random())  # 指数退避
+            if reason in stop_on:
+                return None, reason
+            if try_num + 1 < attempts:
+                time.sleep(2 ** try_num + random.random())  # 指数退避
     logger.error(f"城市 {name}（{city_id}）{start_date}-{end_date} 抓取失败")
-    return None
-
-def fetch_city_year(city_id, name, lat, lng, year):
-    """抓取单个城市一整年的数据（按季度分段）"""
-    segments = [
-        (f"{year}0101", f"{year}0331"),  # Q1
-        (f"{year}0401", f"{year}0630"),  # Q2
-        (f"{year}0701", f"{year}0930"),  # Q3
-        (f"{year}1001", f"{year}1231")   # Q4
-    ]
-    all_data = []
-    for start, end in segments:
-        seg_data = fetch_city_segment(city_id, name, lat, lng, start, end)
-        if not seg_data:
+    return None, reason
+
+def _parse_day(day_str):
+    return datetime.strptime(day_str, '%Y%m%d').date()
+
+def _format_day(day):
+    return day.strftime('%Y%m%d')
+
+def plan_cache_coverage(cached_segments, start_date, end_date):
+    """根据已缓存段计算 [start_date, end_date] 的覆盖情况，返回 (可复用段, 待抓取缺口)"""
+    start, end = _parse_day(start_date), _parse_day(end_date)
+    candidates = sorted(
+        (_parse_day(s), _parse_day(e)) for s, e in cached_segments
+    )
+    reused, gaps = [], []
+    cursor = start
+    for seg_start, seg_end in candidates:
+        # 只复用完全落在目标区间内、且不与已选段重叠的缓存段
+        if seg_start < cursor or seg_end > end:
             continue
-        # 解析CSV数据
-        #lines = seg_data.split('\n')
-        # 跳过注释行（动态查找数据起始行）
-        #data_lines = [line for line in lines if line.strip() and not line.startswith('#')]
-        #if not data_lines:
-        #    logger.warning(f"城市 {name}（{city_id}）{start}-{end} 无有效数据")
-        #    continue
-        # 转换为DataFrame
-        #try:
-        #    df = pd.read_csv(StringIO('\n'.join(data_lines)))
-        #    all_data.append(df)
-        #except Exception as e:
-        #    logger.error(f"城市 {name}（{city_id}）{start}-{end} 解析失败: {e}")
-        lines = seg_data.split('\n')
-        header_line_idx = None  # 表头行的索引
-        data_start_idx = None   # 数据行的起始索引
-
-        # 1. 遍历所有行，找到表头行（包含关键字 YEAR 和 T2M_MAX）
-        for idx, line in enumerate(lines):
-            line_stripped = line.strip()
-            # 跳过空行和注释行
-            if not line_stripped or line_stripped.startswith('#'):
+        if seg_start > cursor:
+            gaps.append((cursor, seg_start - timedelta(days=1)))
+        reused.append((_format_day(seg_start), _format_day(seg_end)))
+        cursor = seg_end + timedelta(days=1)
+    if cursor <= end:
+        gaps.append((cursor, end))
+    return reused, [(_format_day(s), _format_day(e)) for s, e in gaps]
+
+class WindowPlanner:
+    """自适应请求窗口：从最大窗口开始，超时或请求过大时二分，并记住可用的窗口大小供后续城市使用
+
+    当前窗口大小的请求成功后窗口翻倍，逐步恢复到 max_days。
+    """
+
+    def __init__(self, max_days, min_days):
+        self.min_days = max(1, min_days)
+        self.max_days = max(max_days, self.min_days)
+        self.window_days = self.max_days
+        self._lock = threading.Lock()
+
+    def current(self):
+        with self._lock:
+            return self.window_days
+
+    def record_failure(self, days):
+        """窗口 days 请求失败：后续城市的起始窗口不超过其一半"""
+        with self._lock:
+            shrunk = max(self.min_days, days // 2)
+            if shrunk < self.window_days:
+                self.window_days = shrunk
+                logger.info(f"请求窗口缩小至 {shrunk} 天")
+
+    def record_success(self, days):
+        """窗口 days 请求成功：不小于当前窗口时将窗口翻倍（不超过 max_days）"""
+        with self._lock:
+            if days >= self.window_days and self.window_days < self.max_days:
+                self.window_days = min(self.max_days, self.window_days * 2)
+                logger.info(f"请求窗口恢复至 {self.window_days} 天")
+
+    def can_split(self, days):
+        return days > self.min_days
+
+def fetch_city_range(city_id, name, lat, lng, start_date, end_date, planner=None, cached=None, use_cache=True):
+    """抓取单个城市一段连续日期的数据：优先复用本地段文件，缺口按自适应窗口请求，超时或请求过大时二分重试
+
+    use_cache=False 时忽略本地缓存全部重新抓取（增量同步需要拿到NASA修订后的数据）。
+    返回按起始日期排序的 [(start, end, 原始文本或已解析的DataFrame), ...]
+    """
+    manifest = get_segment_manifest()
+    if not use_cache:
+        cached = {}
+    cached = cached if cached is not None else manifest.cached_ranges()
+    reused, gaps = plan_cache_coverage(cached.get(city_id, []), start_date, end_date)
+    results = []
+    for s, e in reused:
+        # 已解析过的段直接使用清单中的二进制结果，否则读取原始文本
+        parsed = manifest.load_parsed(city_id, s, e)
+        results.append((s, e, parsed if parsed is not None else fetch_city_segment(city_id, name, lat, lng, s, e)))
+    if planner is None:
+        coalesce = SCRAPER_CONFIG.get('coalesce', {})
+        planner = WindowPlanner(
+            (_parse_day(end_date) - _parse_day(start_date)).days + 1,
+            coalesce.get('min_window_days', 90)
+        )
+
+    budget = get_rate_limiter().budget
+    for gap_start, gap_end in gaps:
+        # 按当前窗口切分缺口，栈顶为最早的一段；第三项标记是否为拆分后的重新请求
+        pending = []
+        cursor, gap_end_day = _parse_day(gap_start), _parse_day(gap_end)
+        window = planner.current()
+        while cursor <= gap_end_day:
+            chunk_end = min(cursor + timedelta(days=window - 1), gap_end_day)
+            pending.append((cursor, chunk_end, False))
+            cursor = chunk_end + timedelta(days=1)
+        pending.reverse()
+
+        while pending:
+            chunk_start, chunk_end, is_retry = pending.pop()
+            days = (chunk_end - chunk_start).days + 1
+            # 拆分后的请求属于重试，与普通重试共用全局重试预算；预算耗尽后不再拆分，该段记为失败
+            if is_retry and not budget.try_acquire():
+                logger.warning(
+                    f"城市 {name}（{city_id}）{_format_day(chunk_start)}-{_format_day(chunk_end)} "
+                    f"全局重试预算已用尽，放弃拆分重试"
+                )
+                results.append((_format_day(chunk_start), _format_day(chunk_end), None))
                 continue
-            # 表头行必须包含 YEAR、MO、T2M_MAX（NASA CSV 固定表头）
-            if 'YEAR' in line_stripped and 'MO' in line_stripped and 'T2M_MAX' in line_stripped:
-                header_line_idx = idx
-                data_start_idx = idx + 1  # 数据行从表头下一行开始
-                break
-
-        # 2. 检查是否找到有效表头
-        if header_line_idx is None:
-            logger.warning(f"城市 {name}（{city_id}）{start}-{end} 未找到有效表头，跳过")
-            continue
+            splittable = planner.can_split(days)
+            # 超时或请求过大时立即二分；限流、连接错误等与窗口大小无关，按正常重试处理，不拆分
+            text, reason = request_segment(
+                city_id, name, lat, lng, _format_day(chunk_start), _format_day(chunk_end),
+                use_cache=use_cache, stop_on=SPLIT_REASONS if splittable else ()
+            )
+            if text:
+                planner.record_success(days)
+            if text or reason not in SPLIT_REASONS or not splittable:
+                results.append((_format_day(chunk_start), _format_day(chunk_end), text))
+                continue
+            planner.record_failure(days)
+            mid = chunk_start + timedelta(days=days // 2 - 1)
+            logger.info(
+                f"城市 {name}（{city_id}）{_format_day(chunk_start)}-{_format_day(chunk_end)} "
+                f"请求{'超时' if reason == FAIL_TIMEOUT else '过大'}，拆分为两段重试"
+            )
+            pending.append((mid + timedelta(days=1), chunk_end, True))
+            pending.append((chunk_start, mid, True))
 
-        # 3. 提取表头 + 数据行（确保列数匹配）
-        header_line = lines[header_line_idx].strip()
-        data_lines = [line.strip() for line in lines[data_start_idx:] if line.strip()]  # 过滤数据行中的空行
+    results.sort(key=lambda item: item[0])
+    return results
 
-        # 4. 合并表头和数据行，生成完整的CSV字符串
-        csv_str = header_line + '\n' + '\n'.join(data_lines)
-        if len(data_lines) == 0:
-            logger.warning(f"城市 {name}（{city_id}）{start}-{end} 无数据行，跳过")
-            continue
+def year_spans(years):
+    """将配置年份合并为连续区间 [(start_date, end_date), ...]"""
+    spans = []
+    for year in sorted(set(years)):
+        if spans and spans[-1][1] == year - 1:
+            spans[-1][1] = year
+        else:
+            spans.append([year, year])
+    return [(f"{first}0101", f"{last}1231") for first, last in spans]
+
+def merge_spans(spans):
+    """合并重叠或首尾相接的日期区间 [(start_date, end_date), ...]"""
+    merged = []
+    for start, end in sorted((_parse_day(s), _parse_day(e)) for s, e in spans):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(_format_day(start), _format_day(end)) for start, end in merged]
 
-        # 5. 解析CSV（此时列数必然匹配）
+def parse_segments(city_id, name, seg_results):
+    """解析一个城市各段的原始CSV文本，返回合并后的未清洗DataFrame（已解析的段直接使用）"""
+    all_data = []
+    for start, end, seg_data in seg_results:
+        if isinstance(seg_data, pd.DataFrame):
+            all_data.append(seg_data)
+            continue
+        if not seg_data:
+            continue
+        # 单次解析：定位表头后直接读取必要列，同时剔除缺测值
         try:
-            df = pd.read_csv(StringIO(csv_str))
-            # 额外校验：确保必要列存在（防止API返回格式变更）
-            required_cols = ['YEAR', 'MO', 'DY', 'T2M_MAX', 'T2M_MIN', 'T2M']
-            missing_cols = [col for col in required_cols if col not in df.columns]
-            if missing_cols:
-                logger.warning(f"城市 {name}（{city_id}）{start}-{end} 缺少必要列: {missing_cols}，跳过")
-                continue
-            all_data.append(df)
-            logger.debug(f"城市 {name}（{city_id}）{start}-{end} 解析成功，共 {len(df)} 条数据")
+            df = parse_nasa_csv(seg_data)
+        except ValueError as e:
+            logger.warning(f"城市 {name}（{city_id}）{start}-{end} {e}，跳过")
+            continue
         except Exception as e:
             logger.error(f"城市 {name}（{city_id}）{start}-{end} 解析失败: {e}", exc_info=True)
+            continue
+        if df.empty:
+            logger.warning(f"城市 {name}（{city_id}）{start}-{end} 无数据行，跳过")
+            continue
+        all_data.append(df)
+        get_segment_manifest().store_parsed(city_id, start, end, df)
+        logger.debug(f"城市 {name}（{city_id}）{start}-{end} 解析成功，共 {len(df)} 条数据")
     if not all_data:
         return pd.DataFrame()
-    # 合并全年数据并清洗
-    year_df = pd.concat(all_data, ignore_index=True)
-    return clean_nasa_data(year_df, city_id)
+    return pd.concat(all_data, ignore_index=True)
 
-def fetch_all_cities():
-    """抓取所有城市的多年数据"""
-    all_df = []
-    for year in SCRAPER_CONFIG['years']:
-        logger.info(f"开始抓取 {year} 年数据")
-        for city_id, (name, lat, lng) in CITIES.items():
+def iter_ordered(func, jobs, workers):
+    """在有界线程池中执行任务，按提交顺序产出 (任务参数, 结果)
+
+    最多只有 workers*2 个任务在途，避免一次性提交全部任务占用内存；
+    单个任务抛出的异常会被记录并以 None 作为结果，不影响其它任务。
+    产出顺序与 jobs 完全一致（与完成先后无关）：慢任务会挡住其后已完成的任务，在途窗口因此不会继续推进，
+    调用方可以依赖这一顺序按提交顺序连续切分结果。
+    """
+    if workers <= 1:
+        for job in jobs:
             try:
-                city_df = fetch_city_year(city_id, name, lat, lng, year)
-                if not city_df.empty:
-                    all_df.append(city_df)
-                    logger.info(f"城市 {name}（{city_id}）{year} 年数据处理完成，共 {len(city_df)} 条")
+                yield job, func(*job)
             except Exception as e:
-                logger.error(f"城市 {name}（{city_id}）{year} 年处理失败: {e}")
+                logger.error(f"任务 {job[:2]} 执行失败: {e}")
+                yield job, None
+        return
+
+    def _result(job, future):
+        try:
+            return future.result()
+        except Exception as e:
+            logger.error(f"任务 {job[:2]} 执行失败: {e}")
+            return None
+
+    window = workers * 2
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='nasa-fetch') as executor:
+        for job in jobs:
+            pending.append((job, executor.submit(func, *job)))
+            if len(pending) >= window:
+                done_job, future = pending.popleft()
+                yield done_job, _result(done_job, future)
+        while pending:
+            done_job, future = pending.popleft()
+            yield done_job, _result(done_job, future)
+
+def iter_city_frames(city_ranges=None, use_cache=True):
+    """按网格单元逐组产出清洗后的城市数据 [(city_id, DataFrame), ...]
+
+    city_ranges 为 {city_id: (start, end)} 或 {city_id: [(start, end), ...]} 时只抓取这些城市的指定日期
+    （增量同步、按覆盖位图补抓），否则抓取全部城市在配置年份内的数据。同一单元所有日期段处理完成后才产出该组，
+    每个城市的数据已按日期去重；调用方可逐组处理，内存中只保留当前单元的数据。
+    """
+    workers = SCRAPER_CONFIG.get('workers', 1)
+    coalesce = SCRAPER_CONFIG.get('coalesce', {})
+    if city_ranges is None:
+        city_spans = {city_id: year_spans(SCRAPER_CONFIG['years']) for city_id in CITIES}
+    else:
+        city_spans = {
+            city_id: list(spans) if isinstance(spans, list) else [spans]
+            for city_id, spans in city_ranges.items() if city_id in CITIES
+        }
+    # 同一网格单元内的城市数据完全相同：每个单元只请求一次（以首个城市为代表），再分发给单元内所有城市
+    if SCRAPER_CONFIG.get('grid', {}).get('enabled', True):
+        cells = load_grid_groups(CITIES).values()
+    else:
+        cells = [[city_id] for city_id in CITIES]
+    members, jobs = {}, []
+    for cell in cells:
+        city_ids = [city_id for city_id in cell if city_id in city_spans]
+        if not city_ids:
+            continue
+        rep_id = city_ids[0]
+        members[rep_id] = city_ids
+        if city_ranges is None:
+            rep_spans = city_spans[rep_id]
+        else:
+            # 单元内各城市区间的并集作为代表城市的请求区间
+            rep_spans = merge_spans([span for city_id in city_ids for span in city_spans[city_id]])
+        name, lat, lng = CITIES[rep_id]
+        jobs.extend((rep_id, name, lat, lng, start, end) for start, end in rep_spans)
+    if not jobs:
+        logger.info("没有需要抓取的日期范围")
+        return
+
+    if coalesce.get('enabled', True):
+        max_days = max((_parse_day(job[5]) - _parse_day(job[4])).days + 1 for job in jobs)
+        planner = WindowPlanner(max_days, coalesce.get('min_window_days', 90))
+    else:
+        # 关闭合并时按最小窗口固定切分请求
+        planner = WindowPlanner(coalesce.get('min_window_days', 90), coalesce.get('min_window_days', 90))
+    fetch = functools.partial(
+        fetch_city_range, planner=planner,
+        cached=get_segment_manifest().cached_ranges() if use_cache else {}, use_cache=use_cache
+    )
+    coverage = get_coverage_index() if COVERAGE_CONFIG.get('enabled', False) else None
+    if coverage is not None and city_ranges is None:
+        # 全量抓取的结果即完整数据集，覆盖位图从头记录
+        coverage.clear()
+    logger.info(f"共 {len(jobs)} 个抓取任务（{len(city_spans)} 个城市），并发线程数 {workers}，起始窗口 {planner.current()} 天")
+
+    def finish_group(group_frames):
+        group = []
+        for city_id, frames in group_frames.items():
+            city_df = pd.concat(frames, ignore_index=True).drop_duplicates(subset=['day'], keep='last')
+            city_df = city_df.reset_index(drop=True)
+            if coverage is not None:
+                coverage.mark_frame(city_df, city_id)
+            logger.info(f"城市 {CITIES[city_id][0]}（{city_id}）数据处理完成，共 {len(city_df)} 条")
+            group.append((city_id, city_df))
+        return group
+
+    group_rep, group_frames = None, {}
+    try:
+        for (rep_id, rep_name, lat, lng, start, end), seg_results in iter_ordered(fetch, jobs, workers):
+            # 任务按代表城市连续排列，代表城市变化即上一组全部完成
+            if rep_id != group_rep and group_frames:
+                yield finish_group(group_frames)
+                group_frames = {}
+            group_rep = rep_id
+            try:
+                raw_df = parse_segments(rep_id, rep_name, seg_results or [])
+            except Exception as e:
+                logger.error(f"城市 {rep_name}（{rep_id}）{start}-{end} 解析失败: {e}")
+                continue
+            if raw_df.empty:
                 continue
+            for city_id in members[rep_id]:
+                try:
+                    city_df = clean_nasa_data(raw_df, city_id)
+                    if city_ranges is not None:
+                        # 代表城市按并集请求，这里裁剪回各城市自己的区间
+                        keep = pd.Series(False, index=city_df.index)
+                        for span_start, span_end in city_spans[city_id]:
+                            keep |= (
+                                (city_df['day'] >= date_to_day(_parse_day(span_start))) &
+                                (city_df['day'] <= date_to_day(_parse_day(span_end)))
+                            )
+                        city_df = city_df[keep]
+                    if not city_df.empty:
+                        group_frames.setdefault(city_id, []).append(city_df)
+                except Exception as e:
+                    logger.error(f"城市 {CITIES[city_id][0]}（{city_id}）{start}-{end} 处理失败: {e}")
+                    continue
+        if group_frames:
+            yield finish_group(group_frames)
+        if coverage is not None:
+            coverage.save()
+    finally:
+        close_shared_session()
+        logger.info(f"限流器统计: {get_rate_limiter().metrics()}")
+        # 每轮抓取使用独立的重试预算和速率状态，同一进程内的后续抓取（如同步后补抓）重新按配置初始化
+        reset_rate_limiter()
+
+def fetch_all_cities():
+    """抓取所有城市的多年数据并保存为总CSV，返回文件路径（流式模式下逐城市写出分区，内存占用固定）"""
+    final_path = os.path.join(os.path.dirname(SCRAPER_CONFIG['output_dir']), 'all_history_final.csv')
+    stream_config = SCRAPER_CONFIG.get('stream', {})
+    if stream_config.get('enabled', False):
+        writer = PartitionWriter(stream_config['partition_dir'], stream_config.get('partition_by', 'city'))
+        for group in iter_city_frames():
+            for city_id, city_df in group:
+                writer.write_city(city_id, city_df)
+        if writer.rows == 0:
+            logger.warning("未抓取到任何有效数据")
+            return None
+        logger.info(f"所有数据抓取完成，共 {writer.rows} 条（去重后），写出 {writer.partitions} 个分区")
+        return writer.merge_to(final_path)
+
+    all_df = [city_df for group in iter_city_frames() for _, city_df in group]
     if not all_df:
         logger.warning("未抓取到任何有效数据")
         return None
-    # 合并所有数据并去重
+    # 合并所有数据（每个城市只出现在一个网格组中，且组内已按日期去重，无需再整体去重）
     final_df = pd.concat(all_df, ignore_index=True)
-    final_df = final_df.drop_duplicates(subset=['city_id', 'date'], keep='last')
-    logger.info(f"所有数据抓取完成，共 {len(final_df)} 条（去重后）")
-    # 保存到总数据文件
-    final_path = os.path.join(os.path.dirname(SCRAPER_CONFIG['output_dir']), 'all_history_final.csv')
-    final_df.to_csv(final_path, index=False, date_format='%Y-%m-%d')
+    del all_df
+    logger.info(f"所有数据抓取完成，共 {len(final_df)} 条（去重后），占用内存 {final_df.memory_usage().sum() / 1024 / 1024:.1f}MB")
+    # 保存到总数据文件（分块转换为入库格式）
+    write_frame_csv(final_df, final_path)
     logger.info(f"总数据已保存至 {final_path}")
-    return final_path
\ No newline at end of file
+    return final_path
@@ -0,0 +1,127 @@
+import os
+import re
+import zlib
+import struct
+import threading
+from src.utils.common import logger
+
+# 记录格式：魔数 | 键长度 | 压缩数据长度 | CRC32 | 键 | zlib 压缩数据
+RECORD_MAGIC = b'NPK1'
+RECORD_HEADER = struct.Struct('<4sHII')
+PACK_FILE_PATTERN = re.compile(r'^pack_(\d{5})\.pack$')
+
+class PackStore:
+    """只追加的压缩段数据包：多个段写入同一个 pack 文件，通过 (文件, 偏移, 长度) 随机读取
+
+    每条记录自带键和校验，索引丢失时可顺序扫描 pack 文件重建。
+    """
+
+    def __init__(self, pack_dir, max_pack_bytes=256 * 1024 * 1024, compress_level=6):
+        self.pack_dir = pack_dir
+        self.max_pack_bytes = max_pack_bytes
+        self.compress_level = compress_level
+        self._lock = threading.Lock()
+        self._writer = None
+        self._writer_name = None
+        os.makedirs(pack_dir, exist_ok=True)
+
+    def pack_names(self):
+        """按编号排序的全部 pack 文件名"""
+        return sorted(name for name in os.listdir(self.pack_dir) if PACK_FILE_PATTERN.match(name))
+
+    def _next_pack_name(self):
+        names = self.pack_names()
+        number = int(PACK_FILE_PATTERN.match(names[-1]).group(1)) + 1 if names else 0
+        return f"pack_{number:05d}.pack"
+
+    def _open_writer(self, force_new=False):
+        if self._writer is not None and not force_new:
+            if self._writer.tell() < self.max_pack_bytes:
+                return
+        self._close_writer()
+        names = self.pack_names()
+        if names and not force_new and \
+                os.path.getsize(os.path.join(self.pack_dir, names[-1])) < self.max_pack_bytes:
+            name = names[-1]
+        else:
+            name = self._next_pack_name()
+        self._writer = open(os.path.join(self.pack_dir, name), 'ab')
+        self._writer_name = name
+
+    def _close_writer(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            self._writer_name = None
+
+    def append(self, key, data):
+        """压缩并追加一条记录，返回 (pack 文件名, 偏移, 记录长度)"""
+        key_bytes = key.encode('utf-8')
+        payload = zlib.compress(data, self.compress_level)
+        record = RECORD_HEADER.pack(RECORD_MAGIC, len(key_bytes), len(payload), zlib.crc32(payload)) \
+            + key_bytes + payload
+        with self._lock:
+            self._open_writer()
+            offset = self._writer.tell()
+            self._writer.write(record)
+            self._writer.flush()
+            return self._writer_name, offset, len(record)
+
+    def read(self, pack_name, offset, length):
+        """按位置读取并解压一条记录"""
+        with open(os.path.join(self.pack_dir, pack_name), 'rb') as f:
+            f.seek(offset)
+            record = f.read(length)
+        return self.decode_record(record)[1]
+
+    @staticmethod
+    def decode_record(record):
+        """解码一条完整记录，返回 (键, 原始数据)"""
+        magic, key_len, payload_len, crc = RECORD_HEADER.unpack_from(record)
+        if magic != RECORD_MAGIC:
+            raise ValueError("pack 记录魔数不匹配")
+        start = RECORD_HEADER.size
+        key = record[start:start + key_len].decode('utf-8')
+        payload = record[start + key_len:start + key_len + payload_len]
+        if len(payload) != payload_len or zlib.crc32(payload) != crc:
+            raise ValueError(f"pack 记录 {key} 校验失败")
+        return key, zlib.decompress(payload)
+
+    def iter_pack(self, pack_name):
+        """顺序扫描一个 pack 文件，产出 (键, 偏移, 记录长度, 原始数据)；遇到截断的尾部记录时停止"""
+        with open(os.path.join(self.pack_dir, pack_name), 'rb') as f:
+            buffer = f.read()
+        offset = 0
+        while offset + RECORD_HEADER.size <= len(buffer):
+            _, key_len, payload_len, _ = RECORD_HEADER.unpack_from(buffer, offset)
+            length = RECORD_HEADER.size + key_len + payload_len
+            try:
+                key, data = self.decode_record(buffer[offset:offset + length])
+            except Exception as e:
+                logger.warning(f"{pack_name} 偏移 {offset} 处记录损坏，停止扫描: {e}")
+                break
+            yield key, offset, length, data
+            offset += length
+
+    def start_new_pack(self):
+        """切换到新的 pack 文件（压缩整理时写入新一代数据）"""
+        with self._lock:
+            self._open_writer(force_new=True)
+
+    def remove_packs(self, pack_names):
+        with self._lock:
+            for name in pack_names:
+                if name == self._writer_name:
+                    self._close_writer()
+                os.remove(os.path.join(self.pack_dir, name))
+
+    def sync(self):
+        """将当前 pack 文件刷入磁盘"""
+        with self._lock:
+            if self._writer is not None:
+                self._writer.flush()
+                os.fsync(self._writer.fileno())
+
+    def close(self):
+        with self._lock:
+            self._close_writer()
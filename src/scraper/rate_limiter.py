@@ -0,0 +1,176 @@
+import time
+import threading
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from config.config import SCRAPER_CONFIG
+from src.utils.common import logger
+
+class RetryBudget:
+    """全局重试预算：重试总数不超过 min_retries + ratio * 请求总数"""
+
+    def __init__(self, ratio, min_retries):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.requests = 0
+        self.retries = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def try_acquire(self):
+        """申请一次重试额度，预算耗尽时返回 False"""
+        with self._lock:
+            if self.retries < self.min_retries + self.ratio * self.requests:
+                self.retries += 1
+                return True
+            self.rejected += 1
+            return False
+
+class AdaptiveRateLimiter:
+    """所有抓取线程共享的令牌桶限流器，按 AIMD 调整请求速率与并发数
+
+    - 成功且延迟正常：速率和并发数加性增长（每轮请求约 +rate_step 次/秒、+1 并发）
+    - 429/5xx、请求异常或延迟超过阈值：速率和并发数乘性下降（冷却期内只下降一次）
+    - 响应带 Retry-After 时，所有线程暂停到指定时间
+    """
+
+    def __init__(self, config):
+        self.min_rate = config.get('min_rate', 0.5)
+        self.max_rate = config.get('max_rate', 20.0)
+        self.rate_step = config.get('rate_step', 0.5)
+        self.min_concurrency = config.get('min_concurrency', 1)
+        self.max_concurrency = config.get('max_concurrency', 16)
+        self.latency_threshold = config.get('latency_threshold', 20.0)
+        self.decrease_factor = config.get('decrease_factor', 0.5)
+        self.decrease_cooldown = config.get('decrease_cooldown', 2.0)
+        self.rate = float(config.get('initial_rate', 5.0))
+        self.concurrency = float(config.get('initial_concurrency', 4))
+        self.budget = RetryBudget(
+            config.get('retry_budget_ratio', 0.1),
+            config.get('min_retries', 10)
+        )
+
+        self._tokens = 1.0
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = float('-inf')
+        self._in_flight = 0
+        self._throttled = 0
+        self._errors = 0
+        self._latency_total = 0.0
+        self._completed = 0
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        burst = max(1.0, self.concurrency)
+        self._tokens = min(burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self):
+        """阻塞直到拿到令牌和并发名额，返回请求开始时间"""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._in_flight >= int(self.concurrency):
+                    wait = 1.0  # 等待其它请求释放名额（release 时会唤醒）
+                elif self._tokens < 1.0:
+                    wait = (1.0 - self._tokens) / self.rate
+                else:
+                    self._tokens -= 1.0
+                    self._in_flight += 1
+                    break
+                self._cond.wait(timeout=wait)
+        self.budget.record_request()
+        return time.monotonic()
+
+    def release(self, started, status=None, retry_after=None, error=False):
+        """请求结束：根据状态码、异常与延迟调整速率和并发数"""
+        latency = time.monotonic() - started
+        congested = error or status == 429 or (status is not None and status >= 500)
+        with self._cond:
+            self._in_flight -= 1
+            self._completed += 1
+            self._latency_total += latency
+            now = time.monotonic()
+            if status in (429, 503):
+                self._throttled += 1
+            if error:
+                self._errors += 1
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+                logger.warning(f"服务端要求等待 {retry_after:.1f} 秒（Retry-After），暂停所有请求")
+            if congested or latency > self.latency_threshold:
+                if now - self._last_decrease >= self.decrease_cooldown:
+                    self._last_decrease = now
+                    self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                    self.concurrency = max(self.min_concurrency, self.concurrency * self.decrease_factor)
+                    logger.info(
+                        f"检测到拥塞（状态码 {status}，延迟 {latency:.1f}s），"
+                        f"速率降至 {self.rate:.2f} 次/秒，并发降至 {int(self.concurrency)}"
+                    )
+            else:
+                window = max(self.concurrency, 1.0)
+                self.rate = min(self.max_rate, self.rate + self.rate_step / window)
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1.0 / window)
+            if self._completed % 200 == 0:
+                logger.info(
+                    f"限流器状态：速率 {self.rate:.2f} 次/秒，并发上限 {int(self.concurrency)}，"
+                    f"已完成 {self._completed} 次请求，重试 {self.budget.retries} 次"
+                )
+            self._cond.notify_all()
+
+    def metrics(self):
+        """当前限流状态：速率、并发上限、在途请求数及重试预算使用情况"""
+        with self._cond:
+            return {
+                'rate': round(self.rate, 2),
+                'concurrency': int(self.concurrency),
+                'in_flight': self._in_flight,
+                'requests': self.budget.requests,
+                'retries': self.budget.retries,
+                'retries_rejected': self.budget.rejected,
+                'throttled': self._throttled,
+                'errors': self._errors,
+                'avg_latency': round(self._latency_total / self._completed, 3) if self._completed else 0.0
+            }
+
+def parse_retry_after(value):
+    """解析 Retry-After 头（秒数或 HTTP 日期），返回需等待的秒数"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+# 进程内共享的限流器
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def get_rate_limiter():
+    """获取所有抓取线程共享的限流器"""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = AdaptiveRateLimiter(SCRAPER_CONFIG.get('rate_limit', {}))
+    return _limiter
+
+def reset_rate_limiter():
+    """丢弃当前限流器（下次抓取重新按配置初始化）"""
+    global _limiter
+    with _limiter_lock:
+        _limiter = None
@@ -0,0 +1,315 @@
+import os
+import re
+import sys
+import zlib
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+from config.config import SCRAPER_CONFIG
+from src.utils.common import logger
+from src.scraper.pack_store import PackStore
+
+SEGMENT_FILE_PATTERN = re.compile(r'^city_(\d+)_(\d{8})_(\d{8})\.csv$')
+
+# 解析后段数据的固定列顺序（以 float64 矩阵形式存入清单）
+PARSED_COLUMNS = ['YEAR', 'MO', 'DY', 'T2M_MAX', 'T2M_MIN', 'T2M']
+
+def segment_filename(city_id, start_date, end_date):
+    """段文件名（旧版每段一个文件的缓存）"""
+    return f"city_{city_id}_{start_date}_{end_date}.csv"
+
+def segment_key(city_id, start_date, end_date):
+    """段在 pack 记录中的键"""
+    return f"{city_id}_{start_date}_{end_date}"
+
+class SegmentManifest:
+    """段缓存清单（SQLite）：记录每个段的大小、校验和、行数、抓取时间及解析后的二进制数据
+
+    续抓时一次查询即可得到全部已缓存段，已解析过的段直接从清单读取，无需重新读取和解析原始CSV。
+    原始响应压缩后追加到 pack 文件，清单同时充当 pack 的偏移索引；旧版的单段文件仍可读取，
+    执行 compact() 时会被并入 pack。
+    """
+
+    def __init__(self, db_path, output_dir, pack_store=None):
+        self.db_path = db_path
+        self.output_dir = output_dir
+        self.packs = pack_store or PackStore(os.path.join(output_dir, 'packs'))
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS segments (
+                city_id INTEGER NOT NULL,
+                start_date TEXT NOT NULL,
+                end_date TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                byte_size INTEGER NOT NULL,
+                checksum TEXT NOT NULL,
+                row_count INTEGER,
+                fetched_at TEXT NOT NULL,
+                parsed BLOB,
+                pack_file TEXT,
+                pack_offset INTEGER,
+                pack_length INTEGER,
+                PRIMARY KEY (city_id, start_date, end_date)
+            )
+        """)
+        # 兼容没有 pack 列的旧版清单
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(segments)")}
+        for column, column_type in [('pack_file', 'TEXT'), ('pack_offset', 'INTEGER'), ('pack_length', 'INTEGER')]:
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE segments ADD COLUMN {column} {column_type}")
+        self._conn.commit()
+        if self.count() == 0:
+            self.import_existing_files()
+            self.rebuild_from_packs()
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+
+    def import_existing_files(self):
+        """将清单建立之前已下载的段文件登记入清单（仅首次建立清单时执行）"""
+        if not os.path.isdir(self.output_dir):
+            return 0
+        imported = 0
+        for filename in os.listdir(self.output_dir):
+            match = SEGMENT_FILE_PATTERN.match(filename)
+            if not match:
+                continue
+            path = os.path.join(self.output_dir, filename)
+            with open(path, 'rb') as f:
+                data = f.read()
+            fetched_at = datetime.fromtimestamp(os.path.getmtime(path)).isoformat(timespec='seconds')
+            self._record(int(match.group(1)), match.group(2), match.group(3), filename, data, fetched_at)
+            imported += 1
+        with self._lock:
+            self._conn.commit()
+        if imported:
+            logger.info(f"已将 {imported} 个历史段文件登记到缓存清单")
+        return imported
+
+    def rebuild_from_packs(self):
+        """顺序扫描全部 pack 文件，把其中的段重新登记到清单（清单丢失或损坏后使用），返回登记的段数
+
+        同一段出现多次时以后写入的记录为准（pack 编号与偏移越大越新）；抓取时间取 pack 文件的修改时间。
+        """
+        recovered = {}
+        for pack_name in self.packs.pack_names():
+            fetched_at = datetime.fromtimestamp(
+                os.path.getmtime(os.path.join(self.packs.pack_dir, pack_name))
+            ).isoformat(timespec='seconds')
+            for key, offset, length, data in self.packs.iter_pack(pack_name):
+                try:
+                    city_id, start_date, end_date = key.split('_')
+                    recovered[(int(city_id), start_date, end_date)] = (data, fetched_at, (pack_name, offset, length))
+                except ValueError:
+                    logger.warning(f"{pack_name} 偏移 {offset} 处记录键 {key} 无法识别，跳过")
+        for (city_id, start_date, end_date), (data, fetched_at, location) in recovered.items():
+            self._record(
+                city_id, start_date, end_date, segment_filename(city_id, start_date, end_date),
+                data, fetched_at, location
+            )
+        with self._lock:
+            self._conn.commit()
+        if recovered:
+            logger.info(f"已从 {len(self.packs.pack_names())} 个 pack 文件恢复 {len(recovered)} 个段到缓存清单")
+        return len(recovered)
+
+    def _record(self, city_id, start_date, end_date, filename, data, fetched_at, location=(None, None, None)):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO segments "
+                "(city_id, start_date, end_date, filename, byte_size, checksum, row_count, fetched_at, parsed, "
+                "pack_file, pack_offset, pack_length) "
+                "VALUES (?, ?, ?, ?, ?, ?, NULL, ?, NULL, ?, ?, ?)",
+                (city_id, start_date, end_date, filename, len(data),
+                 hashlib.sha1(data).hexdigest(), fetched_at) + tuple(location)
+            )
+
+    def record(self, city_id, start_date, end_date, text):
+        """保存新抓取的段：原始文本压缩追加到 pack 文件，并登记其位置"""
+        data = text.encode('utf-8')
+        location = self.packs.append(segment_key(city_id, start_date, end_date), data)
+        self._record(
+            city_id, start_date, end_date, segment_filename(city_id, start_date, end_date),
+            data, datetime.now().isoformat(timespec='seconds'), location
+        )
+        with self._lock:
+            self._conn.commit()
+
+    def cached_ranges(self):
+        """一次查询返回所有已缓存段 {city_id: [(start, end), ...]}"""
+        ranges = defaultdict(list)
+        with self._lock:
+            rows = self._conn.execute("SELECT city_id, start_date, end_date FROM segments").fetchall()
+        for city_id, start_date, end_date in rows:
+            ranges[city_id].append((start_date, end_date))
+        return ranges
+
+    def contains(self, city_id, start_date, end_date):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM segments WHERE city_id = ? AND start_date = ? AND end_date = ?",
+                (city_id, start_date, end_date)
+            ).fetchone()
+        return row is not None
+
+    def _read_row(self, row):
+        """按清单条目读取原始数据（pack 记录或旧版单段文件）"""
+        filename, byte_size, pack_file, pack_offset, pack_length = row
+        try:
+            if pack_file is not None:
+                data = self.packs.read(pack_file, pack_offset, pack_length)
+            else:
+                with open(os.path.join(self.output_dir, filename), 'rb') as f:
+                    data = f.read()
+        except (OSError, ValueError, zlib.error):
+            return None
+        return data if len(data) == byte_size else None
+
+    def read_raw(self, city_id, start_date, end_date):
+        """读取段原始文本；数据缺失或大小与清单不符时移除该条目并返回 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT filename, byte_size, pack_file, pack_offset, pack_length FROM segments "
+                "WHERE city_id = ? AND start_date = ? AND end_date = ?",
+                (city_id, start_date, end_date)
+            ).fetchone()
+        if row is None:
+            return None
+        data = self._read_row(row)
+        if data is None:
+            logger.warning(f"段缓存 {segment_key(city_id, start_date, end_date)} 缺失或已损坏，将重新抓取")
+            self.discard(city_id, start_date, end_date)
+            return None
+        return data.decode('utf-8')
+
+    def segment_locations(self):
+        """按抓取时间从旧到新列出全部段的位置
+        [(city_id, start, end, 文件名, 大小, pack 文件, 偏移, 长度), ...]；同一时间的旧版单段文件排在 pack 记录之前，
+        日期重叠时靠后的段更新"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT city_id, start_date, end_date, filename, byte_size, pack_file, pack_offset, pack_length "
+                "FROM segments ORDER BY fetched_at, pack_file IS NOT NULL, pack_file, pack_offset"
+            ).fetchall()
+
+    def compact(self):
+        """压缩整理：旧版单段文件并入 pack，去除 pack 中已被替换或删除的记录，重写为新一代 pack 文件"""
+        old_packs = self.packs.pack_names()
+        self.packs.start_new_pack()
+        with self._lock:
+            # 按抓取时间写入新 pack，整理后 pack 内的偏移顺序即新旧顺序
+            rows = self.segment_locations()
+            updates, loose_files, lost = [], [], []
+            for city_id, start_date, end_date, filename, byte_size, pack_file, pack_offset, pack_length in rows:
+                data = self._read_row((filename, byte_size, pack_file, pack_offset, pack_length))
+                if data is None:
+                    lost.append((city_id, start_date, end_date))
+                    continue
+                location = self.packs.append(segment_key(city_id, start_date, end_date), data)
+                updates.append(tuple(location) + (city_id, start_date, end_date))
+                if pack_file is None:
+                    loose_files.append(os.path.join(self.output_dir, filename))
+            self.packs.sync()
+            self._conn.executemany(
+                "UPDATE segments SET pack_file = ?, pack_offset = ?, pack_length = ? "
+                "WHERE city_id = ? AND start_date = ? AND end_date = ?",
+                updates
+            )
+            self._conn.executemany(
+                "DELETE FROM segments WHERE city_id = ? AND start_date = ? AND end_date = ?", lost
+            )
+            self._conn.commit()
+        # 索引提交后再删除旧数据，中途崩溃不会丢失段
+        before = sum(os.path.getsize(os.path.join(self.packs.pack_dir, name)) for name in old_packs)
+        self.packs.remove_packs(old_packs)
+        for path in loose_files:
+            os.remove(path)
+        after = sum(os.path.getsize(os.path.join(self.packs.pack_dir, name)) for name in self.packs.pack_names())
+        logger.info(
+            f"段缓存整理完成：{len(updates)} 个段，并入 {len(loose_files)} 个单段文件，"
+            f"移除 {len(lost)} 个失效条目，pack 大小 {before / 1024 / 1024:.1f}MB → {after / 1024 / 1024:.1f}MB"
+        )
+        return len(updates)
+
+    def store_parsed(self, city_id, start_date, end_date, df):
+        """保存段解析结果（float64 矩阵）及行数，供下次运行直接使用"""
+        matrix = np.ascontiguousarray(df[PARSED_COLUMNS].to_numpy(dtype=np.float64))
+        with self._lock:
+            self._conn.execute(
+                "UPDATE segments SET parsed = ?, row_count = ? "
+                "WHERE city_id = ? AND start_date = ? AND end_date = ?",
+                (matrix.tobytes(), len(df), city_id, start_date, end_date)
+            )
+            self._conn.commit()
+
+    def load_parsed(self, city_id, start_date, end_date):
+        """读取段解析结果，未解析过时返回 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT parsed FROM segments WHERE city_id = ? AND start_date = ? AND end_date = ?",
+                (city_id, start_date, end_date)
+            ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        matrix = np.frombuffer(row[0], dtype=np.float64).reshape(-1, len(PARSED_COLUMNS))
+        df = pd.DataFrame(matrix, columns=PARSED_COLUMNS)
+        return df.astype({'YEAR': 'int64', 'MO': 'int64', 'DY': 'int64'})
+
+    def discard(self, city_id, start_date, end_date):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM segments WHERE city_id = ? AND start_date = ? AND end_date = ?",
+                (city_id, start_date, end_date)
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+        self.packs.close()
+
+# 进程内共享的段缓存清单
+_manifest = None
+_manifest_lock = threading.Lock()
+
+def get_segment_manifest():
+    """获取共享的段缓存清单（首次调用时打开或创建）"""
+    global _manifest
+    if _manifest is None:
+        with _manifest_lock:
+            if _manifest is None:
+                output_dir = SCRAPER_CONFIG['output_dir']
+                db_path = SCRAPER_CONFIG.get('manifest_path') or os.path.join(output_dir, 'manifest.sqlite')
+                pack_config = SCRAPER_CONFIG.get('pack', {})
+                pack_store = PackStore(
+                    pack_config.get('dir') or os.path.join(output_dir, 'packs'),
+                    max_pack_bytes=pack_config.get('max_pack_mb', 256) * 1024 * 1024,
+                    compress_level=pack_config.get('compress_level', 6)
+                )
+                _manifest = SegmentManifest(db_path, output_dir, pack_store)
+    return _manifest
+
+def close_segment_manifest():
+    """关闭共享的段缓存清单"""
+    global _manifest
+    with _manifest_lock:
+        if _manifest is not None:
+            _manifest.close()
+            _manifest = None
+
+if __name__ == '__main__':
+    # 压缩整理段缓存：python -m src.scraper.segment_cache
+    # 由 pack 文件重建清单：python -m src.scraper.segment_cache rebuild
+    if sys.argv[1:] == ['rebuild']:
+        get_segment_manifest().rebuild_from_packs()
+    else:
+        get_segment_manifest().compact()
+    close_segment_manifest()
@@ -0,0 +1,80 @@
+import os
+import re
+import shutil
+from src.utils.common import logger, expand_frame, OUTPUT_COLUMNS
+
+CITY_FILE_PATTERN = re.compile(r'^city_(\d+)\.csv$')
+YEAR_DIR_PATTERN = re.compile(r'^year_(\d{4})$')
+
+class PartitionWriter:
+    """按城市（或年份/城市）分区逐块写出清洗后的数据，内存中只保留当前城市的数据
+
+    每个分区文件先写临时文件再原子替换，抓取中途中断时已写出的分区保持完整可用。
+    """
+
+    def __init__(self, partition_dir, partition_by='city'):
+        if partition_by not in ('city', 'year'):
+            raise ValueError(f"不支持的分区方式: {partition_by}")
+        self.partition_dir = partition_dir
+        self.partition_by = partition_by
+        self.rows = 0
+        self.partitions = 0
+        self._written = set()
+        os.makedirs(partition_dir, exist_ok=True)
+
+    def _write_file(self, path, df):
+        tmp_path = path + '.tmp'
+        df.to_csv(tmp_path, index=False, columns=OUTPUT_COLUMNS, date_format='%Y-%m-%d')
+        os.replace(tmp_path, path)
+        self._written.add(path)
+        self.partitions += 1
+
+    def write_city(self, city_id, city_df):
+        """写出一个城市的全部数据（按日期去重）"""
+        if city_df.empty:
+            return 0
+        city_df = expand_frame(city_df)
+        city_df = city_df.drop_duplicates(subset=['date'], keep='last').sort_values('date')
+        if self.partition_by == 'city':
+            self._write_file(os.path.join(self.partition_dir, f"city_{city_id}.csv"), city_df)
+        else:
+            for year, year_df in city_df.groupby(city_df['date'].dt.year):
+                year_dir = os.path.join(self.partition_dir, f"year_{year}")
+                os.makedirs(year_dir, exist_ok=True)
+                self._write_file(os.path.join(year_dir, f"city_{city_id}.csv"), year_df)
+        self.rows += len(city_df)
+        return len(city_df)
+
+    def partition_files(self, written_only=False):
+        """按 (年份, 城市ID) 顺序列出已完成的分区文件（written_only 时只列出本次运行写出的分区）"""
+        files = []
+        if self.partition_by == 'city':
+            dirs = [(0, self.partition_dir)]
+        else:
+            dirs = sorted(
+                (int(match.group(1)), os.path.join(self.partition_dir, name))
+                for name in os.listdir(self.partition_dir)
+                for match in [YEAR_DIR_PATTERN.match(name)] if match
+            )
+        for _, directory in dirs:
+            city_files = sorted(
+                (int(match.group(1)), os.path.join(directory, name))
+                for name in os.listdir(directory)
+                for match in [CITY_FILE_PATTERN.match(name)] if match
+            )
+            files.extend(path for _, path in city_files if not written_only or path in self._written)
+        return files
+
+    def merge_to(self, final_path, buffer_size=1024 * 1024):
+        """将本次运行写出的分区顺序拼接为一个总CSV（逐文件流式复制，内存占用固定）"""
+        files = self.partition_files(written_only=True)
+        tmp_path = final_path + '.tmp'
+        with open(tmp_path, 'wb') as out:
+            out.write((','.join(OUTPUT_COLUMNS) + '\n').encode('utf-8'))
+            for path in files:
+                with open(path, 'rb') as f:
+                    f.readline()  # 跳过分区文件的表头
+                    shutil.copyfileobj(f, out, buffer_size)
+        os.replace(tmp_path, final_path)
+        logger.info(f"已合并 {len(files)} 个分区文件至 {final_path}")
+        return final_path
@@ -0,0 +1,226 @@
+import os
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from config.config import SCRAPER_CONFIG
+from config.cities import CITIES
+from src.utils.common import logger, write_frame_csv
+from src.scraper.grid import load_grid_groups
+from src.scraper.pack_store import PackStore
+from src.scraper.segment_cache import get_segment_manifest
+
+# 与 fetch_all_cities 写出的总CSV表头一致
+OUTPUT_HEADER = b'city_id,date,temp_max_c,temp_min_c,temp_avg_c\n'
+OUTPUT_COLUMNS = [b'YEAR', b'MO', b'DY', b'T2M_MAX', b'T2M_MIN', b'T2M']
+MISSING_MARK = b'-999'  # NASA 缺测标记
+
+def find_data_start(data):
+    """在原始字节中定位数据表头，返回 (首个数据行偏移, 表头列名列表)；找不到时返回 (None, None)"""
+    pos = data.find(b'YEAR', max(data.find(b'-END HEADER-'), 0))
+    while pos >= 0:
+        line_start = data.rfind(b'\n', 0, pos) + 1
+        line_end = data.find(b'\n', pos)
+        if line_end < 0:
+            line_end = len(data)
+        line = data[line_start:line_end]
+        if not line.lstrip().startswith(b'#') and b'MO' in line and b'T2M_MAX' in line:
+            return line_end + 1, [col.strip() for col in line.split(b',')]
+        pos = data.find(b'YEAR', line_end)
+    return None, None
+
+def transcode_segment(data, years=None):
+    """字节级转换一个NASA响应，返回 {b'YYYY-MM-DD': b'最高,最低,平均'}（不经过DataFrame）
+
+    跳过表头、剔除任一温度为 -999 或为空的行，温度保留原始文本；
+    years 为年份字节串集合时只保留这些年份。找不到表头或缺少必要列时抛出 ValueError。
+    """
+    start, header = find_data_start(data)
+    if start is None:
+        raise ValueError("未找到有效表头")
+    missing_cols = [col.decode() for col in OUTPUT_COLUMNS if col not in header]
+    if missing_cols:
+        raise ValueError(f"缺少必要列: {missing_cols}")
+    body = data[start:]
+    if b'\r' in body:
+        body = body.replace(b'\r', b'')
+    i_year, i_mo, i_dy, i_max, i_min, i_avg = [header.index(col) for col in OUTPUT_COLUMNS]
+    width = len(header)
+    rows = {}
+    for line in body.split(b'\n'):
+        fields = line.split(b',')
+        if len(fields) != width:
+            continue
+        year = fields[i_year]
+        if years is not None and year not in years:
+            continue
+        t_max, t_min, t_avg = fields[i_max], fields[i_min], fields[i_avg]
+        if not (t_max and t_min and t_avg):
+            continue
+        # 绝大多数行不含缺测标记，只对可疑行逐列按数值判断
+        if MISSING_MARK in line and -999 in (float(t_max), float(t_min), float(t_avg)):
+            continue
+        rows[b'%s-%s-%s' % (year, fields[i_mo].zfill(2), fields[i_dy].zfill(2))] = b'%s,%s,%s' % (t_max, t_min, t_avg)
+    return rows
+
+def transcode_task(task):
+    """转换一组段（同一 pack 内按偏移顺序读取，或一组旧版单段文件），返回 [(序号, city_id, 行字典), ...]
+
+    在子进程中执行：只依赖文件路径，不访问缓存清单。
+    """
+    pack_path, entries, years = task
+    results = []
+    handle = open(pack_path, 'rb') if pack_path is not None else None
+    try:
+        for seq, city_id, location, length, byte_size in entries:
+            try:
+                if handle is not None:
+                    handle.seek(location)
+                    data = PackStore.decode_record(handle.read(length))[1]
+                else:
+                    with open(location, 'rb') as f:
+                        data = f.read()
+                if len(data) != byte_size:
+                    raise ValueError("大小与清单不符")
+                results.append((seq, city_id, transcode_segment(data, years)))
+            except (OSError, ValueError, zlib.error) as e:
+                results.append((seq, city_id, e))
+    finally:
+        if handle is not None:
+            handle.close()
+    return results
+
+def plan_tasks(manifest, tasks_per_pack=4, years=None):
+    """把全部段划分为任务：每个 pack 按偏移排序后切成若干连续区间，旧版单段文件单独成组
+
+    序号为段在清单中按抓取时间排列的位置，合并时按序号决定重叠日期的新旧。
+    """
+    by_pack = {}
+    for seq, (city_id, _, _, filename, byte_size, pack_file, offset, length) in enumerate(manifest.segment_locations()):
+        if pack_file is None:
+            entry = (seq, city_id, os.path.join(manifest.output_dir, filename), None, byte_size)
+            by_pack.setdefault(None, []).append(entry)
+        else:
+            by_pack.setdefault(os.path.join(manifest.packs.pack_dir, pack_file), []).append(
+                (seq, city_id, offset, length, byte_size)
+            )
+    tasks = []
+    for pack_path, entries in by_pack.items():
+        if pack_path is not None:
+            entries.sort(key=lambda entry: entry[2])  # 同一 pack 内顺序读取
+        step = max(1, -(-len(entries) // tasks_per_pack))
+        tasks.extend((pack_path, entries[i:i + step], years) for i in range(0, len(entries), step))
+    return tasks
+
+def city_members():
+    """city_id → 同一网格单元内的全部城市（关闭网格去重时只含自身）"""
+    if SCRAPER_CONFIG.get('grid', {}).get('enabled', True):
+        cells = load_grid_groups(CITIES).values()
+    else:
+        cells = [[city_id] for city_id in CITIES]
+    return {city_id: tuple(cell) for cell in cells for city_id in cell}
+
+def transcode_cache(output_path=None, workers=None, years=None):
+    """由原始段缓存直接重建总CSV（字节级处理，多进程并行），返回 (文件路径, 行数)
+
+    同一网格单元的段分发给单元内所有城市；重叠段按抓取时间去重，后抓取的段优先，
+    与抓取路径 drop_duplicates(keep='last') 一致。默认只保留配置年份内的数据，先写临时文件再原子替换。
+    """
+    started = time.perf_counter()
+    output_path = output_path or os.path.join(os.path.dirname(SCRAPER_CONFIG['output_dir']), 'all_history_final.csv')
+    years = years if years is not None else SCRAPER_CONFIG['years']
+    year_keys = {str(year).encode() for year in years}
+    workers = workers or os.cpu_count() or 1
+    tasks = plan_tasks(get_segment_manifest(), max(1, workers), year_keys)
+    members = city_members()
+
+    cell_rows, segments, failed = {}, 0, 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = [item for task_results in executor.map(transcode_task, tasks) for item in task_results]
+    # 任务按 pack 分组，需按序号（抓取时间）重新排列后合并，保证后抓取的段覆盖先抓取的段
+    results.sort(key=lambda item: item[0])
+    for seq, city_id, rows in results:
+        if isinstance(rows, Exception):
+            failed += 1
+            logger.warning(f"段 #{seq}（城市 {city_id}）转换失败，跳过: {rows}")
+            continue
+        cell = members.get(city_id)
+        if cell is None:
+            continue
+        cell_rows.setdefault(cell, {}).update(rows)
+        segments += 1
+
+    total = 0
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(OUTPUT_HEADER)
+        for cell, rows in cell_rows.items():
+            lines = [b'%s,%s\n' % (day, rows[day]) for day in sorted(rows)]
+            for city_id in cell:
+                prefix = b'%d,' % city_id
+                f.write(b''.join([prefix + line for line in lines]))
+                total += len(lines)
+    os.replace(tmp_path, output_path)
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"由段缓存重建总CSV：{segments} 个段（失败 {failed} 个），{total} 行，"
+        f"{os.path.getsize(output_path) / 1024 / 1024:.1f}MB，{workers} 个进程，耗时 {elapsed:.2f}s → {output_path}"
+    )
+    return output_path, total
+
+# ---------- 性能对比 ----------
+def benchmark(csv_path, repeat=3):
+    """对比 “解析为DataFrame再写CSV” 与字节级转换的单进程耗时（取多次运行的最短时间）"""
+    from io import StringIO
+    from src.scraper.nasa_parser import build_sample_responses, parse_nasa_csv, to_clean_frame
+    responses = [(city_id, text.encode('utf-8')) for city_id, text in build_sample_responses(csv_path)]
+
+    def via_frames():
+        buffer = StringIO()
+        rows = 0
+        for city_id, data in responses:
+            df = to_clean_frame(parse_nasa_csv(data.decode('utf-8')), city_id)
+            write_frame_csv(df, buffer, header=False)
+            rows += len(df)
+        return rows
+
+    def via_bytes():
+        chunks = []
+        rows = 0
+        for city_id, data in responses:
+            parsed = transcode_segment(data)
+            prefix = b'%d,' % city_id
+            chunks.append(b''.join([b'%s%s,%s\n' % (prefix, day, temps) for day, temps in parsed.items()]))
+            rows += len(parsed)
+        return rows
+
+    def run(func):
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rows = func()
+            best = min(best, time.perf_counter() - started)
+        return best, rows
+
+    frame_sec, frame_rows = run(via_frames)
+    bytes_sec, bytes_rows = run(via_bytes)
+    assert frame_rows == bytes_rows, "两种路径输出行数不一致"
+    logger.info(
+        f"转换基准（{len(responses)} 个响应，{bytes_rows} 行）：DataFrame 路径 {frame_sec:.3f}s，"
+        f"字节级转换 {bytes_sec:.3f}s，加速 {frame_sec / bytes_sec:.1f} 倍"
+    )
+    return frame_sec, bytes_sec
+
+if __name__ == '__main__':
+    # 用法：python -m src.scraper.transcoder [输出CSV路径] [--workers N]
+    #       python -m src.scraper.transcoder bench data/all.csv
+    args = sys.argv[1:]
+    if args[:1] == ['bench']:
+        benchmark(args[1] if len(args) > 1 else 'data/all.csv')
+    else:
+        workers = None
+        if '--workers' in args:
+            idx = args.index('--workers')
+            workers = int(args[idx + 1])
+            del args[idx:idx + 2]
+        transcode_cache(args[0] if args else None, workers)
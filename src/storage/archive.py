@@ -0,0 +1,284 @@
+import os
+import sys
+import gzip
+import time
+import zlib
+import shutil
+import struct
+import tempfile
+import numpy as np
+import pandas as pd
+from src.utils.common import logger, expand_frame, OUTPUT_COLUMNS, TEMP_COLUMNS
+
+# 归档格式：魔数 | 数据块... | 块目录（定长记录数组）| 尾部（目录偏移, 块数, 魔数）
+# 每个 (城市, 年份) 一个数据块，块内为 varint 序列：日期游程 + 三个温度变量的厘摄氏度 zigzag 差分；
+# 块目录记录每块的日期范围与各变量 min/max，按城市、日期或温度范围查询时直接跳过不相关的块
+ARCHIVE_MAGIC = b'NWARC01\n'
+ARCHIVE_FOOTER = struct.Struct('<QI8s')
+DIRECTORY_DTYPE = np.dtype([
+    ('city_id', '<i4'), ('year', '<i2'), ('flags', 'u1'), ('first_day', '<i4'), ('last_day', '<i4'),
+    ('rows', '<u2'), ('offset', '<u8'), ('length', '<u4'), ('min', '<i2', (3,)), ('max', '<i2', (3,))
+])
+FLAG_ZLIB = 1  # 块数据经 zlib 压缩（只在更小时使用）
+EPOCH_YEAR = 1970
+
+def zigzag_encode(values):
+    values = np.asarray(values, dtype=np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+def zigzag_decode(values):
+    values = np.asarray(values, dtype=np.uint64)
+    return (values >> np.uint64(1)).astype(np.int64) ^ -(values & np.uint64(1)).astype(np.int64)
+
+def varint_encode(values):
+    """无符号整数数组编码为 LEB128 varint 字节（向量化）"""
+    values = np.asarray(values, dtype=np.uint64)
+    if not len(values):
+        return b''
+    nbytes = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 10):
+        nbytes += values >= np.uint64(1 << (7 * k))
+    starts = np.cumsum(nbytes) - nbytes
+    out = np.empty(int(nbytes.sum()), dtype=np.uint8)
+    for k in range(int(nbytes.max())):
+        mask = nbytes > k
+        chunk = (values[mask] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        out[starts[mask] + k] = chunk | np.where(nbytes[mask] > k + 1, np.uint64(0x80), np.uint64(0))
+    return out.tobytes()
+
+def varint_decode(data):
+    """LEB128 varint 字节解码为 uint64 数组（向量化，不逐字节循环）"""
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if not len(raw):
+        return np.empty(0, dtype=np.uint64)
+    ends = np.flatnonzero(raw < 0x80)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    lengths = ends - starts + 1
+    values = (raw[starts] & 0x7F).astype(np.uint64)
+    # 按字节位置逐轮累加：温度差分大多只有 1~2 个字节，只需两三轮
+    for k in range(1, int(lengths.max())):
+        idx = np.flatnonzero(lengths > k)
+        values[idx] |= (raw[starts[idx] + k] & 0x7F).astype(np.uint64) << np.uint64(7 * k)
+    return values
+
+def encode_block(days, centi):
+    """编码一段日期（升序天数）与对应的厘摄氏度矩阵 (n, 3)，返回 (块数据, flags)"""
+    # 日期按连续游程记录：[游程数, (距上一游程末尾的间隔, 长度)...]，完整的一年只需一个游程
+    breaks = np.flatnonzero(np.diff(days) != 1) + 1
+    run_starts = np.concatenate([[0], breaks])
+    run_ends = np.concatenate([breaks, [len(days)]])
+    gaps = days[run_starts] - np.concatenate([[days[0]], days[run_ends[:-1] - 1] + 1])
+    header = np.column_stack([gaps, run_ends - run_starts]).ravel()
+    deltas = np.diff(centi, axis=0, prepend=np.zeros((1, centi.shape[1]), dtype=np.int64))
+    payload = varint_encode(np.concatenate([
+        [len(run_starts)], header.astype(np.uint64), zigzag_encode(deltas.T.ravel())
+    ]))
+    compressed = zlib.compress(payload, 9)
+    if len(compressed) < len(payload):
+        return compressed, FLAG_ZLIB
+    return payload, 0
+
+def decode_block(payload, flags, rows, first_day):
+    """解码一个块，返回 (天数数组, 厘摄氏度矩阵 (rows, 3))"""
+    if flags & FLAG_ZLIB:
+        payload = zlib.decompress(payload)
+    values = varint_decode(payload)
+    runs = int(values[0])
+    header = values[1:1 + 2 * runs].astype(np.int64).reshape(runs, 2)
+    if runs == 1:
+        days = np.arange(first_day, first_day + header[0, 1], dtype=np.int64)
+    else:
+        pieces, day = [], first_day
+        for gap, length in header.tolist():
+            day += gap
+            pieces.append(np.arange(day, day + length, dtype=np.int64))
+            day += length
+        days = np.concatenate(pieces)
+    centi = np.cumsum(zigzag_decode(values[1 + 2 * runs:]).reshape(len(TEMP_COLUMNS), rows), axis=1).T
+    return days, centi
+
+def to_centi(values):
+    """摄氏度（两位小数）转为厘摄氏度整数，缺测值无法归档"""
+    values = np.asarray(values, dtype=np.float64)
+    if np.isnan(values).any():
+        raise ValueError("归档数据不能包含缺测值")
+    return np.round(values * 100).astype(np.int64)
+
+def write_archive(df, archive_path):
+    """按 (城市, 年份) 分块写出归档文件（入库格式或紧凑格式的数据），返回块数
+
+    同一网格单元的城市数据相同，内容完全相同的块只存一份。先写临时文件再原子替换。
+    """
+    df = expand_frame(df)
+    city_ids = df['city_id'].to_numpy(dtype=np.int64)
+    days = pd.to_datetime(df['date']).to_numpy().astype('datetime64[D]').astype(np.int64)
+    order = np.lexsort((days, city_ids))
+    city_ids, days = city_ids[order], days[order]
+    centi = np.column_stack([to_centi(df[col].to_numpy()[order]) for col in TEMP_COLUMNS])
+    if len(centi) and (centi.min() < -32768 or centi.max() > 32767):
+        raise ValueError("温度超出 int16 厘摄氏度范围")
+    years = days.astype('datetime64[D]').astype('datetime64[Y]').astype(np.int64) + EPOCH_YEAR
+    # 同一 (城市, 日期) 出现多次时保留最后一条（lexsort 为稳定排序）
+    keep = np.ones(len(days), dtype=bool)
+    keep[:-1] = (city_ids[1:] != city_ids[:-1]) | (days[1:] != days[:-1])
+    if not keep.all():
+        city_ids, days, years, centi = city_ids[keep], days[keep], years[keep], centi[keep]
+
+    bounds = np.flatnonzero((np.diff(city_ids) != 0) | (np.diff(years) != 0)) + 1
+    starts = np.concatenate([[0], bounds]) if len(days) else np.empty(0, dtype=np.int64)
+    ends = np.concatenate([bounds, [len(days)]]) if len(days) else np.empty(0, dtype=np.int64)
+    directory = np.zeros(len(starts), dtype=DIRECTORY_DTYPE)
+    stored = {}
+    tmp_path = archive_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(ARCHIVE_MAGIC)
+        for idx, (start, end) in enumerate(zip(starts.tolist(), ends.tolist())):
+            block_centi = centi[start:end]
+            payload, flags = encode_block(days[start:end], block_centi)
+            if payload not in stored:
+                stored[payload] = f.tell()
+                f.write(payload)
+            directory[idx] = (
+                city_ids[start], years[start], flags, days[start], days[end - 1], end - start,
+                stored[payload], len(payload), block_centi.min(axis=0), block_centi.max(axis=0)
+            )
+        directory_offset = f.tell()
+        f.write(directory.tobytes())
+        f.write(ARCHIVE_FOOTER.pack(directory_offset, len(directory), ARCHIVE_MAGIC))
+    os.replace(tmp_path, archive_path)
+    return len(directory)
+
+def write_archive_from_csv(csv_path, archive_path):
+    """由总CSV（fetch_all_cities 的输出）生成归档文件"""
+    started = time.perf_counter()
+    blocks = write_archive(pd.read_csv(csv_path, usecols=OUTPUT_COLUMNS, parse_dates=['date']), archive_path)
+    logger.info(
+        f"归档完成：{blocks} 个 (城市, 年份) 块，{os.path.getsize(csv_path) / 1024 / 1024:.2f}MB → "
+        f"{os.path.getsize(archive_path) / 1024 / 1024:.2f}MB，耗时 {time.perf_counter() - started:.2f}s → {archive_path}"
+    )
+    return blocks
+
+class ArchiveReader:
+    """归档文件读取：打开时只读入块目录，查询按目录跳过不相关的块后逐块解码"""
+
+    def __init__(self, archive_path):
+        self.path = archive_path
+        with open(archive_path, 'rb') as f:
+            if f.read(len(ARCHIVE_MAGIC)) != ARCHIVE_MAGIC:
+                raise ValueError(f"{archive_path} 不是归档文件")
+            f.seek(-ARCHIVE_FOOTER.size, os.SEEK_END)
+            directory_offset, count, magic = ARCHIVE_FOOTER.unpack(f.read(ARCHIVE_FOOTER.size))
+            if magic != ARCHIVE_MAGIC:
+                raise ValueError(f"{archive_path} 尾部损坏")
+            f.seek(directory_offset)
+            self.directory = np.frombuffer(f.read(count * DIRECTORY_DTYPE.itemsize), dtype=DIRECTORY_DTYPE)
+        self._data = open(archive_path, 'rb')
+
+    def select_blocks(self, city_ids=None, start_date=None, end_date=None, value_range=None):
+        """按目录筛选块的下标：城市、日期范围与某变量的取值范围 (变量名, 下限, 上限)（单位摄氏度）"""
+        directory = self.directory
+        mask = np.ones(len(directory), dtype=bool)
+        if city_ids is not None:
+            mask &= np.isin(directory['city_id'], np.asarray(list(city_ids), dtype=np.int64))
+        if start_date is not None:
+            mask &= directory['last_day'] >= _to_day(start_date)
+        if end_date is not None:
+            mask &= directory['first_day'] <= _to_day(end_date)
+        if value_range is not None:
+            column, low, high = value_range
+            var = TEMP_COLUMNS.index(column)
+            if low is not None:
+                mask &= directory['max'][:, var] >= round(low * 100)
+            if high is not None:
+                mask &= directory['min'][:, var] <= round(high * 100)
+        return np.flatnonzero(mask)
+
+    def read_block(self, idx):
+        """解码第 idx 块，返回 (天数数组, 厘摄氏度矩阵)"""
+        entry = self.directory[idx]
+        self._data.seek(int(entry['offset']))
+        payload = self._data.read(int(entry['length']))
+        return decode_block(payload, int(entry['flags']), int(entry['rows']), int(entry['first_day']))
+
+    def read(self, city_ids=None, start_date=None, end_date=None, value_range=None):
+        """按条件读取，返回入库格式的 DataFrame（value_range 只用于跳过块，不逐行过滤）"""
+        pieces = []
+        for idx in self.select_blocks(city_ids, start_date, end_date, value_range).tolist():
+            days, centi = self.read_block(idx)
+            keep = np.ones(len(days), dtype=bool)
+            if start_date is not None:
+                keep &= days >= _to_day(start_date)
+            if end_date is not None:
+                keep &= days <= _to_day(end_date)
+            pieces.append((int(self.directory[idx]['city_id']), days[keep], centi[keep]))
+        if not pieces:
+            return pd.DataFrame({col: [] for col in OUTPUT_COLUMNS})
+        days = np.concatenate([days for _, days, _ in pieces])
+        centi = np.concatenate([centi for _, _, centi in pieces])
+        columns = {
+            'city_id': np.concatenate([np.full(len(days), city_id, dtype=np.int64) for city_id, days, _ in pieces]),
+            'date': days.astype('datetime64[D]').astype('datetime64[ns]')
+        }
+        for var, col in enumerate(TEMP_COLUMNS):
+            columns[col] = centi[:, var] / 100
+        return pd.DataFrame(columns)
+
+    def to_csv(self, csv_path):
+        """还原为与总CSV相同的行（按城市、日期排序）"""
+        self.read().to_csv(csv_path, index=False, date_format='%Y-%m-%d')
+
+    def close(self):
+        self._data.close()
+
+def _to_day(day):
+    return int(np.datetime64(pd.Timestamp(day).date(), 'D').astype(np.int64))
+
+# ---------- 性能对比 ----------
+def benchmark(csv_path):
+    """对比CSV、gzip压缩CSV与归档文件的大小，并测量单个 (城市, 年份) 块的解码耗时"""
+    tmp_dir = tempfile.mkdtemp(prefix='nasa_archive_')
+    archive_path = os.path.join(tmp_dir, 'all.nwa')
+    with open(csv_path, 'rb') as f:
+        raw = f.read()
+    gzip_bytes = len(gzip.compress(raw, 9))
+    started = time.perf_counter()
+    df = pd.read_csv(csv_path, usecols=OUTPUT_COLUMNS, parse_dates=['date'])
+    blocks = write_archive(df, archive_path)
+    encode_sec = time.perf_counter() - started
+    archive_bytes = os.path.getsize(archive_path)
+
+    reader = ArchiveReader(archive_path)
+    restored = reader.read()
+    expected = df.sort_values(['city_id', 'date']).reset_index(drop=True)
+    assert restored[OUTPUT_COLUMNS].equals(expected[OUTPUT_COLUMNS].astype(restored.dtypes.to_dict())), \
+        "归档还原结果与原数据不一致"
+    started = time.perf_counter()
+    for idx in range(blocks):
+        reader.read_block(idx)
+    decode_us = (time.perf_counter() - started) / max(blocks, 1) * 1e6
+    reader.close()
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    logger.info(
+        f"归档基准（{len(df)} 行，{blocks} 块）：CSV {len(raw) / 1024:.0f}KB，gzip -9 {gzip_bytes / 1024:.0f}KB，"
+        f"归档 {archive_bytes / 1024:.0f}KB（为 gzip 的 1/{gzip_bytes / archive_bytes:.1f}），"
+        f"编码 {encode_sec:.2f}s，单块（城市×年）解码平均 {decode_us:.0f}µs"
+    )
+    return archive_bytes, gzip_bytes, decode_us
+
+if __name__ == '__main__':
+    # 用法：python -m src.storage.archive pack <总CSV路径> <归档路径>
+    #       python -m src.storage.archive unpack <归档路径> <CSV路径>
+    #       python -m src.storage.archive bench data/all.csv
+    args = sys.argv[1:]
+    if args[:1] == ['pack'] and len(args) > 2:
+        write_archive_from_csv(args[1], args[2])
+    elif args[:1] == ['unpack'] and len(args) > 2:
+        reader = ArchiveReader(args[1])
+        reader.to_csv(args[2])
+        reader.close()
+    elif args[:1] == ['bench']:
+        benchmark(args[1] if len(args) > 1 else 'data/all.csv')
+    else:
+        print("用法: python -m src.storage.archive pack <csv> <归档> | unpack <归档> <csv> | bench [csv]")
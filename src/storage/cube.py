@@ -0,0 +1,268 @@
+import os
+import sys
+import json
+import time
+import struct
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from config.config import CUBE_CONFIG
+from src.utils.common import logger
+
+# 文件格式：魔数 | 头部长度 | 数据区偏移 | JSON 元数据（空格补齐）| float32 数据（按页对齐）
+# 数据按 (城市, 日期, 变量) 行优先存放，每个城市的日期轴预留 capacity_days 天，追加新日期无需移动已有数据
+CUBE_MAGIC = b'NWCUBE1\n'
+CUBE_PREFIX = struct.Struct('<8sII')
+PAGE_SIZE = 4096
+VARIABLES = ['temp_max_c', 'temp_min_c', 'temp_avg_c']
+MISSING_VALUE = -999  # NASA 缺测标记，写入时转为 NaN
+
+def _day_number(day):
+    return np.datetime64(day, 'D').astype(np.int64)
+
+def _data_offset(header_bytes):
+    """数据区起始偏移：头部之后留出余量，并按页对齐"""
+    return -(-(CUBE_PREFIX.size + len(header_bytes) + 1024) // PAGE_SIZE) * PAGE_SIZE
+
+def _write_header(f, meta, offset):
+    header = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+    if CUBE_PREFIX.size + len(header) > offset:
+        raise ValueError("元数据超出头部预留空间")
+    f.seek(0)
+    f.write(CUBE_PREFIX.pack(CUBE_MAGIC, len(header), offset) + header.ljust(offset - CUBE_PREFIX.size, b' '))
+
+def _read_header(path):
+    """读取元数据，返回 (元数据, 数据区偏移)"""
+    with open(path, 'rb') as f:
+        magic, header_len, offset = CUBE_PREFIX.unpack(f.read(CUBE_PREFIX.size))
+        if magic != CUBE_MAGIC:
+            raise ValueError(f"{path} 不是立方体存储文件")
+        return json.loads(f.read(header_len).decode('utf-8')), offset
+
+def create_cube_file(path, city_ids, start_date, capacity_days, days=0):
+    """新建立方体文件（数据全部为 NaN），返回数据区偏移"""
+    meta = {
+        'city_ids': [int(city_id) for city_id in city_ids],
+        'start_date': start_date.isoformat(),
+        'days': days,
+        'capacity_days': capacity_days,
+        'variables': VARIABLES,
+        'dtype': 'float32'
+    }
+    offset = _data_offset(json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+    with open(path, 'wb') as f:
+        _write_header(f, meta, offset)
+    data = np.memmap(path, dtype=np.float32, mode='r+', offset=offset,
+                     shape=(len(city_ids), capacity_days, len(VARIABLES)))
+    data[:] = np.nan
+    data.flush()
+    del data
+    return offset
+
+class CubeStore:
+    """城市 × 日期 × 温度变量的稠密 float32 立方体（numpy.memmap），缺测为 NaN
+
+    打开只映射文件不读取数据；按城市取一段日期的结果是映射上的视图，O(1) 且不复制。
+    mode='r+' 时可用 append_frame 写入新日期，超出预留容量时整体重写为更大的文件。
+    """
+
+    def __init__(self, path, mode='r'):
+        self.path = path
+        self.mode = mode
+        self._open()
+
+    def _open(self):
+        meta, self._offset = _read_header(self.path)
+        self.meta = meta
+        self.city_ids = np.asarray(meta['city_ids'], dtype=np.int64)
+        self.start_date = date.fromisoformat(meta['start_date'])
+        self.days = meta['days']
+        self.capacity_days = meta['capacity_days']
+        self.variables = meta['variables']
+        self._city_index = {int(city_id): idx for idx, city_id in enumerate(meta['city_ids'])}
+        self.data = np.memmap(self.path, dtype=np.float32, mode=self.mode, offset=self._offset,
+                              shape=(len(self.city_ids), self.capacity_days, len(self.variables)))
+
+    @property
+    def cube(self):
+        """已写入日期范围内的立方体视图 (城市, 日期, 变量)"""
+        return self.data[:, :self.days, :]
+
+    @property
+    def end_date(self):
+        return self.start_date + timedelta(days=self.days - 1)
+
+    def city_index(self, city_id):
+        try:
+            return self._city_index[int(city_id)]
+        except KeyError:
+            raise KeyError(f"立方体中没有城市 {city_id}") from None
+
+    def day_offset(self, day):
+        """日期相对首日的偏移（day 可为 date、Timestamp 或 'YYYY-MM-DD'）"""
+        return int((pd.Timestamp(day).date() - self.start_date).days)
+
+    def slice(self, city_id, start_date=None, end_date=None):
+        """某城市一段日期的数据视图 (日期, 变量)，不复制数据；日期超出已有范围时截断"""
+        first = max(self.day_offset(start_date), 0) if start_date is not None else 0
+        last = min(self.day_offset(end_date) + 1, self.days) if end_date is not None else self.days
+        return self.data[self.city_index(city_id), first:max(first, last), :]
+
+    def variable(self, name):
+        """某一变量的 (城市, 日期) 视图"""
+        return self.cube[:, :, self.variables.index(name)]
+
+    def dates(self, start_offset=0, end_offset=None):
+        end_offset = self.days if end_offset is None else end_offset
+        return pd.date_range(self.start_date + timedelta(days=start_offset), periods=end_offset - start_offset)
+
+    def to_frame(self, city_id, start_date=None, end_date=None):
+        """按入库格式导出某城市一段日期的数据（去掉全部缺测的日期）"""
+        first = max(self.day_offset(start_date), 0) if start_date is not None else 0
+        values = self.slice(city_id, start_date, end_date)
+        df = pd.DataFrame(np.asarray(values, dtype=np.float64), columns=self.variables)
+        df.insert(0, 'date', self.dates(first, first + len(values)))
+        df.insert(0, 'city_id', int(city_id))
+        return df[~np.isnan(values).all(axis=1)].reset_index(drop=True)
+
+    def append_frame(self, df, reserve_days=None):
+        """写入入库格式的数据（新日期或覆盖已有日期），返回写入行数
+
+        日期早于首日或出现新城市时抛出 ValueError（需要 build_cube 重建）。
+        """
+        if self.mode != 'r+':
+            raise ValueError("立方体以只读方式打开")
+        if df.empty:
+            return 0
+        city_idx, day_idx, values = self._locate(df)
+        needed = int(day_idx.max()) + 1
+        if needed > self.capacity_days:
+            self._grow(needed + (reserve_days if reserve_days is not None else CUBE_CONFIG.get('reserve_days', 366)))
+        self.data[city_idx, day_idx, :] = values
+        self.data.flush()
+        if needed > self.days:
+            # 数据落盘后再更新头部的天数，读方不会看到未写入的日期
+            self.days = needed
+            self._update_header()
+        return len(df)
+
+    def _locate(self, df):
+        city_ids = df['city_id'].to_numpy(dtype=np.int64)
+        order = np.argsort(self.city_ids)
+        pos = np.searchsorted(self.city_ids, city_ids, sorter=order)
+        pos = np.minimum(pos, len(self.city_ids) - 1)
+        city_idx = order[pos]
+        unknown = self.city_ids[city_idx] != city_ids
+        if unknown.any():
+            raise ValueError(f"立方体中没有城市 {sorted(set(city_ids[unknown].tolist()))[:5]}，需要重建")
+        day_idx = pd.to_datetime(df['date']).to_numpy().astype('datetime64[D]').astype(np.int64) \
+            - _day_number(self.start_date)
+        if (day_idx < 0).any():
+            raise ValueError(f"日期早于立方体首日 {self.start_date}，需要重建")
+        # 复制一份：pandas 写时复制模式下 to_numpy 可能返回只读视图
+        values = np.array(df[self.variables].to_numpy(dtype=np.float32))
+        values[values == MISSING_VALUE] = np.nan
+        return city_idx, day_idx, values
+
+    def _update_header(self):
+        self.meta['days'] = self.days
+        with open(self.path, 'r+b') as f:
+            _write_header(f, self.meta, self._offset)
+
+    def _grow(self, capacity_days):
+        """扩大日期容量：写入新文件后原子替换"""
+        tmp_path = self.path + '.tmp'
+        create_cube_file(tmp_path, self.city_ids, self.start_date, capacity_days, self.days)
+        grown = CubeStore(tmp_path, mode='r+')
+        grown.data[:, :self.days, :] = self.cube
+        grown.data.flush()
+        grown.close()
+        self.close()
+        os.replace(tmp_path, self.path)
+        self._open()
+        logger.info(f"立方体日期容量扩大至 {capacity_days} 天")
+
+    def close(self):
+        if getattr(self, 'data', None) is not None:
+            if self.mode == 'r+':
+                self.data.flush()
+            self.data = None
+
+def build_cube(csv_path, cube_path=None, chunk_rows=500000, reserve_days=None):
+    """由总CSV（fetch_all_cities 的输出）构建立方体文件，返回打开的 CubeStore（只读）
+
+    城市轴为CSV中出现的全部城市（按 ID 排序），日期轴从最早日期开始并预留 reserve_days 天供追加；
+    先写临时文件再原子替换。
+    """
+    started = time.perf_counter()
+    cube_path = cube_path or CUBE_CONFIG['path']
+    reserve_days = reserve_days if reserve_days is not None else CUBE_CONFIG.get('reserve_days', 366)
+    # 第一遍只读城市和日期列，确定坐标轴
+    keys = pd.read_csv(csv_path, usecols=['city_id', 'date'])
+    city_ids = np.unique(keys['city_id'].to_numpy(dtype=np.int64))
+    day_numbers = pd.to_datetime(keys['date'], format='%Y-%m-%d').to_numpy().astype('datetime64[D]')
+    start_date = pd.Timestamp(day_numbers.min()).date()
+    days = int((day_numbers.max() - day_numbers.min()).astype(np.int64)) + 1
+    del keys, day_numbers
+
+    os.makedirs(os.path.dirname(os.path.abspath(cube_path)), exist_ok=True)
+    tmp_path = cube_path + '.tmp'
+    create_cube_file(tmp_path, city_ids, start_date, days + reserve_days)
+    store = CubeStore(tmp_path, mode='r+')
+    rows = 0
+    for chunk in pd.read_csv(csv_path, usecols=['city_id', 'date'] + VARIABLES, chunksize=chunk_rows):
+        rows += store.append_frame(chunk)
+    store.close()
+    os.replace(tmp_path, cube_path)
+    cube = CubeStore(cube_path)
+    logger.info(
+        f"立方体已生成：{len(city_ids)} 个城市 × {cube.days} 天 × {len(VARIABLES)} 个变量（{rows} 行，"
+        f"{start_date} 起，预留 {reserve_days} 天），{os.path.getsize(cube_path) / 1024 / 1024:.1f}MB，"
+        f"耗时 {time.perf_counter() - started:.2f}s → {cube_path}"
+    )
+    return cube
+
+def open_cube(cube_path=None, mode='r'):
+    """打开立方体文件（只映射，不读取数据）"""
+    return CubeStore(cube_path or CUBE_CONFIG['path'], mode)
+
+# ---------- 性能对比 ----------
+def benchmark(csv_path, cube_path=None, repeat=5):
+    """对比 “读取总CSV再筛选” 与 “映射立方体取切片” 的耗时"""
+    cube_path = cube_path or CUBE_CONFIG['path']
+    if not os.path.exists(cube_path):
+        build_cube(csv_path, cube_path).close()
+
+    started = time.perf_counter()
+    df = pd.read_csv(csv_path, parse_dates=['date'])
+    city_id = int(df['city_id'].iloc[0])
+    first, last = df['date'].min(), df['date'].min() + pd.Timedelta(days=89)
+    csv_rows = len(df[(df['city_id'] == city_id) & (df['date'] >= first) & (df['date'] <= last)])
+    csv_sec = time.perf_counter() - started
+
+    best_open, best_slice = float('inf'), float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        cube = open_cube(cube_path)
+        opened = time.perf_counter()
+        values = cube.slice(city_id, first, last)
+        best_open = min(best_open, opened - started)
+        best_slice = min(best_slice, time.perf_counter() - opened)
+        cube.close()
+    logger.info(
+        f"立方体基准：读取CSV并筛选 {csv_sec:.3f}s（{csv_rows} 行）；映射立方体 {best_open * 1000:.2f}ms，"
+        f"取城市 {city_id} 90 天切片 {best_slice * 1e6:.1f}µs（{len(values)} 天，视图，不复制）"
+    )
+    return csv_sec, best_open, best_slice
+
+if __name__ == '__main__':
+    # 用法：python -m src.storage.cube build <总CSV路径> [立方体路径]
+    #       python -m src.storage.cube bench data/all.csv
+    args = sys.argv[1:]
+    if args[:1] == ['build'] and len(args) > 1:
+        build_cube(args[1], args[2] if len(args) > 2 else None).close()
+    elif args[:1] == ['bench']:
+        benchmark(args[1] if len(args) > 1 else 'data/all.csv')
+    else:
+        cube = open_cube(args[0] if args else None)
+        logger.info(f"{cube.path}: {len(cube.city_ids)} 个城市，{cube.start_date} ~ {cube.end_date}（{cube.days} 天，容量 {cube.capacity_days} 天）")
@@ -0,0 +1,207 @@
+import os
+import sys
+import time
+import uuid
+import shutil
+import numpy as np
+import pandas as pd
+from config.config import PARQUET_CONFIG
+from config.cities import PROVINCES
+from src.utils.common import logger, expand_frame, OUTPUT_COLUMNS
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # 可选依赖：未安装时只有列式输出不可用
+    pa = ds = pq = None
+
+UNKNOWN_PROVINCE = '未知'  # 与 nasa_weather_f.get_formatted_cities 一致
+
+def require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Parquet 输出需要安装 pyarrow：pip install pyarrow")
+
+def _schema():
+    return pa.schema([
+        ('city_id', pa.int32()),
+        ('date', pa.date32()),
+        ('temp_max_c', pa.float64()),
+        ('temp_min_c', pa.float64()),
+        ('temp_avg_c', pa.float64())
+    ])
+
+def partition_dir(root, year, province):
+    """分区目录（Hive 风格）：root/year=2024/province=广东"""
+    return os.path.join(root, f"year={year}", f"province={province}")
+
+def partition_files(directory):
+    """分区内已完成的数据文件（以 . 开头的临时文件不计入，读方同样忽略）"""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.endswith('.parquet') and not name.startswith('.')
+    )
+
+def _to_table(df):
+    """入库格式（或紧凑格式）的数据转为 Arrow 表，按 (城市, 日期) 排序，使行组统计信息可用于按城市跳过"""
+    df = expand_frame(df)
+    dates = pd.to_datetime(df['date']).to_numpy().astype('datetime64[D]')
+    order = np.lexsort((dates, df['city_id'].to_numpy()))
+    arrays = [pa.array(df['city_id'].to_numpy(dtype=np.int32)[order]), pa.array(dates[order])]
+    arrays.extend(pa.array(df[col].to_numpy(dtype=np.float64)[order]) for col in OUTPUT_COLUMNS[2:])
+    return pa.Table.from_arrays(arrays, schema=_schema())
+
+def _write_file(directory, table):
+    """写出一个数据文件：先写临时文件再改名，读方不会看到写了一半的文件"""
+    os.makedirs(directory, exist_ok=True)
+    name = f"part-{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet"
+    tmp_path = os.path.join(directory, '.' + name + '.tmp')
+    pq.write_table(
+        table, tmp_path,
+        row_group_size=PARQUET_CONFIG.get('row_group_rows', 2048),
+        compression=PARQUET_CONFIG.get('compression', 'zstd'),
+        write_statistics=True
+    )
+    path = os.path.join(directory, name)
+    os.replace(tmp_path, path)
+    return path
+
+def iter_partitions(df):
+    """按 (年份, 省份) 拆分数据，产出 (年份, 省份, 子表)"""
+    df = expand_frame(df)
+    years = pd.to_datetime(df['date']).dt.year.to_numpy()
+    provinces = df['city_id'].map(PROVINCES).fillna(UNKNOWN_PROVINCE).to_numpy()
+    for (year, province), part in df.groupby([years, provinces], sort=True):
+        yield int(year), province, part
+
+def _write_partitions(df, root):
+    partitions, rows = 0, 0
+    for year, province, part in iter_partitions(df):
+        _write_file(partition_dir(root, year, province), _to_table(part))
+        partitions += 1
+        rows += len(part)
+    return partitions, rows
+
+def write_parquet_dataset(df, root=None):
+    """全量写出按年份和省份分区的 Parquet 数据集：写入新目录后整体替换旧数据集，返回 (分区数, 行数)"""
+    require_pyarrow()
+    root = root or PARQUET_CONFIG['path']
+    started = time.perf_counter()
+    new_root, old_root = root + '.new', root + '.old'
+    shutil.rmtree(new_root, ignore_errors=True)
+    partitions, rows = _write_partitions(df, new_root)
+    shutil.rmtree(old_root, ignore_errors=True)
+    if os.path.exists(root):
+        os.rename(root, old_root)
+    os.rename(new_root, root)
+    shutil.rmtree(old_root, ignore_errors=True)
+    logger.info(f"Parquet 数据集已生成：{partitions} 个 (年份, 省份) 分区，{rows} 行，耗时 {time.perf_counter() - started:.2f}s → {root}")
+    return partitions, rows
+
+def write_parquet_from_csv(csv_path, root=None):
+    """由总CSV（fetch_all_cities 的输出）生成 Parquet 数据集"""
+    require_pyarrow()
+    df = pd.read_csv(csv_path, usecols=OUTPUT_COLUMNS, parse_dates=['date'])
+    return write_parquet_dataset(df, root)
+
+def append_parquet(df, root=None):
+    """增量追加：每个涉及的分区新增一个数据文件，其它分区和已有文件不动，返回 (写入分区数, 重写分区数)
+
+    新数据与分区内已有的 (城市, 日期) 重叠时（如增量同步的回看窗口），只合并重写该分区，新数据优先。
+    """
+    require_pyarrow()
+    root = root or PARQUET_CONFIG['path']
+    written, rewritten = 0, 0
+    for year, province, part in iter_partitions(df):
+        directory = partition_dir(root, year, province)
+        existing_files = partition_files(directory)
+        new_table = _to_table(part)
+        if existing_files:
+            keys = pq.read_table(existing_files, columns=['city_id', 'date']).to_pandas()
+            new_keys = new_table.select(['city_id', 'date']).to_pandas()
+            if not keys.merge(new_keys, on=['city_id', 'date']).empty:
+                merged = pd.concat(
+                    [pq.read_table(existing_files).to_pandas(), new_table.to_pandas()], ignore_index=True
+                ).drop_duplicates(subset=['city_id', 'date'], keep='last')
+                _write_file(directory, _to_table(merged))
+                for path in existing_files:
+                    os.remove(path)
+                rewritten += 1
+                continue
+        _write_file(directory, new_table)
+        written += 1
+    logger.info(f"Parquet 增量追加完成：新增 {written} 个分区文件，合并重写 {rewritten} 个分区")
+    return written, rewritten
+
+def read_parquet_dataset(root=None, city_ids=None, start_date=None, end_date=None, provinces=None, columns=None):
+    """按城市、日期、省份条件读取数据集，返回 DataFrame
+
+    年份和省份条件通过目录裁剪分区，城市和日期条件利用行组的 min/max 统计跳过不相关的行组。
+    """
+    require_pyarrow()
+    dataset = ds.dataset(root or PARQUET_CONFIG['path'], format='parquet', partitioning='hive')
+    conditions = []
+    if start_date is not None:
+        start_date = pd.Timestamp(start_date).date()
+        conditions += [ds.field('year') >= start_date.year, ds.field('date') >= start_date]
+    if end_date is not None:
+        end_date = pd.Timestamp(end_date).date()
+        conditions += [ds.field('year') <= end_date.year, ds.field('date') <= end_date]
+    if city_ids is not None:
+        conditions.append(ds.field('city_id').isin([int(city_id) for city_id in city_ids]))
+    if provinces is not None:
+        conditions.append(ds.field('province').isin(list(provinces)))
+    condition = None
+    for item in conditions:
+        condition = item if condition is None else condition & item
+    table = dataset.to_table(columns=columns or OUTPUT_COLUMNS, filter=condition)
+    df = table.to_pandas()
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date']).astype('datetime64[ns]')
+    return df
+
+# ---------- 性能对比 ----------
+def benchmark(csv_path, root=None):
+    """对比 “读取总CSV再筛选” 与 “按条件读取 Parquet 数据集” 的耗时（单城市一个季度、单省份全年）"""
+    require_pyarrow()
+    root = root or PARQUET_CONFIG['path']
+    if not os.path.isdir(root):
+        write_parquet_from_csv(csv_path, root)
+    started = time.perf_counter()
+    df = pd.read_csv(csv_path, parse_dates=['date'])
+    csv_sec = time.perf_counter() - started
+    city_id = int(df['city_id'].iloc[0])
+    first = df['date'].min()
+    last = first + pd.Timedelta(days=89)
+    province = PROVINCES.get(city_id, UNKNOWN_PROVINCE)
+
+    started = time.perf_counter()
+    city_rows = len(read_parquet_dataset(root, [city_id], first, last))
+    city_sec = time.perf_counter() - started
+    started = time.perf_counter()
+    province_rows = len(read_parquet_dataset(root, provinces=[province]))
+    province_sec = time.perf_counter() - started
+    csv_bytes = os.path.getsize(csv_path)
+    parquet_bytes = sum(
+        os.path.getsize(os.path.join(directory, name))
+        for directory, _, names in os.walk(root) for name in names
+    )
+    logger.info(
+        f"Parquet 基准：读取总CSV {csv_sec:.3f}s（{csv_bytes / 1024 / 1024:.1f}MB）；Parquet 数据集 "
+        f"{parquet_bytes / 1024 / 1024:.1f}MB，城市 {city_id} 90 天 {city_sec * 1000:.1f}ms（{city_rows} 行），"
+        f"{province} 全部数据 {province_sec * 1000:.1f}ms（{province_rows} 行）"
+    )
+    return csv_sec, city_sec, province_sec
+
+if __name__ == '__main__':
+    # 用法：python -m src.storage.parquet_store build <总CSV路径> [数据集目录]
+    #       python -m src.storage.parquet_store bench data/all.csv
+    args = sys.argv[1:]
+    if args[:1] == ['build'] and len(args) > 1:
+        write_parquet_from_csv(args[1], args[2] if len(args) > 2 else None)
+    elif args[:1] == ['bench']:
+        benchmark(args[1] if len(args) > 1 else 'data/all.csv')
+    else:
+        print("用法: python -m src.storage.parquet_store build <csv> [目录] | bench [csv]")
@@ -1,5 +1,7 @@
 import os
 import logging
+import threading
+import numpy as np
 import pandas as pd
 import requests
 from requests.adapters import HTTPAdapter
@@ -22,48 +24,158 @@ def init_logger():
 # 初始化全局日志对象
 logger = init_logger()
 
-def create_retry_session(retry_config):
-    """创建带重试机制的HTTP会话"""
+def create_retry_session(retry_config, pool_config=None):
+    """创建带重试机制的HTTP会话（pool_config 可指定连接池大小）"""
     retry = Retry(
         total=retry_config['total'],
         backoff_factor=retry_config['backoff_factor'],
         status_forcelist=retry_config['status_forcelist']
     )
-    adapter = HTTPAdapter(max_retries=retry)
+    pool_config = pool_config or {}
+    adapter = HTTPAdapter(
+        max_retries=retry,
+        pool_connections=pool_config.get('pool_connections', 10),
+        pool_maxsize=pool_config.get('pool_maxsize', 10)
+    )
     session = requests.Session()
     session.mount('https://', adapter)
     return session
 
+# 进程内共享的HTTP会话（所有抓取线程复用同一个连接池）
+_shared_session = None
+_shared_session_lock = threading.Lock()
+
+def get_shared_session(retry_config, pool_config=None):
+    """获取进程内共享的HTTP会话，首次调用时创建，之后复用其keep-alive连接
+
+    参数只在首次创建时生效。retry_config['total'] 应保持为 0：连接层（urllib3）的重试对限流器不可见，
+    既不消耗全局重试预算也不参与降速，与 fetch_city_segment 的重试叠加后实际请求数会成倍增加。
+    """
+    global _shared_session
+    if _shared_session is None:
+        with _shared_session_lock:
+            if _shared_session is None:
+                _shared_session = create_retry_session(retry_config, pool_config)
+                logger.info(f"已创建共享HTTP会话，连接池配置: {pool_config or '默认'}")
+    return _shared_session
+
+def get_session_stats(session=None):
+    """统计会话连接池的使用情况：新建连接数、请求数、连接复用次数"""
+    session = session or _shared_session
+    stats = {'connections_opened': 0, 'requests': 0, 'connections_reused': 0}
+    if session is None:
+        return stats
+    for adapter in set(session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats['connections_opened'] += pool.num_connections
+            stats['requests'] += pool.num_requests
+    stats['connections_reused'] = max(stats['requests'] - stats['connections_opened'], 0)
+    return stats
+
+def close_shared_session():
+    """关闭共享HTTP会话并记录连接复用统计"""
+    global _shared_session
+    with _shared_session_lock:
+        if _shared_session is None:
+            return
+        stats = get_session_stats(_shared_session)
+        logger.info(
+            f"HTTP连接统计：新建 {stats['connections_opened']} 个连接，"
+            f"共 {stats['requests']} 次请求，复用 {stats['connections_reused']} 次"
+        )
+        _shared_session.close()
+        _shared_session = None
+
+def civil_to_days(year, month, day):
+    """由整数年月日计算距 1970-01-01 的天数（向量化，不经过字符串）"""
+    year = np.asarray(year, dtype=np.int64)
+    month = np.asarray(month, dtype=np.int64)
+    day = np.asarray(day, dtype=np.int64)
+    year = year - (month <= 2)
+    era = np.floor_divide(year, 400)
+    year_of_era = year - era * 400
+    day_of_year = (153 * np.where(month > 2, month - 3, month + 9) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+def civil_to_datetime(year, month, day):
+    """由整数年月日生成 datetime64[ns] 日期数组"""
+    return civil_to_days(year, month, day).astype('datetime64[D]').astype('datetime64[ns]')
+
+# 清洗后数据的紧凑列类型：city_id 为 int16，日期为距 1970-01-01 的 int32 天数（day 列），温度为 float32；
+# 每行 18 字节（宽类型为 40 字节），抓取过程中一直保持紧凑格式，写出CSV或入库时才转换为宽类型
+COMPACT_DTYPES = {
+    'city_id': np.int16, 'day': np.int32,
+    'temp_max_c': np.float32, 'temp_min_c': np.float32, 'temp_avg_c': np.float32
+}
+OUTPUT_COLUMNS = ['city_id', 'date', 'temp_max_c', 'temp_min_c', 'temp_avg_c']
+TEMP_COLUMNS = ['temp_max_c', 'temp_min_c', 'temp_avg_c']
+
+def date_to_day(day):
+    """date 转为距 1970-01-01 的天数"""
+    return int(np.datetime64(day, 'D').astype(np.int64))
+
+def compact_frame(city_id, days, temp_max, temp_min, temp_avg):
+    """构建紧凑格式的清洗后数据（city_id, day, temp_max_c, temp_min_c, temp_avg_c）"""
+    if not -32768 <= int(city_id) <= 32767:
+        raise ValueError(f"城市ID {city_id} 超出 int16 范围")
+    days = np.asarray(days, dtype=np.int32)
+    return pd.DataFrame({
+        'city_id': np.full(len(days), city_id, dtype=np.int16),
+        'day': days,
+        'temp_max_c': np.asarray(temp_max, dtype=np.float32),
+        'temp_min_c': np.asarray(temp_min, dtype=np.float32),
+        'temp_avg_c': np.asarray(temp_avg, dtype=np.float32)
+    })
+
+def expand_frame(df):
+    """紧凑格式转为入库格式（city_id int64、date datetime64、温度 float64），已是入库格式时原样返回
+
+    NASA 温度为两位小数，float32 放大为 float64 后按两位小数取整即可还原原值。
+    """
+    if 'day' not in df.columns:
+        return df
+    columns = {
+        'city_id': df['city_id'].to_numpy(dtype=np.int64),
+        'date': df['day'].to_numpy().astype('datetime64[D]').astype('datetime64[ns]')
+    }
+    for col in TEMP_COLUMNS:
+        columns[col] = np.round(df[col].to_numpy(dtype=np.float64), 2)
+    return pd.DataFrame(columns)
+
+def write_frame_csv(df, path_or_buf, header=True, chunk_rows=5000):
+    """按入库格式写出CSV（紧凑格式分块转换；to_csv 的临时内存随块大小增长，小块速度相同）"""
+    if isinstance(path_or_buf, str):
+        with open(path_or_buf, 'w', encoding='utf-8', newline='') as f:
+            return write_frame_csv(df, f, header, chunk_rows)
+    for start in range(0, max(len(df), 1), chunk_rows):
+        expand_frame(df.iloc[start:start + chunk_rows]).to_csv(
+            path_or_buf, index=False, header=header and start == 0, columns=OUTPUT_COLUMNS, date_format='%Y-%m-%d'
+        )
+
 def clean_nasa_data(df, city_id):
-    """清洗NASA数据（统一列名、过滤缺测值）"""
+    """清洗NASA数据（统一列名、过滤缺测值），返回紧凑格式（见 compact_frame）"""
     # 保留必要列
     required_cols = ['YEAR', 'MO', 'DY', 'T2M_MAX', 'T2M_MIN', 'T2M']
     valid_cols = [col for col in required_cols if col in df.columns]
     if len(valid_cols) < 6:
         logger.warning(f"城市ID {city_id} 数据列不完整，跳过")
         return pd.DataFrame()
-    
-    df = df[valid_cols].copy()
-    
-    # 添加城市ID和日期列
-    df['city_id'] = city_id
+
+    # 日期按整数年月日直接计算为天数
     try:
-        df['date'] = pd.to_datetime(
-            df['YEAR'].astype(str) + '-' +
-            df['MO'].astype(str).str.zfill(2) + '-' +
-            df['DY'].astype(str).str.zfill(2)
-        )
+        days = civil_to_days(df['YEAR'], df['MO'], df['DY'])
     except Exception as e:
         logger.error(f"城市ID {city_id} 日期转换失败: {e}")
         return pd.DataFrame()
-    
-    # 重命名列并过滤缺测值（-999为NASA缺测标记）
-    df = df.rename(columns={
-        'T2M_MAX': 'temp_max_c',
-        'T2M_MIN': 'temp_min_c',
-        'T2M': 'temp_avg_c'
-    })[['city_id', 'date', 'temp_max_c', 'temp_min_c', 'temp_avg_c']]
-    
-    # 过滤缺测值
-    df = df[(df[['temp_max_c', 'temp_min_c', 'temp_avg_c']] != -999).all(axis=1)]
-    return df
\ No newline at end of file
+
+    # 过滤缺测值（快速解析器已将 -999 转为 NaN 并剔除，这里兼容其它来源的数据）；先过滤再降精度
+    temps = df[['T2M_MAX', 'T2M_MIN', 'T2M']].to_numpy(dtype=np.float64)
+    valid = ((temps != -999) & ~np.isnan(temps)).all(axis=1)
+    if not valid.all():
+        days, temps = days[valid], temps[valid]
+    return compact_frame(city_id, days, temps[:, 0], temps[:, 1], temps[:, 2])
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+from src.storage.archive import (
+    zigzag_encode, zigzag_decode, varint_encode, varint_decode, encode_block, decode_block,
+    write_archive, ArchiveReader
+)
+
+def test_zigzag_round_trip():
+    values = np.array([0, -1, 1, -2, 2, 32767, -32768, 2 ** 40, -(2 ** 40)], dtype=np.int64)
+    encoded = zigzag_encode(values)
+    assert encoded[:5].tolist() == [0, 1, 2, 3, 4]
+    assert np.array_equal(zigzag_decode(encoded), values)
+
+def test_varint_round_trip():
+    values = np.array([0, 1, 127, 128, 300, 16383, 16384, 2 ** 35, 2 ** 63 + 5], dtype=np.uint64)
+    encoded = varint_encode(values)
+    assert encoded[:4] == b'\x00\x01\x7f\x80'
+    assert np.array_equal(varint_decode(encoded), values)
+    assert varint_encode([]) == b''
+    assert len(varint_decode(b'')) == 0
+
+def test_block_round_trip_with_date_gaps():
+    rng = np.random.default_rng(0)
+    days = np.concatenate([np.arange(19723, 19800), np.arange(19810, 19830), [19900]])
+    centi = rng.integers(-4000, 4500, size=(len(days), 3))
+    payload, flags = encode_block(days, centi)
+    decoded_days, decoded = decode_block(payload, flags, len(days), int(days[0]))
+    assert np.array_equal(decoded_days, days)
+    assert np.array_equal(decoded, centi)
+
+def test_archive_round_trip_and_filters(tmp_path):
+    rng = np.random.default_rng(1)
+    dates = pd.date_range('2023-12-20', '2024-01-10')
+    frames = []
+    for city_id in (101, 202):
+        frames.append(pd.DataFrame({
+            'city_id': city_id, 'date': dates,
+            'temp_max_c': np.round(rng.uniform(-10, 35, len(dates)), 2),
+            'temp_min_c': np.round(rng.uniform(-30, 10, len(dates)), 2),
+            'temp_avg_c': np.round(rng.uniform(-20, 20, len(dates)), 2)
+        }))
+    df = pd.concat(frames, ignore_index=True)
+    path = str(tmp_path / 'all.nwa')
+    assert write_archive(df, path) == 4  # 2 城市 × 2 年
+    reader = ArchiveReader(path)
+    try:
+        restored = reader.read()
+        pd.testing.assert_frame_equal(restored, df, check_dtype=False)
+        part = reader.read(city_ids=[202], start_date='2024-01-01')
+        assert part['city_id'].unique().tolist() == [202]
+        assert part['date'].min() == pd.Timestamp('2024-01-01') and len(part) == 10
+        assert len(reader.select_blocks(start_date='2024-01-01')) == 2
+    finally:
+        reader.close()
@@ -0,0 +1,27 @@
+import numpy as np
+from datetime import date
+from src.utils.common import civil_to_days, date_to_day, compact_frame, expand_frame
+
+def test_civil_to_days_matches_datetime64():
+    days = np.arange(-719162, 2932897, 997)  # 公元 1 年至 9999 年
+    civil = days.astype('datetime64[D]').astype(object)
+    years = [d.year for d in civil]
+    months = [d.month for d in civil]
+    mdays = [d.day for d in civil]
+    assert np.array_equal(civil_to_days(years, months, mdays), days)
+
+def test_civil_to_days_edges():
+    assert civil_to_days(1970, 1, 1) == 0
+    assert civil_to_days(1969, 12, 31) == -1
+    assert civil_to_days(2000, 2, 29) == date_to_day(date(2000, 2, 29))
+    assert civil_to_days(2024, 3, 1) - civil_to_days(2024, 2, 28) == 2
+    assert civil_to_days(2100, 3, 1) - civil_to_days(2100, 2, 28) == 1
+
+def test_compact_frame_round_trip():
+    days = [date_to_day(date(2024, 1, 1)) + i for i in range(3)]
+    df = compact_frame(101, days, [10.25, -3.5, 0.01], [1.0, -12.75, -0.01], [5.5, -8.1, 0.0])
+    wide = expand_frame(df)
+    assert wide['city_id'].tolist() == [101] * 3
+    assert [str(d.date()) for d in wide['date']] == ['2024-01-01', '2024-01-02', '2024-01-03']
+    assert wide['temp_max_c'].tolist() == [10.25, -3.5, 0.01]
+    assert wide['temp_avg_c'].tolist() == [5.5, -8.1, 0.0]
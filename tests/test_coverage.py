@@ -0,0 +1,32 @@
+import numpy as np
+from src.scraper.coverage import find_runs, CoverageIndex
+from src.utils.common import date_to_day
+from datetime import date
+
+def test_find_runs():
+    mask = np.array([
+        [1, 1, 0, 1, 0, 1],
+        [0, 0, 0, 0, 0, 0],
+        [1, 1, 1, 1, 1, 1],
+    ], dtype=bool)
+    rows, starts, ends = find_runs(mask)
+    assert list(zip(rows.tolist(), starts.tolist(), ends.tolist())) == [
+        (0, 0, 2), (0, 3, 4), (0, 5, 6), (2, 0, 6)
+    ]
+
+def test_find_runs_empty():
+    rows, starts, ends = find_runs(np.zeros((2, 0), dtype=bool))
+    assert len(rows) == len(starts) == len(ends) == 0
+
+def test_missing_ranges_and_save_load(tmp_path):
+    path = str(tmp_path / 'coverage.bin')
+    index = CoverageIndex(path, city_ids=[1, 2], years=[2024])
+    first = date_to_day(date(2024, 1, 1))
+    index.mark(1, np.arange(first, first + 366))
+    index.mark(2, np.arange(first + 10, first + 300))
+    assert index.missing_ranges() == {2: [('20240101', '20240110'), ('20241027', '20241231')]}
+    index.save()
+    # 按城市、年份的交集迁移：新增城市 3 全部缺失，城市 2 的已有位保留
+    reloaded = CoverageIndex(path, city_ids=[2, 3], years=[2024, 2025])
+    assert reloaded.missing_ranges([2]) == {2: [('20240101', '20240110'), ('20241027', '20251231')]}
+    assert reloaded.missing_ranges([3]) == {3: [('20240101', '20251231')]}
@@ -0,0 +1,110 @@
+import time
+import random
+import pytest
+from src.scraper import nasa_scraper
+from src.scraper.nasa_scraper import (
+    iter_ordered, plan_cache_coverage, WindowPlanner, fetch_city_range, classify_failure,
+    FAIL_TIMEOUT, FAIL_OVERSIZE, FAIL_THROTTLED, FAIL_ERROR
+)
+from src.scraper.rate_limiter import RetryBudget
+
+def _slow_square(x, delay):
+    time.sleep(delay)
+    return x * x
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_iter_ordered_keeps_submission_order(workers):
+    rng = random.Random(0)
+    jobs = [(i, rng.random() * 0.01) for i in range(40)]
+    results = list(iter_ordered(_slow_square, iter(jobs), workers))
+    assert [job for job, _ in results] == jobs
+    assert [value for _, value in results] == [i * i for i in range(40)]
+
+def test_iter_ordered_failed_job_yields_none():
+    def func(x, _):
+        if x == 2:
+            raise RuntimeError('boom')
+        return x
+    results = list(iter_ordered(func, [(i, None) for i in range(5)], 3))
+    assert [value for _, value in results] == [0, 1, None, 3, 4]
+
+def test_plan_cache_coverage_reuses_and_finds_gaps():
+    cached = [('20240201', '20240229'), ('20240101', '20240110'), ('20240105', '20240120'), ('20241201', '20250131')]
+    reused, gaps = plan_cache_coverage(cached, '20240101', '20241231')
+    # 重叠段与超出区间的段不复用
+    assert reused == [('20240101', '20240110'), ('20240201', '20240229')]
+    assert gaps == [('20240111', '20240131'), ('20240301', '20241231')]
+
+def test_plan_cache_coverage_empty_cache():
+    assert plan_cache_coverage([], '20240101', '20240131') == ([], [('20240101', '20240131')])
+
+def test_classify_failure():
+    import requests
+    assert classify_failure(error=requests.exceptions.ReadTimeout()) == FAIL_TIMEOUT
+    assert classify_failure(status=504) == FAIL_TIMEOUT
+    assert classify_failure(status=414) == FAIL_OVERSIZE
+    assert classify_failure(status=429) == FAIL_THROTTLED
+    assert classify_failure(status=500) == FAIL_ERROR
+    assert classify_failure(error=requests.exceptions.ConnectionError()) == FAIL_ERROR
+
+def test_window_planner_shrinks_and_recovers():
+    planner = WindowPlanner(400, 90)
+    planner.record_failure(400)
+    assert planner.current() == 200
+    planner.record_failure(150)
+    assert planner.current() == 90
+    planner.record_success(60)
+    assert planner.current() == 90
+    planner.record_success(90)
+    planner.record_success(180)
+    planner.record_success(360)
+    assert planner.current() == 400
+    assert not planner.can_split(90)
+
+class _Manifest:
+    def cached_ranges(self):
+        return {}
+
+class _Limiter:
+    def __init__(self, budget):
+        self.budget = budget
+
+def _run(monkeypatch, respond, budget, max_days=8, min_days=2):
+    calls = []
+
+    def fake_request(city_id, name, lat, lng, start, end, use_cache=True, stop_on=()):
+        calls.append((start, end))
+        return respond(start, end)
+
+    monkeypatch.setattr(nasa_scraper, 'request_segment', fake_request)
+    monkeypatch.setattr(nasa_scraper, 'get_segment_manifest', lambda: _Manifest())
+    monkeypatch.setattr(nasa_scraper, 'get_rate_limiter', lambda: _Limiter(budget))
+    planner = WindowPlanner(max_days, min_days)
+    results = fetch_city_range(1, 'test', 0, 0, '20240101', '20240108', planner=planner)
+    return calls, results, planner
+
+def test_fetch_city_range_bisects_on_timeout(monkeypatch):
+    def respond(start, end):
+        if start == '20240101' and end == '20240108':
+            return None, FAIL_TIMEOUT
+        return f'{start}-{end}', None
+    calls, results, planner = _run(monkeypatch, respond, RetryBudget(0, 10))
+    assert calls == [('20240101', '20240108'), ('20240101', '20240104'), ('20240105', '20240108')]
+    assert [(s, e, text) for s, e, text in results] == [
+        ('20240101', '20240104', '20240101-20240104'), ('20240105', '20240108', '20240105-20240108')
+    ]
+    # 拆分后的请求成功，窗口恢复
+    assert planner.current() == 8
+
+def test_fetch_city_range_does_not_split_on_throttling(monkeypatch):
+    calls, results, _ = _run(monkeypatch, lambda s, e: (None, FAIL_THROTTLED), RetryBudget(0, 10))
+    assert calls == [('20240101', '20240108')]
+    assert results == [('20240101', '20240108', None)]
+
+def test_fetch_city_range_split_charged_to_budget(monkeypatch):
+    budget = RetryBudget(0, 1)
+    calls, results, _ = _run(monkeypatch, lambda s, e: (None, FAIL_TIMEOUT), budget)
+    # 第一次拆分只批到一个重试额度，另一半直接记为失败
+    assert calls == [('20240101', '20240108'), ('20240101', '20240104')]
+    assert budget.retries == 1 and budget.rejected >= 1
+    assert all(text is None for _, _, text in results)
@@ -0,0 +1,44 @@
+import os
+import pytest
+from src.scraper.pack_store import PackStore, RECORD_HEADER
+
+def test_append_read_round_trip(tmp_path):
+    store = PackStore(str(tmp_path))
+    payloads = {f'1_2024010{i}_2024010{i}': os.urandom(100) * (i + 1) for i in range(5)}
+    locations = {key: store.append(key, data) for key, data in payloads.items()}
+    for key, (pack, offset, length) in locations.items():
+        assert store.read(pack, offset, length) == payloads[key]
+    scanned = [(key, offset, length, data) for key, offset, length, data in store.iter_pack(store.pack_names()[0])]
+    assert [(key, data) for key, _, _, data in scanned] == list(payloads.items())
+    assert [(offset, length) for _, offset, length, _ in scanned] == [loc[1:] for loc in locations.values()]
+    store.close()
+
+def test_crc_mismatch_is_rejected(tmp_path):
+    store = PackStore(str(tmp_path), compress_level=0)
+    pack, offset, length = store.append('a', b'x' * 64)
+    store.close()
+    path = os.path.join(str(tmp_path), pack)
+    with open(path, 'r+b') as f:
+        f.seek(offset + length - 1)
+        last = f.read(1)
+        f.seek(offset + length - 1)
+        f.write(bytes([last[0] ^ 0xFF]))
+    with pytest.raises(ValueError):
+        store.read(pack, offset, length)
+
+def test_iter_pack_stops_at_truncated_tail(tmp_path):
+    store = PackStore(str(tmp_path))
+    store.append('a', b'first')
+    pack, offset, length = store.append('b', b'second')
+    store.close()
+    path = os.path.join(str(tmp_path), pack)
+    with open(path, 'r+b') as f:
+        f.truncate(offset + RECORD_HEADER.size + 1)
+    assert [key for key, _, _, _ in store.iter_pack(pack)] == ['a']
+
+def test_rolls_over_to_new_pack(tmp_path):
+    store = PackStore(str(tmp_path), max_pack_bytes=64, compress_level=0)
+    for i in range(3):
+        store.append(str(i), b'y' * 80)
+    assert store.pack_names() == ['pack_00000.pack', 'pack_00001.pack', 'pack_00002.pack']
+    store.close()
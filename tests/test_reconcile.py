@@ -0,0 +1,27 @@
+import zlib
+import numpy as np
+import pandas as pd
+from src.db.reconcile import _row_crcs, frame_checksums
+
+def test_row_format_matches_concat_ws():
+    temps = [np.array([10.5, -0.001, np.nan]), np.array([-3.0, 2.345, 1.0]), np.array([0.1, 0.0, np.nan])]
+    crcs = _row_crcs([101, 101, 202], ['2024-01-01', '2024-01-02', '2024-01-03'], temps)
+    # 与 CONCAT_WS(',', city_id, date, CAST(... AS DECIMAL(8, 2))...) 的文本一致：两位小数、无 -0.00、跳过 NULL
+    expected = ['101,2024-01-01,10.50,-3.00,0.10', '101,2024-01-02,0.00,2.35,0.00', '202,2024-01-03,1.00']
+    assert crcs.tolist() == [zlib.crc32(line.encode()) for line in expected]
+
+def test_frame_checksums_order_independent():
+    df = pd.DataFrame({
+        'city_id': [1, 1, 2, 1],
+        'date': ['2024-01-01', '2024-01-02', '2024-01-01', '2024-02-01'],
+        'temp_max_c': [1.0, 2.0, 3.0, 4.0],
+        'temp_min_c': [0.5, 1.5, 2.5, 3.5],
+        'temp_avg_c': [0.75, 1.75, 2.75, 3.75]
+    })
+    sums = frame_checksums(df)
+    shuffled = frame_checksums(df.iloc[::-1].reset_index(drop=True))
+    pd.testing.assert_frame_equal(sums, shuffled)
+    assert sums.loc[(1, 2024, 1), 'rows'] == 2
+    assert sums.loc[(1, 2024, 1), 'checksum'] == sum(
+        zlib.crc32(line.encode()) for line in ['1,2024-01-01,1.00,0.50,0.75', '1,2024-01-02,2.00,1.50,1.75']
+    )
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+from datetime import date
+from src.storage.cube import create_cube_file, CubeStore
+
+def _frame(city_ids, start, periods, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, periods=periods)
+    return pd.concat([pd.DataFrame({
+        'city_id': city_id, 'date': dates,
+        'temp_max_c': np.round(rng.uniform(0, 30, periods), 2),
+        'temp_min_c': np.round(rng.uniform(-20, 0, periods), 2),
+        'temp_avg_c': np.round(rng.uniform(-10, 15, periods), 2)
+    }) for city_id in city_ids], ignore_index=True)
+
+def test_cube_append_and_grow_round_trip(tmp_path):
+    path = str(tmp_path / 'cube.bin')
+    create_cube_file(path, [101, 202], date(2024, 1, 1), capacity_days=5)
+    cube = CubeStore(path, mode='r+')
+    first = _frame([101, 202], '2024-01-01', 4)
+    cube.append_frame(first)
+    # 超出容量时扩容，已有数据保留
+    later = _frame([101], '2024-01-05', 10, seed=1)
+    cube.append_frame(later, reserve_days=3)
+    assert cube.capacity_days == 17 and cube.end_date == date(2024, 1, 14)
+    cube.close()
+
+    reader = CubeStore(path)
+    restored = reader.to_frame(101)
+    expected = pd.concat([first[first['city_id'] == 101], later], ignore_index=True)
+    np.testing.assert_allclose(restored[['temp_max_c', 'temp_min_c', 'temp_avg_c']].to_numpy(),
+                               expected[['temp_max_c', 'temp_min_c', 'temp_avg_c']].to_numpy(), atol=1e-5)
+    assert restored['date'].tolist() == expected['date'].tolist()
+    # 城市 202 之后的日期没有数据，导出时去掉
+    assert len(reader.to_frame(202)) == 4
+    reader.close()
+
+def test_cube_rejects_unknown_city(tmp_path):
+    path = str(tmp_path / 'cube.bin')
+    create_cube_file(path, [101], date(2024, 1, 1), capacity_days=5)
+    cube = CubeStore(path, mode='r+')
+    with pytest.raises(ValueError):
+        cube.append_frame(_frame([999], '2024-01-01', 1))
+    cube.close()
+
+def test_parquet_round_trip(tmp_path):
+    pytest.importorskip('pyarrow')
+    from src.storage.parquet_store import write_parquet_dataset, append_parquet, read_parquet_dataset
+    root = str(tmp_path / 'parquet')
+    df = _frame([101, 202], '2023-12-30', 5)
+    write_parquet_dataset(df, root)
+    # 与已有日期重叠的追加会合并重写分区，新数据优先
+    update = _frame([101], '2024-01-03', 2, seed=2)
+    append_parquet(update, root)
+    restored = read_parquet_dataset(root).sort_values(['city_id', 'date']).reset_index(drop=True)
+    expected = pd.concat([df, update]).drop_duplicates(['city_id', 'date'], keep='last') \
+        .sort_values(['city_id', 'date']).reset_index(drop=True)
+    pd.testing.assert_frame_equal(restored[expected.columns], expected, check_dtype=False)
+    part = read_parquet_dataset(root, city_ids=[202], start_date='2024-01-01')
+    assert part['city_id'].unique().tolist() == [202] and len(part) == 3
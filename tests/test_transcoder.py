@@ -0,0 +1,33 @@
+import pytest
+from src.scraper.transcoder import transcode_segment
+
+RESPONSE = (
+    b"-BEGIN HEADER-\r\n"
+    b"NASA/POWER Source Native Resolution Daily Data\r\n"
+    b"YEAR,MO,DY,T2M_MAX,T2M_MIN,T2M\r\n"
+    b"-END HEADER-\r\n"
+    b"YEAR,MO,DY,T2M_MAX,T2M_MIN,T2M\r\n"
+    b"2023,12,31,10.5,-2.25,4.1\r\n"
+    b"2024,1,1,8.75,-3.0,2.5\r\n"
+    b"2024,1,2,-999,-5.0,1.0\r\n"
+    b"2024,1,3,9.0,,3.0\r\n"
+    b"2024,1,4,-999.0,-999.0,-999.0\r\n"
+    b"2024,1,5,7.0,-1.0,3.0\r\n"
+)
+
+def test_transcode_segment_skips_missing_rows():
+    rows = transcode_segment(RESPONSE)
+    assert rows == {
+        b'2023-12-31': b'10.5,-2.25,4.1',
+        b'2024-01-01': b'8.75,-3.0,2.5',
+        b'2024-01-05': b'7.0,-1.0,3.0',
+    }
+
+def test_transcode_segment_filters_years():
+    assert list(transcode_segment(RESPONSE, years={b'2024'})) == [b'2024-01-01', b'2024-01-05']
+
+def test_transcode_segment_rejects_bad_header():
+    with pytest.raises(ValueError):
+        transcode_segment(b"no header here\n1,2,3\n")
+    with pytest.raises(ValueError):
+        transcode_segment(b"YEAR,MO,DY,T2M_MAX\n2024,1,1,5\n")